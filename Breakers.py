@@ -0,0 +1,57 @@
+# Circuit breakers for the receipt's sources, kept across runs, so a source that has failed several runs
+# in a row is skipped straight away instead of being waited on again every run. After a cooldown it is tried
+# once more, and closes again if that works, or stays open for twice as long if it doesn't.
+
+import os, sqlite3, time
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "breakers.sqlite3")
+
+# Consecutive failures before a source is skipped
+FAILURES_TO_OPEN = 3
+
+# Seconds a source is first skipped for, and the longest it is ever skipped for
+COOLDOWN = 15 * 60
+MAX_COOLDOWN = 6 * 60 * 60
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=10)
+    db.execute("CREATE TABLE IF NOT EXISTS breakers (key TEXT PRIMARY KEY, failures INTEGER, open_until REAL, cooldown REAL)")
+    return db
+
+
+def is_open(key: str, path: str = DB_PATH) -> bool:
+    """
+    Whether a source should be skipped for now
+    """
+    with connect(path) as db:
+        row = db.execute("SELECT open_until FROM breakers WHERE key = ?", (key,)).fetchone()
+    return bool(row) and time.time() < row[0]
+
+
+def succeeded(key: str, path: str = DB_PATH):
+    with connect(path) as db:
+        db.execute("DELETE FROM breakers WHERE key = ?", (key,))
+
+
+def failed(key: str, path: str = DB_PATH) -> bool:
+    """
+    Counts a failure, opening the breaker once there have been enough in a row
+
+    Returns whether the breaker is now open
+    """
+    now = time.time()
+    with connect(path) as db:
+        row = db.execute("SELECT failures, open_until, cooldown FROM breakers WHERE key = ?", (key,)).fetchone()
+        failures, open_until, cooldown = row or (0, 0, 0)
+        failures += 1
+
+        if failures >= FAILURES_TO_OPEN:
+            # A trial after a cooldown failed, so wait twice as long before the next one
+            cooldown = min(cooldown * 2, MAX_COOLDOWN) if cooldown else COOLDOWN
+            open_until = now + cooldown
+
+        db.execute("INSERT OR REPLACE INTO breakers VALUES (?, ?, ?, ?)", (key, failures, open_until, cooldown))
+    return failures >= FAILURES_TO_OPEN
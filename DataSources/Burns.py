@@ -1,7 +1,8 @@
 # Provides a function to get a Robert Burns poem which changes each day
 
-import requests
-from bs4 import BeautifulSoup
+import importlib.util
+from DataSources import Http, BurnsCorpus
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime, timezone
 import textwrap
 
@@ -11,46 +12,51 @@ BASE_URL = "https://robertburns.org"
 # JSON endpoint containing the list of works
 JSON_URL = f"{BASE_URL}/static/json/works_app/works_list.json"
 
+# Only the poem itself is built into a tree, and lxml's C parser is used when it is installed
+WORK_LINES = SoupStrainer("section", class_="work-lines")
+PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
 
-def choose_poem()-> tuple[str, str]:
+
+def fetch_works() -> list[tuple[str, str]]:
     """
-    Selects a poem from robertburns.org
-    The chosen poem changes once per day
-    
-    Returns a tuple of (title, slug), where slug can be used in a url
-     to get the full text
+    Downloads the list of works, as (title, slug) in the site's order
     """
-    response = requests.get(JSON_URL)
+    response = Http.get(JSON_URL)
     response.raise_for_status()
 
-    works = response.json()
-    titles = [(work["title"], work["slug"]) for work in works]
+    return [(work["title"], work["slug"]) for work in response.json()]
+
 
-    # Rotate through one poem per day
+def day_index(count: int) -> int:
+    """
+    The index of today's poem among `count` works, rotating through one poem per day
+    """
     today = datetime.now(timezone.utc).date()
     epoch = datetime(2026, 1, 23, tzinfo=timezone.utc).date()
     days_since_epoch = (today - epoch).days
-    index = days_since_epoch % len(titles)
+    return days_since_epoch % count
 
-    return titles[index]
 
-
-def scrape_poem(slug) -> str:
+def choose_poem()-> tuple[str, str]:
     """
-    Given a poem slug, fetch the poem HTML page and extract
-    plain text with blank lines separating stanzas.
-
-    param slug: The poem identifier from choose_poem()
-    Returns a multiline string
+    Selects a poem from robertburns.org
+    The chosen poem changes once per day
+    
+    Returns a tuple of (title, slug), where slug can be used in a url
+     to get the full text
     """
+    titles = fetch_works()
+    return titles[day_index(len(titles))]
 
-    # Build the poem URL from the slug
-    url = f"{BASE_URL}/works/{slug}.html"
-    response = requests.get(url)
-    response.raise_for_status()
 
-    # Parse HTML with BeautifulSoup
-    soup = BeautifulSoup(response.text, "html.parser")
+def extract_poem(html: str) -> str:
+    """
+    Extracts the plain text of a poem page, one line per line of the poem
+
+    html: The page from robertburns.org/works/
+    Returns a multiline string, or an empty one if the page has no poem
+    """
+    soup = BeautifulSoup(html, PARSER, parse_only=WORK_LINES)
 
     # Locate the main poem container
     work_lines = soup.find("section", class_="work-lines")
@@ -80,18 +86,29 @@ def scrape_poem(slug) -> str:
     return "\n".join(poem_stanzas)
 
 
-def get_burns_poem(width = 34):
+def scrape_poem(slug, ttl=Http.CONFIGURED) -> str:
     """
-    Gets today's burns poem by scraping a website
-    
-    param width: The maximum line length in chars
+    Given a poem slug, fetch the poem HTML page and extract
+    plain text with blank lines separating stanzas.
+
+    param slug: The poem identifier from choose_poem()
+    param ttl: Passed to Http.get, None to skip the response cache
     Returns a multiline string
     """
-    
-    (title, slug) = choose_poem()
-    blocks = [(title, "subheading")]
-    poem_text = scrape_poem(slug)
 
+    # Build the poem URL from the slug
+    url = f"{BASE_URL}/works/{slug}.html"
+    response = Http.get(url, ttl=ttl)
+    response.raise_for_status()
+
+    return extract_poem(response.text)
+
+
+def wrap_poem(title: str, poem_text: str, width: int) -> list[tuple[str, str]]:
+    """
+    Lays out a poem as blocks, wrapping long lines with a hanging indent
+    """
+    blocks = [(title, "subheading")]
     wrapped_lines = []
 
     for line in poem_text.splitlines():
@@ -111,7 +128,24 @@ def get_burns_poem(width = 34):
         wrapped_lines.extend(wrapped)
 
     blocks.extend([(line, "body") for line in wrapped_lines])
-    return blocks#title.center(width) + "\n\n" + "\n".join(wrapped_lines)
+    return blocks
+
+
+def get_burns_poem(width = 34):
+    """
+    Gets today's burns poem, from the harvested corpus if there is one, otherwise by scraping the website
+    
+    param width: The maximum line length in chars
+    Returns a multiline string
+    """
+    corpus = BurnsCorpus.load()
+    if corpus is not None and len(corpus):
+        work = corpus.work(day_index(len(corpus)))
+        if work.text:
+            return wrap_poem(work.title, work.text, width)
+
+    (title, slug) = choose_poem()
+    return wrap_poem(title, scrape_poem(slug), width)
 
 
 if __name__ == "__main__":
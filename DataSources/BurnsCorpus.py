@@ -0,0 +1,142 @@
+# Keeps every Robert Burns poem on disk in one compact file, so today's poem is a local lookup instead of two downloads
+# and a page parse. The file is harvested once from robertburns.org, then memory-mapped so only the poem read is loaded.
+#
+# Usage: python -m DataSources.BurnsCorpus      Harvest the corpus, replacing any existing one
+#
+# Layout, little-endian:
+#   header     magic, number of works
+#   entries    per work in the site's order: offset, slug length, title length, text length
+#   strings    each work's slug, title and text back to back, UTF-8
+
+import mmap, os, struct, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from DataSources.Cache import CACHE_DIR
+
+CORPUS_PATH = os.path.join(CACHE_DIR, "burns_corpus.bin")
+
+MAGIC = b"BURNS\x00\x00\x02"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<IHHI")
+
+# Pages downloaded at once while harvesting, kept low to be gentle on the site
+HARVEST_WORKERS = 4
+
+corpus = None
+
+
+class Work(NamedTuple):
+    slug: str
+    title: str
+    # The poem as extracted by Burns.extract_poem, empty if it couldn't be harvested
+    text: str
+
+
+class Corpus:
+    """
+    A read-only, memory-mapped corpus file
+    """
+
+    def __init__(self, path: str = CORPUS_PATH):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Burns corpus")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read(self, number: int, with_text: bool = True) -> Work:
+        offset, slug_length, title_length, text_length = ENTRY.unpack_from(self.map, HEADER.size + number * ENTRY.size)
+        title_start = offset + slug_length
+        text_start = title_start + title_length
+        return Work(
+            self.map[offset:title_start].decode("utf-8"),
+            self.map[title_start:text_start].decode("utf-8"),
+            self.map[text_start:text_start + text_length].decode("utf-8") if with_text else "",
+        )
+
+    def work(self, day_index: int) -> Work:
+        """
+        The work at a position in the site's list, as used to pick the day's poem
+        """
+        if not 0 <= day_index < self.count:
+            raise IndexError(day_index)
+        return self.read(day_index)
+
+
+def load(path: str = CORPUS_PATH) -> Corpus | None:
+    """
+    Opens the corpus once per process, or returns None if it hasn't been harvested
+    """
+    global corpus
+    if corpus is None and os.path.exists(path):
+        try:
+            corpus = Corpus(path)
+        except (OSError, ValueError) as e:
+            print("Failed to open Burns corpus:", e)
+    return corpus
+
+
+def write(works: list[Work], path: str = CORPUS_PATH):
+    """
+    Writes works to a corpus file, in the given order
+    """
+    strings = bytearray()
+    entries = []
+    offset = HEADER.size + len(works) * ENTRY.size
+
+    for work in works:
+        slug, title, text = (value.encode("utf-8") for value in work)
+        entries.append(ENTRY.pack(offset + len(strings), len(slug), len(title), len(text)))
+        strings += slug + title + text
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A temporary file of its own, so two harvests at once never replace the corpus with a half-written one
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as file:
+        try:
+            file.write(HEADER.pack(MAGIC, len(works)))
+            file.write(b"".join(entries))
+            file.write(strings)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, path)
+
+
+def harvest(path: str = CORPUS_PATH) -> int:
+    """
+    Downloads every work from robertburns.org into a new corpus file
+
+    Works that fail to download are kept with empty text, so each work stays at its position in the site's list
+    Returns the number of works harvested
+    """
+    from DataSources import Burns
+
+    works = Burns.fetch_works()
+
+    def fetch(work):
+        title, slug = work
+        try:
+            # Skipping the response cache, which would otherwise fill up with every page
+            return Work(slug, title, Burns.scrape_poem(slug, ttl=None))
+        except Exception as e:
+            print(f"Failed to harvest {slug}:", e)
+            return Work(slug, title, "")
+
+    with ThreadPoolExecutor(max_workers=HARVEST_WORKERS) as pool:
+        harvested = list(pool.map(fetch, works))
+
+    write(harvested, path)
+
+    global corpus
+    corpus = None
+    return sum(1 for work in harvested if work.text)
+
+
+if __name__ == "__main__":
+    count = harvest()
+    print(f"Harvested {count} works to {CORPUS_PATH}")
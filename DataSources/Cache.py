@@ -0,0 +1,164 @@
+# Provides a persistent on-disk cache of HTTP responses, so repeated runs can skip the network or revalidate cheaply,
+# and stored responses can still be served when the network is down
+
+import json, os, re, sqlite3, threading, time
+from typing import NamedTuple
+
+CACHE_DIR = os.getenv("RECEIPTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".receipts_cache"))
+CACHE_PATH = os.path.join(CACHE_DIR, "http.sqlite3")
+
+# Least recently used responses are evicted once the cache grows past this many bytes
+MAX_SIZE = 64 * 1024 * 1024
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Seconds a stored response is used without contacting the server, matched against the url in order.
+# 0 means always revalidate, but keep the response for when the network is down. None means never store.
+TTLS = [
+    (r"^https://robertburns\.org/static/json/", 7 * DAY),          # Burns works list
+    (r"^https://robertburns\.org/works/", 30 * DAY),               # Burns poem pages
+    (r"^https://api\.octopus\.energy/v1/industry/grid-supply-points/", 365 * DAY),
+    (r"^https://api\.octopus\.energy/v1/products/", DAY),          # Tariff rates
+    (r"^https://api\.octopus\.energy/v1/electricity-meter-points/", 0),
+    (r"^https://api\.wikimedia\.org/feed/", 12 * HOUR),            # Featured feed, dated in the url
+    (r"^https://wordsmith\.org/", 6 * HOUR),                       # Word of the day RSS
+    (r"^https://api\.open-meteo\.com/", HOUR),
+    (r"^https://nominatim\.openstreetmap\.org/", 30 * DAY),
+    (r"^https://ichef\.bbci\.co\.uk/", 7 * DAY),                   # News thumbnails
+    (r"^https://scannables\.scdn\.co/", 365 * DAY),                # Spotify codes
+    (r"^https?://feeds\.bbci\.co\.uk/", 10 * 60),
+]
+DEFAULT_TTL = 0
+
+# Headers that describe the transfer rather than the stored (already decoded) body
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+lock = threading.Lock()
+connection = None
+
+
+class Entry(NamedTuple):
+    """
+    A stored response
+    """
+    url: str
+    headers: dict
+    body: bytes
+    stored_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def validators(self) -> dict:
+        """
+        Headers that make the next request conditional on this response having changed
+        """
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+    def response(self) -> "requests.Response":
+        """
+        Rebuilds a requests.Response from the stored data
+        """
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens the cache database, creating it on first use
+    """
+    global connection
+    if connection is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        connection = sqlite3.connect(CACHE_PATH, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT, headers TEXT, body BLOB, size INTEGER, stored_at REAL, used_at REAL)"
+        )
+    return connection
+
+
+def ttl_for(url: str) -> float | None:
+    """
+    Finds the configured time-to-live for a url
+    """
+    for pattern, ttl in TTLS:
+        if re.search(pattern, url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def make_key(url: str, params=None) -> str:
+    """
+    The full url including query parameters, which identifies a response in the cache
+    """
+    import requests
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+def lookup(key: str) -> Entry | None:
+    with lock:
+        db = connect()
+        row = db.execute("SELECT url, headers, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+
+    url, headers, body, stored_at = row
+    return Entry(url, json.loads(headers), body, stored_at)
+
+
+def store(key: str, response: "requests.Response"):
+    """
+    Saves a successful response, then evicts least recently used responses if the cache is too big
+    """
+    headers = {name.lower(): value for name, value in response.headers.items() if name.lower() not in HOP_HEADERS}
+    body = response.content
+    now = time.time()
+
+    with lock:
+        db = connect()
+        db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, response.url, json.dumps(headers), body, len(body), now, now)
+        )
+        evict(db)
+
+
+def touch(key: str):
+    """
+    Marks a stored response as fresh again after the server confirmed it hasn't changed
+    """
+    with lock:
+        now = time.time()
+        connect().execute("UPDATE responses SET stored_at = ?, used_at = ? WHERE key = ?", (now, now, key))
+
+
+def evict(db: sqlite3.Connection, max_size: int = MAX_SIZE):
+    total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= max_size:
+        return
+
+    for key, size in db.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall():
+        db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        if total <= max_size:
+            break
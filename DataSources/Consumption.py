@@ -0,0 +1,119 @@
+# Provides lightweight functions for working with half-hourly energy consumption series, built on NumPy arrays.
+# Works on any length of series, from one day of readings to months of them.
+
+from datetime import datetime, timezone
+from typing import NamedTuple
+import numpy as np
+
+INTERVAL = 30 * 60
+DAY = 24 * 60 * 60
+
+# The dual-rate night period, in seconds after midnight UTC
+NIGHT_START = 30 * 60
+DAY_START = 7 * 60 * 60 + 30 * 60
+
+
+class Series(NamedTuple):
+    """
+    Consumption readings in time order
+
+    starts: Start of each interval, as unix seconds
+    kwh: Consumption during each interval
+    """
+    starts: np.ndarray
+    kwh: np.ndarray
+
+    @property
+    def start(self) -> datetime:
+        return datetime.fromtimestamp(int(self.starts[0]), timezone.utc)
+
+    @property
+    def end(self) -> datetime:
+        return datetime.fromtimestamp(int(self.starts[-1]) + INTERVAL, timezone.utc)
+
+
+class DayNightSplit(NamedTuple):
+    day: float
+    night: float
+
+    @property
+    def total(self) -> float:
+        return self.day + self.night
+
+    @property
+    def day_percent(self) -> float:
+        return self.day / self.total * 100
+
+    @property
+    def night_percent(self) -> float:
+        return self.night / self.total * 100
+
+
+def parse_time(timestamp: str) -> int:
+    """
+    Converts an ISO 8601 timestamp like "2026-01-23T00:30:00Z" to unix seconds
+    """
+    # fromisoformat only reads the "Z" suffix from Python 3.11
+    return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp())
+
+
+def to_iso(unix_seconds: int) -> str:
+    """
+    Converts unix seconds to an ISO 8601 UTC timestamp like "2026-01-23T00:30:00Z"
+    """
+    return datetime.fromtimestamp(unix_seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def from_results(results: list[dict]) -> Series:
+    """
+    Builds a series from Octopus consumption results, in any order
+    """
+    if not results:
+        raise ValueError("No consumption readings")
+
+    starts = np.fromiter((parse_time(r["interval_start"]) for r in results), dtype=np.int64, count=len(results))
+    kwh = np.fromiter((r["consumption"] for r in results), dtype=np.float64, count=len(results))
+    order = np.argsort(starts, kind="stable")
+    return Series(starts[order], kwh[order])
+
+
+def night_mask(series: Series, night_start: int = NIGHT_START, day_start: int = DAY_START) -> np.ndarray:
+    """
+    Which intervals start inside the night period, with both times in seconds after midnight UTC
+    """
+    time_of_day = series.starts % DAY
+    return (time_of_day >= night_start) & (time_of_day < day_start)
+
+
+def split_day_night(series: Series, night_start: int = NIGHT_START, day_start: int = DAY_START) -> DayNightSplit:
+    """
+    Totals consumption in kWh during the day and night periods
+    """
+    night = night_mask(series, night_start, day_start)
+    night_usage = float(series.kwh[night].sum())
+    return DayNightSplit(float(series.kwh.sum()) - night_usage, night_usage)
+
+
+def single_rate_cost(split: DayNightSplit, unit_rate: float, standing_charge: float, days: float = 1) -> float:
+    """
+    Cost in £ of the usage on a single-rate tariff, including `days` days of standing charge
+    """
+    return split.total * unit_rate + standing_charge * days
+
+
+def dual_rate_cost(split: DayNightSplit, day_rate: float, night_rate: float, standing_charge: float, days: float = 1) -> tuple[float, float, float]:
+    """
+    Cost in £ of day and night usage on a dual-rate tariff, including `days` days of standing charge
+
+    Returns (day charge, night charge, total charge including standing charge)
+    """
+    day_charge = split.day * day_rate
+    night_charge = split.night * night_rate
+    return day_charge, night_charge, day_charge + night_charge + standing_charge * days
+
+
+def days_covered(series: Series) -> float:
+    """
+    How many days of standing charge the series spans, counting whole intervals
+    """
+    return (int(series.starts[-1]) + INTERVAL - int(series.starts[0])) / DAY
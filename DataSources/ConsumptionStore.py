@@ -0,0 +1,204 @@
+# Keeps every half-hourly consumption reading for each meter in a local SQLite store, so each run only downloads
+# readings it hasn't seen yet, and any missing from recent days, along with running daily totals for week and month summaries
+
+import os, sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import numpy as np
+from DataSources import Consumption, Http
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "consumption.sqlite3")
+
+API_URL = "https://api.octopus.energy/v1/electricity-meter-points/{mpan}/meters/{msn}/consumption/"
+
+# How far back the first sync for a meter goes
+INITIAL_DAYS = 62
+
+# How many days back missing readings are looked for again, as meters can send them days late
+BACKFILL_DAYS = 14
+
+# The most readings the API returns per page
+PAGE_SIZE = 25000
+
+DAY = Consumption.DAY
+READINGS_PER_DAY = DAY // Consumption.INTERVAL
+
+
+class Comparison(NamedTuple):
+    """
+    Consumption over a period compared to the one before it
+    """
+    kwh: float
+    previous_kwh: float
+
+    @property
+    def change_percent(self) -> float | None:
+        if not self.previous_kwh:
+            return None
+        return (self.kwh - self.previous_kwh) / self.previous_kwh * 100
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS readings (
+            mpan TEXT, msn TEXT, interval_start INTEGER, kwh REAL,
+            PRIMARY KEY (mpan, msn, interval_start)
+        );
+        CREATE TABLE IF NOT EXISTS daily (
+            mpan TEXT, msn TEXT, day INTEGER, kwh REAL, readings INTEGER,
+            PRIMARY KEY (mpan, msn, day)
+        );
+    """)
+    return db
+
+
+def fetch_since(key: str, mpan: str, msn: str, period_from: int) -> list[dict]:
+    """
+    Downloads every reading starting at or after period_from, following the API's pagination
+    """
+    url = API_URL.format(mpan=mpan, msn=msn)
+    params = {"period_from": Consumption.to_iso(period_from), "page_size": PAGE_SIZE, "order_by": "period"}
+    results = []
+
+    while url:
+        # Every request asks for new data, so there's nothing worth keeping in the HTTP cache
+        (r := Http.get(url, params=params, auth=(key, ''), ttl=None)).raise_for_status()
+        data = r.json()
+        results += data.get("results", [])
+        url, params = data.get("next"), None
+
+    return results
+
+
+def add_readings(db: sqlite3.Connection, mpan: str, msn: str, results: list[dict]):
+    """
+    Stores readings, replacing any the API has revised, and recomputes the daily totals of the days they fall in
+    """
+    if not results:
+        return
+
+    series = Consumption.from_results(results)
+    db.executemany(
+        "INSERT OR REPLACE INTO readings VALUES (?, ?, ?, ?)",
+        ((mpan, msn, int(start), float(kwh)) for start, kwh in zip(series.starts, series.kwh))
+    )
+
+    first_day = int(series.starts[0]) // DAY
+    db.execute(
+        "INSERT OR REPLACE INTO daily "
+        "SELECT mpan, msn, interval_start / ?, SUM(kwh), COUNT(*) FROM readings "
+        "WHERE mpan = ? AND msn = ? AND interval_start >= ? GROUP BY interval_start / ?",
+        (DAY, mpan, msn, first_day * DAY, DAY)
+    )
+
+
+def first_gap(db: sqlite3.Connection, mpan: str, msn: str, first: int, latest: int) -> int | None:
+    """
+    The start of the earliest day in the last BACKFILL_DAYS before the latest reading's day that is missing readings
+
+    first, latest: The earliest and latest stored interval starts
+    """
+    # The first stored day can start part way through, and the latest one is still being filled
+    first_day = max(latest // DAY - BACKFILL_DAYS, first // DAY + 1)
+    complete = {row[0] for row in db.execute(
+        "SELECT day FROM daily WHERE mpan = ? AND msn = ? AND day >= ? AND readings >= ?",
+        (mpan, msn, first_day, READINGS_PER_DAY)
+    )}
+    return next((day * DAY for day in range(first_day, latest // DAY) if day not in complete), None)
+
+
+def sync(key: str, mpan: str, msn: str, path: str = DB_PATH) -> int:
+    """
+    Downloads the readings newer than the latest one stored, and again from the first recent day with readings missing,
+    so gaps are filled once the meter sends them
+
+    Returns how many readings were downloaded
+    """
+    with connect(path) as db:
+        first, latest = db.execute(
+            "SELECT MIN(interval_start), MAX(interval_start) FROM readings WHERE mpan = ? AND msn = ?", (mpan, msn)
+        ).fetchone()
+        if latest is None:
+            period_from = int((datetime.now(timezone.utc) - timedelta(days=INITIAL_DAYS)).timestamp()) // DAY * DAY
+        else:
+            gap = first_gap(db, mpan, msn, first, latest)
+            period_from = latest + Consumption.INTERVAL if gap is None else gap
+
+        results = fetch_since(key, mpan, msn, period_from)
+        add_readings(db, mpan, msn, results)
+
+    return len(results)
+
+
+def latest(mpan: str, msn: str, count: int = READINGS_PER_DAY, path: str = DB_PATH) -> Consumption.Series:
+    """
+    The most recent `count` stored readings
+    """
+    with connect(path) as db:
+        rows = db.execute(
+            "SELECT interval_start, kwh FROM readings WHERE mpan = ? AND msn = ? ORDER BY interval_start DESC LIMIT ?",
+            (mpan, msn, count)
+        ).fetchall()
+
+    if not rows:
+        raise ValueError("No consumption readings stored")
+
+    rows.reverse()
+    starts, kwh = zip(*rows)
+    return Consumption.Series(np.array(starts, dtype=np.int64), np.array(kwh, dtype=np.float64))
+
+
+def daily_kwh(db: sqlite3.Connection, mpan: str, msn: str, first_day: int, last_day: int) -> float:
+    """
+    Total consumption across a range of days, both inclusive, as days since the unix epoch
+    """
+    return db.execute(
+        "SELECT COALESCE(SUM(kwh), 0) FROM daily WHERE mpan = ? AND msn = ? AND day BETWEEN ? AND ?",
+        (mpan, msn, first_day, last_day)
+    ).fetchone()[0]
+
+
+def last_complete_day(db: sqlite3.Connection, mpan: str, msn: str) -> int | None:
+    return db.execute(
+        "SELECT MAX(day) FROM daily WHERE mpan = ? AND msn = ? AND readings >= ?",
+        (mpan, msn, READINGS_PER_DAY)
+    ).fetchone()[0]
+
+
+def week_over_week(mpan: str, msn: str, path: str = DB_PATH) -> Comparison | None:
+    """
+    The last 7 complete days of consumption against the 7 days before them
+    """
+    with connect(path) as db:
+        last_day = last_complete_day(db, mpan, msn)
+        if last_day is None:
+            return None
+        return Comparison(
+            daily_kwh(db, mpan, msn, last_day - 6, last_day),
+            daily_kwh(db, mpan, msn, last_day - 13, last_day - 7),
+        )
+
+
+def month_to_date(mpan: str, msn: str, path: str = DB_PATH) -> Comparison | None:
+    """
+    Consumption this month, up to the last complete day, against the same days of the previous month
+    """
+    with connect(path) as db:
+        last_day = last_complete_day(db, mpan, msn)
+        if last_day is None:
+            return None
+
+        last_date = datetime.fromtimestamp(last_day * DAY, timezone.utc).date()
+        month_start = last_date.replace(day=1)
+        previous_month_start = (month_start - timedelta(days=1)).replace(day=1)
+        previous_month_days = (month_start - previous_month_start).days
+        previous_last_date = previous_month_start + timedelta(days=min(last_date.day, previous_month_days) - 1)
+
+        to_day = lambda d: int(datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp()) // DAY
+        return Comparison(
+            daily_kwh(db, mpan, msn, to_day(month_start), last_day),
+            daily_kwh(db, mpan, msn, to_day(previous_month_start), to_day(previous_last_date)),
+        )
@@ -0,0 +1,66 @@
+# Gives everything a thread does a deadline, which HTTP requests and rate limit waits keep to,
+# so a host that hangs can't hold a section past its share of the receipt's time budget
+
+import threading, time
+from contextlib import contextmanager
+
+local = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def until(deadline: float | None):
+    """
+    Sets a deadline, as a time.monotonic() time, for the code inside on this thread
+    Nested deadlines can only shorten the one already set, and None leaves it as it is
+    """
+    previous = getattr(local, "deadline", None)
+    if deadline is not None:
+        local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        local.deadline = previous
+
+
+def carry(func):
+    """
+    Wraps func so it keeps this thread's deadline when it runs on another thread, like a pool worker
+    """
+    deadline = getattr(local, "deadline", None)
+
+    def call(*args, **kwargs):
+        with until(deadline):
+            return func(*args, **kwargs)
+
+    return call
+
+
+def remaining() -> float | None:
+    """
+    Seconds left before this thread's deadline, or None if it has none
+    Raises DeadlineExceeded if it has passed
+    """
+    deadline = getattr(local, "deadline", None)
+    if deadline is None:
+        return None
+
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Ran out of time")
+    return left
+
+
+def cap(timeout):
+    """
+    Shortens a requests timeout, either seconds or (connect, read), to the time left
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(min(part, left) for part in timeout)
+    return left if timeout is None else min(timeout, left)
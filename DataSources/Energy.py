@@ -1,23 +1,39 @@
 # Provides a function to get the most recent 24h of energy consumption available on the Octopus Energy API
 
-import requests
-import pandas as pd
+from DataSources import Consumption, ConsumptionStore, Deadline, Http, RateCache, Tariffs, Trace
+from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
-from datetime import datetime, timedelta
-
-def get_energy_consumption(key, product, postcode, mpan, msn) -> str:
+from datetime import datetime
+import time
+
+# How far ahead to look for an announced price change
+RATES_LOOKAHEAD = 90 * Consumption.DAY
+
+# The rate periods whose changes end the validity of the rates, as (tariff code prefix, rate)
+RATE_SCHEDULES = (
+    ("E-1R", "standard-unit-rates"),
+    ("E-1R", "standing-charges"),
+    ("E-2R", "day-unit-rates"),
+    ("E-2R", "night-unit-rates"),
+    ("E-2R", "standing-charges"),
+)
+
+def get_energy_consumption(key, product, postcode, mpan, msn, compare_products=(), compare_days=30) -> str:
     """
     Creates a formatted block of text giving information on recent energy consumption for one metering point
+
+    compare_products: Other Octopus product codes to rank against the current product's tariffs
+    compare_days: How many days of consumption to rank the tariffs on
     """
     
     # ---------- Get Grid Supply Point code from postcode ----------
-    def get_gsp_code(postcode:str)->str:
+    def fetch_gsp_code(postcode:str)->str:
         """
         Finds the Octopus "grid supply point code" for the given postcode
         """
 
         url = f"https://api.octopus.energy/v1/industry/grid-supply-points/?postcode={postcode}"
-        (r := requests.get(url)).raise_for_status()
+        (r := Http.get(url)).raise_for_status()
 
         results = r.json().get("results")
         if not results:
@@ -29,88 +45,96 @@ def get_energy_consumption(key, product, postcode, mpan, msn) -> str:
 
         return group_id.lstrip("_")
     
-    gsp_code = get_gsp_code(postcode)
-    
-    # Form tariff identifier string
-    single_tariff = f"E-1R-{product}-{gsp_code}"
-    dual_tariff = f"E-2R-{product}-{gsp_code}"
-    
-    
+
     # ---------- Get rates ----------
-    def get_rate(tariff, rate:str):
-        """
-        Gets the cost in GBP of a given rate for a given tarriff and product
+    def fetch_rates() -> tuple[dict[str, float], float | None]:
         """
+        Gets the costs in GBP of the single and dual-rate tariffs for the region from one product request,
+        which describes every region's tariffs, and when they next change
 
-        url = f"https://api.octopus.energy/v1/products/{product}/electricity-tariffs/{tariff}/{rate}/"
-        (r := requests.get(url)).raise_for_status()
+        The product request only gives the rates in force now, so the next change is found
+        from the single and dual-rate tariffs' unit rate and standing charge periods, downloaded alongside it
+        """
 
-        results = r.json().get("results")
-        if not results:
-            raise Exception("No energy rate results returned")
-        
-        value = results[0].get("value_inc_vat")
-        if value is None:
+        # Whole days, so the same requests (and cached responses) are reused throughout the day
+        now = time.time()
+        today = int(now) // Consumption.DAY * Consumption.DAY
+        period_from, period_to = Consumption.to_iso(today), Consumption.to_iso(today + RATES_LOOKAHEAD)
+        with ThreadPoolExecutor() as pool:
+            fetch_schedule = Trace.carry(Deadline.carry(Tariffs.fetch_schedule))
+            schedules = [pool.submit(fetch_schedule, product, f"{tariff}-{product}-{gsp_code}", rate, period_from, period_to)
+                         for tariff, rate in RATE_SCHEDULES]
+
+            # Only called once the stored rates stop being valid, so a cached response would give the old rates
+            url = f"https://api.octopus.energy/v1/products/{product}/"
+            (r := Http.get(url, ttl=0)).raise_for_status()
+            data = r.json()
+            changes = [Tariffs.next_change(schedule.result(), now) for schedule in schedules]
+
+        def region_tariff(register: str) -> dict:
+            tariffs = data.get(f"{register}_register_electricity_tariffs", {}).get(f"_{gsp_code}")
+            if not tariffs:
+                raise Exception(f"No {register} register tariff for region {gsp_code}")
+            # Variable products are priced for direct debit, others may only offer one payment method
+            return tariffs.get("direct_debit_monthly") or next(iter(tariffs.values()))
+
+        single = region_tariff("single")
+        dual = region_tariff("dual")
+
+        try:
+            rates = {
+                "single_rate": float(single["standard_unit_rate_inc_vat"]) / 100,
+                "single_standing_charge": float(single["standing_charge_inc_vat"]) / 100,
+                "dual_day_rate": float(dual["day_unit_rate_inc_vat"]) / 100,
+                "dual_night_rate": float(dual["night_unit_rate_inc_vat"]) / 100,
+                "dual_standing_charge": float(dual["standing_charge_inc_vat"]) / 100,
+            }
+        except (KeyError, TypeError):
             raise Exception("Energy rate results not as expected")
-        
-        return float(value) / 100
-    
-    single_rate = get_rate(single_tariff, "standard-unit-rates")
-    single_standing_charge = get_rate(single_tariff, "standing-charges")
-
-    dual_day_rate = get_rate(dual_tariff, "day-unit-rates")
-    dual_night_rate = get_rate(dual_tariff, "night-unit-rates")
-    dual_standing_charge = get_rate(dual_tariff, "standing-charges")
 
-    #print(single_rate, single_standing_charge)
-    #print(dual_day_rate, dual_night_rate, dual_standing_charge)
+        changes = [change for change in changes if change is not None]
+        return rates, min(changes) if changes else None
 
 
-    # ---------- Get consumption data from meter ----------
-    def get_last_24h_consumption():
-        """
-        Requests the most recent available 24 hours (48x 30min readings) of consumption data
-        """
+    # ---------- Get consumption data from meter while looking up the region and rates ----------
+    def sync_consumption():
+        # Only readings newer than those already stored, or missing from recent days, are downloaded
+        try:
+            ConsumptionStore.sync(key, mpan, msn)
+        except Exception as e:
+            print("Failed to sync consumption, using stored readings:", e)
 
-        url = f"https://api.octopus.energy/v1/electricity-meter-points/{mpan}/meters/{msn}/consumption/"
-        url += "?page_size=48&order_by=-period"
+    with ThreadPoolExecutor() as pool:
+        # The worker keeps this source's deadline, and its requests are traced under this source's span
+        synced = pool.submit(Trace.carry(Deadline.carry(sync_consumption)))
+        gsp_code = RateCache.get_gsp_code(postcode, lambda: fetch_gsp_code(postcode))
+        rates = RateCache.get_rates(f"{product}/{gsp_code}", fetch_rates)
+        synced.result()
 
-        (r := requests.get(url, auth=(key, ''))).raise_for_status()
-        return r.json().get('results', [])
-    
-    consumption_data = get_last_24h_consumption()
+    single_rate = rates["single_rate"]
+    single_standing_charge = rates["single_standing_charge"]
+    dual_day_rate = rates["dual_day_rate"]
+    dual_night_rate = rates["dual_night_rate"]
+    dual_standing_charge = rates["dual_standing_charge"]
 
 
     # ---------- Process data ----------
-    timeseries_df = pd.DataFrame(consumption_data)
-    timeseries_df['interval_start'] = pd.to_datetime(timeseries_df['interval_start'], utc=True)
-    start_time = timeseries_df['interval_start'].min()
-    end_time = timeseries_df['interval_start'].max() + timedelta(minutes=30)
-
-    # Extract date and time components
-    timeseries_df['date'] = timeseries_df['interval_start'].dt.normalize()
-    to_unix = lambda x: pd.to_datetime(x.total_seconds(), unit='s', origin='unix')
-    timeseries_df['time'] = to_unix((timeseries_df['interval_start'] - timeseries_df['date']).dt)
-
-    # Define the range of the night rate period - these are in UTC like everything else
-    night_start = to_unix(pd.Timedelta("00:30:00"))
-    day_start = to_unix(pd.Timedelta("07:30:00"))
-    day_mask = (timeseries_df['time'] >= day_start) | (timeseries_df['time'] < night_start)
-    night_mask = (timeseries_df['time'] < day_start) & (timeseries_df['time'] >= night_start)
-
-    # Calculate usage during day and night periods
-    day_usage = timeseries_df[day_mask]['consumption'].sum()
-    night_usage = timeseries_df[night_mask]['consumption'].sum()
-    total_usage = day_usage + night_usage
-    day_usage_percent = day_usage / total_usage * 100
-    night_usage_percent = night_usage / total_usage * 100
-    
+    # The most recent available 24 hours (48x 30min readings) of consumption data
+    series = ConsumptionStore.latest(mpan, msn)
+    start_time = series.start
+    end_time = series.end
+
+    # Calculate usage during day and night periods - these are in UTC like everything else
+    usage = Consumption.split_day_night(series)
+    day_usage, night_usage, total_usage = usage.day, usage.night, usage.total
+    day_usage_percent = usage.day_percent
+    night_usage_percent = usage.night_percent
+
     # Calculate cost in £ for both the single-rate tariff and dual-rate tariff
-    single_charge = (day_usage + night_usage) * single_rate
-    single_total_charge = single_charge + single_standing_charge
-    dual_day_charge = day_usage * dual_day_rate
-    dual_night_charge = night_usage * dual_night_rate
-    dual_total_charge = dual_day_charge + dual_night_charge + dual_standing_charge
+    single_total_charge = Consumption.single_rate_cost(usage, single_rate, single_standing_charge)
+    dual_day_charge, dual_night_charge, dual_total_charge = Consumption.dual_rate_cost(
+        usage, dual_day_rate, dual_night_rate, dual_standing_charge
+    )
     single_dual_difference = single_total_charge - dual_total_charge
 
     comparison_string = f"With a single rate tariff, this would have cost £{single_total_charge:.2f} (+£{single_dual_difference:.2f})"
@@ -127,6 +151,34 @@ def get_energy_consumption(key, product, postcode, mpan, msn) -> str:
     data_string += "\n" + tabulate(table, headers=[None, "Usage [kWh]", "Charge"])
     data_string += "\n\n" + comparison_string
 
+    # ---------- Longer term summaries ----------
+    summaries = [
+        ("Last 7 days", "previous week", ConsumptionStore.week_over_week(mpan, msn)),
+        ("Month to date", "last month", ConsumptionStore.month_to_date(mpan, msn)),
+    ]
+    if any(comparison for _, _, comparison in summaries):
+        data_string += "\n"
+    for label, previous_label, comparison in summaries:
+        if comparison is None:
+            continue
+        data_string += f"\n{label}: {comparison.kwh:.1f} kWh"
+        if comparison.change_percent is not None:
+            data_string += f" ({comparison.change_percent:+.0f}% on {previous_label})"
+
+    # ---------- Tariff ranking ----------
+    if compare_products:
+        history = ConsumptionStore.latest(mpan, msn, compare_days * ConsumptionStore.READINGS_PER_DAY)
+        tariffs = [
+            Tariffs.Tariff(f"{product} single", Tariffs.fixed(single_rate), Tariffs.fixed(single_standing_charge)),
+            Tariffs.Tariff(f"{product} dual", Tariffs.fixed(dual_day_rate), Tariffs.fixed(dual_standing_charge), Tariffs.fixed(dual_night_rate)),
+        ]
+        tariffs += Tariffs.fetch_tariffs(list(compare_products), gsp_code, history)
+
+        days = round(Consumption.days_covered(history))
+        data_string += f"\n\nCheapest tariffs over the last {days} days:"
+        for position, (name, cost) in enumerate(Tariffs.rank(tariffs, history), start=1):
+            data_string += f"\n{position}. {name} £{cost:.2f}"
+
     return (data_string, "body")
 
 
@@ -0,0 +1,114 @@
+# Reads RSS and Atom feeds incrementally, yielding each entry as soon as its closing tag arrives,
+# so callers that only need the first few entries stop downloading and parsing the rest of the feed
+
+from contextlib import closing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, NamedTuple
+from xml.etree.ElementTree import XMLPullParser
+from DataSources import Http
+
+# Local names of the elements that hold one entry in RSS 2.0, RSS 1.0 and Atom
+ENTRY_TAGS = {"item", "entry"}
+
+DATE_TAGS = ("pubDate", "published", "updated", "date")
+DESCRIPTION_TAGS = ("description", "summary", "content")
+
+
+class FeedEntry(NamedTuple):
+    """
+    One feed item, named like feedparser's entries
+
+    published: The date as written in the feed, or None
+    media_thumbnail: The attributes of each media:thumbnail, like {"url": ..., "width": ...}
+    """
+    title: str | None
+    link: str | None
+    description: str | None
+    published: str | None
+    media_thumbnail: list[dict]
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_entry(element) -> FeedEntry:
+    fields = {}
+    thumbnails = []
+
+    for child in element.iter():
+        name = local_name(child.tag)
+        if name == "thumbnail":
+            thumbnails.append(dict(child.attrib))
+        elif name == "link" and "href" in child.attrib:
+            # Atom links are in an attribute, and the first is the entry's own page
+            fields.setdefault("link", child.attrib["href"])
+        elif child is not element and child.text:
+            fields.setdefault(name, child.text.strip())
+
+    return FeedEntry(
+        fields.get("title"),
+        fields.get("link"),
+        next((fields[tag] for tag in DESCRIPTION_TAGS if tag in fields), None),
+        next((fields[tag] for tag in DATE_TAGS if tag in fields), None),
+        thumbnails,
+    )
+
+
+def iter_entries(chunks: Iterable[bytes]) -> Iterator[FeedEntry]:
+    """
+    Parses a feed from chunks of its body, yielding entries as they are completed
+
+    Each entry is dropped from the tree once yielded, so memory stays flat however long the feed is.
+    Raises xml.etree.ElementTree.ParseError if the feed is malformed before the caller stops reading.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    open_elements = []
+
+    def entries():
+        for event, element in parser.read_events():
+            if event == "start":
+                open_elements.append(element)
+                continue
+
+            open_elements.pop()
+            if local_name(element.tag) in ENTRY_TAGS:
+                yield parse_entry(element)
+                if open_elements:
+                    open_elements[-1].remove(element)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from entries()
+
+    parser.close()
+    yield from entries()
+
+
+def read(url: str, **kwargs) -> Iterator[FeedEntry]:
+    """
+    Streams the entries of the feed at a url, closing the connection as soon as the caller stops
+
+    kwargs: Passed to Http.stream
+    """
+    with closing(Http.stream(url, **kwargs)) as chunks:
+        yield from iter_entries(chunks)
+
+
+def parse_date(text: str) -> datetime | None:
+    """
+    Reads an RSS (RFC 822) or Atom (ISO 8601) date, assuming UTC if it has no timezone
+    Returns None if it can't be read
+    """
+    try:
+        date = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        try:
+            date = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except (TypeError, ValueError):
+            return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
@@ -0,0 +1,72 @@
+# Keeps reverse geocoded place names by geohash cell, so coordinates anywhere in a cell that has been looked up
+# before resolve locally instead of calling Nominatim again
+
+import os, sqlite3, time
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "geocode.sqlite3")
+
+# Geohash characters per key. 5 gives cells of about 4.9 x 4.9 km, the largest that fit inside the
+# roughly 9.8 km tiles Nominatim resolves place names at with zoom=12
+PRECISION = 5
+
+# Place names practically never change
+MAX_AGE = 365 * 24 * 60 * 60
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat_long: tuple[float, float], precision: int = PRECISION) -> str:
+    """
+    The geohash of the cell containing a point, interleaving longitude and latitude bits, longitude first
+    """
+    ranges = [[-180.0, 180.0], [-90.0, 90.0]]
+    values = (lat_long[1], lat_long[0])
+    chars = []
+    bits = 0
+    bit_count = 0
+    axis = 0
+
+    while len(chars) < precision:
+        low, high = ranges[axis]
+        middle = (low + high) / 2
+        if values[axis] >= middle:
+            bits = bits * 2 + 1
+            ranges[axis][0] = middle
+        else:
+            bits = bits * 2
+            ranges[axis][1] = middle
+        axis = 1 - axis
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = bit_count = 0
+
+    return "".join(chars)
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS places (cell TEXT PRIMARY KEY, label TEXT, lat REAL, long REAL, fetched_at REAL)")
+    return db
+
+
+def lookup(lat_long: tuple[float, float], path: str = DB_PATH) -> str | None:
+    """
+    The stored name for the cell containing lat_long, if it was looked up within MAX_AGE
+    """
+    with connect(path) as db:
+        row = db.execute("SELECT label, fetched_at FROM places WHERE cell = ?", (geohash(lat_long),)).fetchone()
+    if row and time.time() - row[1] < MAX_AGE:
+        return row[0]
+    return None
+
+
+def store(lat_long: tuple[float, float], label: str, path: str = DB_PATH):
+    """
+    Stores the name of the place at lat_long for its whole cell
+    """
+    with connect(path) as db:
+        db.execute("INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?)", (geohash(lat_long), label, *lat_long, time.time()))
@@ -0,0 +1,329 @@
+# Provides one shared HTTP client for every data source, so connections are pooled and kept alive per host,
+# every request has a timeout, transient failures are retried with backoff and responses are cached on disk
+
+import socket, time
+from typing import Iterator
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, NameResolutionError, NewConnectionError, ResponseError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+from DataSources import Cache, Deadline, RateLimit, Trace
+
+# (connect, read) timeouts in seconds, used unless a caller passes its own
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Number of hosts to keep pools for, and connections kept open per host
+POOL_HOSTS = 16
+POOL_SIZE = 8
+
+# Longest wait before a retry, including one asked for with Retry-After. A longer wait gives up instead
+MAX_RETRY_WAIT = 10
+
+
+class DeadlineRetry(Retry):
+    """
+    Retry that gives up rather than wait longer than MAX_RETRY_WAIT, or past this thread's Deadline,
+    returning the response that would have been retried
+    """
+
+    def wait_time(self, response=None) -> float:
+        retry_after = self.get_retry_after(response) if self.respect_retry_after_header and response else None
+        return retry_after or self.get_backoff_time()
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        wait = retry.wait_time(response)
+        left = Deadline.remaining()
+        if wait > MAX_RETRY_WAIT or (left is not None and wait >= left):
+            Trace.event("http_retry_skipped", host=getattr(_pool, "host", None), wait=round(wait, 2))
+            raise MaxRetryError(_pool, url, error or ResponseError(f"Not waiting {wait:.1f}s to retry"))
+        return retry
+
+    def sleep(self, response=None):
+        # increment has already checked the wait is short enough
+        time.sleep(self.wait_time(response))
+
+
+# Retry connection errors and throttling/server errors a few times, waiting 0.5s, 1s, 2s... between attempts
+RETRY = DeadlineRetry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("GET", "HEAD"),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+
+class TracedConnection:
+    """
+    Mixed into urllib3's connections to trace name resolution and connecting separately
+    """
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        Trace.record("http.dns", start, host=self.host)
+
+        # Connect to each address in turn like urllib3 does, but with the name already resolved
+        dns_host = self._dns_host
+        try:
+            for position, (*_, address) in enumerate(addresses):
+                self._dns_host = address[0]
+                try:
+                    with Trace.span("http.connect", host=self.host):
+                        return super()._new_conn()
+                except NewConnectionError:
+                    if position == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+
+    def connect(self):
+        # Includes the TLS handshake for https
+        with Trace.span("http.open", host=self.host):
+            super().connect()
+        Trace.count("http_connections", host=self.host)
+
+
+class TracedHTTPConnection(TracedConnection, HTTPConnection):
+    pass
+
+
+class TracedHTTPSConnection(TracedConnection, HTTPSConnection):
+    pass
+
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+
+class Adapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connections are traced
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TracedHTTPConnectionPool, "https": TracedHTTPSConnectionPool}
+
+
+def make_session() -> requests.Session:
+    """
+    Creates a session with per-host keep-alive pools and the retry policy mounted for http and https
+    """
+    session = requests.Session()
+    adapter = Adapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "User-Agent": "receipts",
+    })
+    return session
+
+
+session = make_session()
+
+# Bytes yielded at a time by stream()
+STREAM_CHUNK = 16 * 1024
+
+# Largest body stream() still reads to the end for the cache after the caller stops early
+STREAM_CACHE_LIMIT = 2 * 1024 * 1024
+
+# Marks that a request should use the ttl configured for its url in Cache.TTLS
+CONFIGURED = object()
+
+
+def send(url: str, stream: bool = False, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared session once the host's rate limit allows,
+    tracing the wait for the response and its transfer
+
+    The timeout is shortened to fit this thread's Deadline, if it has one
+    """
+    host = urlsplit(url).hostname
+    RateLimit.acquire(host)
+    kwargs["timeout"] = Deadline.cap(kwargs.get("timeout"))
+    start = time.perf_counter()
+    with Trace.span("http.request", host=host):
+        response = session.get(url, stream=stream, **kwargs)
+
+    headers_at = start + response.elapsed.total_seconds()
+    Trace.record("http.wait", start, headers_at, host=host)
+    if not stream:
+        Trace.record("http.transfer", headers_at, host=host)
+        count_bytes(response, host, len(response.content))
+
+    Trace.count("http_requests", host=host, status=response.status_code)
+    return response
+
+
+def count_bytes(response: requests.Response, host: str, body_size: int):
+    """
+    Counts a response's bytes as decoded, and as sent over the wire where it was compressed
+    """
+    Trace.count("http_body_bytes", body_size, host=host)
+    if hasattr(response.raw, "tell"):
+        Trace.count("http_wire_bytes", response.raw.tell(), host=host)
+
+
+def from_cache(entry: Cache.Entry, result: str, host: str):
+    Trace.count("http_cache", host=host, result=result)
+    return entry
+
+
+def get(url: str, timeout=DEFAULT_TIMEOUT, ttl=CONFIGURED, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared session and disk cache
+
+    A stored response younger than `ttl` is returned without contacting the server. An older one is revalidated
+    with If-None-Match/If-Modified-Since, and is returned anyway if the server can't be reached.
+
+    url: The url to fetch
+    timeout: (connect, read) timeout in seconds
+    ttl: Seconds a cached response stays fresh, or None to bypass the cache. Defaults to the value in Cache.TTLS
+    kwargs: Any other arguments accepted by requests.get, like params, headers or auth
+    """
+    host = urlsplit(url).hostname
+    if ttl is CONFIGURED:
+        ttl = Cache.ttl_for(url)
+    if ttl is None:
+        Trace.count("http_cache", host=host, result="bypass")
+        return send(url, timeout=timeout, **kwargs)
+
+    key = Cache.make_key(url, kwargs.get("params"))
+    entry = Cache.lookup(key)
+    if entry and entry.age < ttl:
+        return from_cache(entry, "hit", host).response()
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry:
+        headers.update(entry.validators())
+
+    try:
+        response = send(url, timeout=timeout, headers=headers, **kwargs)
+    except requests.RequestException as e:
+        # Offline or the host is down - serve the last stored copy if there is one
+        if entry:
+            Trace.event("http_fallback", url=url, error=repr(e), age=round(entry.age))
+            return from_cache(entry, "stale", host).response()
+        raise
+
+    if response.status_code == 304 and entry:
+        Cache.touch(key)
+        return from_cache(entry, "revalidated", host).response()
+    if response.status_code == 200:
+        Trace.count("http_cache", host=host, result="miss")
+        Cache.store(key, response)
+    elif entry and response.status_code >= 500:
+        Trace.event("http_fallback", url=url, error=f"HTTP {response.status_code}", age=round(entry.age))
+        return from_cache(entry, "stale", host).response()
+
+    return response
+
+
+def chunks(body: bytes, size: int = STREAM_CHUNK) -> Iterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(body), size):
+        yield view[start:start + size]
+
+
+def stream(url: str, timeout=DEFAULT_TIMEOUT, ttl=CONFIGURED, chunk_size: int = STREAM_CHUNK, **kwargs) -> Iterator[bytes]:
+    """
+    Like get, but yields the body in chunks as it arrives, so the caller can stop reading part way through
+
+    Cached responses are used and revalidated the same way, and the body is stored once read to the end.
+    If the caller stops early, the rest of a cacheable body up to STREAM_CACHE_LIMIT is still read so it can be stored,
+    and anything larger is left undownloaded.
+    Raises requests.HTTPError for error statuses.
+    """
+    host = urlsplit(url).hostname
+    if ttl is CONFIGURED:
+        ttl = Cache.ttl_for(url)
+
+    key = entry = None
+    if ttl is None:
+        Trace.count("http_cache", host=host, result="bypass")
+    else:
+        key = Cache.make_key(url, kwargs.get("params"))
+        entry = Cache.lookup(key)
+        if entry and entry.age < ttl:
+            yield from chunks(from_cache(entry, "hit", host).body, chunk_size)
+            return
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry:
+        headers.update(entry.validators())
+
+    try:
+        response = send(url, stream=True, timeout=timeout, headers=headers, **kwargs)
+    except requests.RequestException as e:
+        if entry:
+            Trace.event("http_fallback", url=url, error=repr(e), age=round(entry.age))
+            yield from chunks(from_cache(entry, "stale", host).body, chunk_size)
+            return
+        raise
+
+    with response:
+        if response.status_code == 304 and entry:
+            Cache.touch(key)
+            yield from chunks(from_cache(entry, "revalidated", host).body, chunk_size)
+            return
+        if entry and response.status_code >= 500:
+            Trace.event("http_fallback", url=url, error=f"HTTP {response.status_code}", age=round(entry.age))
+            yield from chunks(from_cache(entry, "stale", host).body, chunk_size)
+            return
+        response.raise_for_status()
+
+        body = bytearray()
+        size = 0
+        start = time.perf_counter()
+        body_chunks = response.iter_content(chunk_size)
+        complete = True
+        try:
+            for chunk in body_chunks:
+                # The read timeout only applies to each chunk, so a slow trickle is stopped here
+                Deadline.remaining()
+                size += len(chunk)
+                if key:
+                    body += chunk
+                try:
+                    yield chunk
+                except GeneratorExit:
+                    complete = False
+                    break
+
+            if not complete and key and int(response.headers.get("Content-Length") or 0) <= STREAM_CACHE_LIMIT:
+                # Small bodies like feeds are read to the end anyway, so the next run can use or revalidate them
+                try:
+                    for chunk in body_chunks:
+                        Deadline.remaining()
+                        size += len(chunk)
+                        body += chunk
+                        if len(body) > STREAM_CACHE_LIMIT:
+                            break
+                    else:
+                        complete = True
+                except Exception as e:
+                    Trace.event("http_cache_incomplete", url=url, error=repr(e))
+        finally:
+            # Only up to where reading stopped
+            Trace.record("http.transfer", start, host=host)
+            count_bytes(response, host, size)
+
+        Trace.count("http_cache", host=host, result="miss" if key else "bypass")
+        if key and complete and response.status_code == 200:
+            response._content = bytes(body)
+            Cache.store(key, response)
@@ -0,0 +1,157 @@
+# Provides a function to download an image and turn it into a printer-ready 1-bit raster,
+# keeping finished rasters on disk so each image is only downloaded and dithered once
+
+import hashlib, os, re, tempfile
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from DataSources import Http
+from DataSources.Cache import CACHE_DIR
+
+IMAGE_DIR = os.path.join(CACHE_DIR, "images")
+
+# Least recently used rasters are deleted once there are more than this many bytes of them
+MAX_SIZE = 16 * 1024 * 1024
+
+# Dot width of an 80mm TM-T88IV
+PRINTER_WIDTH = 512
+
+# Widths the BBC image server will resize to, and the size segment of its urls
+BBC_WIDTHS = [85, 96, 128, 160, 192, 240, 320, 480, 624, 800, 976]
+BBC_SIZE = re.compile(r"^(https://ichef\.bbci\.co\.uk/(?:ace|news)/(?:standard|ws)/)(\d+)(/.*)$")
+
+# 4x4 Bayer matrix, as thresholds between 0 and 255
+BAYER_4 = (np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+]) + 0.5) * (255 / 16)
+
+
+def sized_url(url: str, width: int) -> str:
+    """
+    Rewrites an image url to ask for the smallest variant at least `width` pixels wide, where the server supports it
+    """
+    match = BBC_SIZE.match(url)
+    if not match:
+        return url
+
+    size = next((w for w in BBC_WIDTHS if w >= width), BBC_WIDTHS[-1])
+    return f"{match.group(1)}{size}{match.group(3)}"
+
+
+def decode(data: bytes, width: int) -> Image.Image:
+    """
+    Decodes an image straight to greyscale, letting the JPEG decoder downscale while decoding when it can
+    """
+    image = Image.open(BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("L", (width, width * image.height // image.width))
+
+    # Transparent areas print as paper
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+
+    return image.convert("L")
+
+
+def resize(image: Image.Image, width: int) -> Image.Image:
+    """
+    Shrinks an image to fit `width` dots, never enlarging it
+    """
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def dither_ordered(image: Image.Image) -> Image.Image:
+    """
+    Ordered (Bayer) dithering, compared against a tiled threshold matrix in one vectorised step
+    """
+    pixels = np.asarray(image, dtype=np.float32)
+    height, width = pixels.shape
+    thresholds = np.tile(BAYER_4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+    return Image.fromarray(pixels > thresholds).convert("1")
+
+
+def dither(image: Image.Image, method: str = "floyd-steinberg") -> Image.Image:
+    """
+    Converts a greyscale image to 1 bit per pixel
+
+    method: "floyd-steinberg" for error diffusion, "ordered" for Bayer dithering or "threshold" for none
+    """
+    match method:
+        case "ordered":
+            return dither_ordered(image)
+        case "threshold":
+            return Image.fromarray(np.asarray(image) >= 128).convert("1")
+        case _:
+            # Pillow diffuses the error in C, far faster than doing the same in Python
+            return image.convert("1", dither=Image.Dither.FLOYDSTEINBERG)
+
+
+def raster_path(url: str, width: int, method: str) -> str:
+    key = hashlib.sha1(f"{url}|{width}|{method}".encode()).hexdigest()
+    return os.path.join(IMAGE_DIR, f"{key}.png")
+
+
+def evict(max_size: int = MAX_SIZE):
+    """
+    Deletes the least recently used rasters until the rest fit in max_size
+    """
+    rasters = []
+    for entry in os.scandir(IMAGE_DIR):
+        if entry.name.endswith(".png"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            rasters.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in rasters)
+    for _, size, path in sorted(rasters):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def get_raster(url: str, width: int = PRINTER_WIDTH, method: str = "floyd-steinberg") -> Image.Image:
+    """
+    Gets a printer-ready 1-bit image for a url, from the raster cache if it was made before
+
+    url: The image to download
+    width: Maximum width in printer dots
+    method: The dithering method, see dither()
+    """
+    path = raster_path(url, width, method)
+    try:
+        raster = Image.open(path)
+        # The modification time is when it was last used, for evict()
+        os.utime(path)
+        return raster
+    except FileNotFoundError:
+        pass
+
+    (response := Http.get(sized_url(url, width))).raise_for_status()
+    raster = dither(resize(decode(response.content, width), width), method)
+
+    # A file of its own, so threads or processes making the same raster never replace it with a half-written one
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=IMAGE_DIR, suffix=".tmp", delete=False) as file:
+        try:
+            raster.save(file, format="PNG")
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, path)
+    evict()
+    return raster
@@ -1,11 +1,11 @@
-import feedparser, requests
+from DataSources import Feeds, Images
 from datetime import datetime, timedelta, timezone
-from email.utils import parsedate_to_datetime
-from io import BytesIO
-from PIL import Image, ImageFile
-import os
-from dotenv import load_dotenv
-load_dotenv("../.env")
+from contextlib import closing
+from xml.etree.ElementTree import ParseError
+from PIL import ImageFile
+
+# Width in printer dots of the thumbnail printed above the headlines
+THUMBNAIL_WIDTH = 240
 
 
 def get_headline_data(rss_url:str, limit:int=5, max_age:int=24) -> list[tuple[str,str,str]]:
@@ -22,41 +22,35 @@ def get_headline_data(rss_url:str, limit:int=5, max_age:int=24) -> list[tuple[st
         List of tuples: (title, formatted_pubDate, media_thumbnail_url)
         where formatted_pubDate is a "HH:MM DD/MM" string.
     """
-    feed = feedparser.parse(rss_url)
-
-    if feed.bozo:
-        raise RuntimeError(f"Failed to parse RSS feed: {rss_url}")
-
     cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age)
 
     results = []
 
-    for entry in feed.entries:
-        if len(results) >= limit:
-            break
-
-        if not hasattr(entry, "published"):
-            continue
-
+    # The feed is read as it arrives, and the rest isn't downloaded once there are enough articles
+    with closing(Feeds.read(rss_url)) as entries:
         try:
-            pub_date = parsedate_to_datetime(entry.published)
-            if pub_date.tzinfo is None:
-                pub_date = pub_date.replace(tzinfo=timezone.utc)
-        except Exception:
-            continue
+            for entry in entries:
+                if not entry.published:
+                    continue
+
+                pub_date = Feeds.parse_date(entry.published)
+                if pub_date is None or pub_date < cutoff:
+                    continue
 
-        if pub_date < cutoff:
-            continue
+                # Format date as hh:mm DD/MM
+                formatted_date = pub_date.strftime("%H:%M %d/%m")
 
-        # Format date as hh:mm DD/MM
-        formatted_date = pub_date.strftime("%H:%M %d/%m")
+                # Extract thumbnail url if present
+                thumbnail_url = None
+                if entry.media_thumbnail:
+                    thumbnail_url = entry.media_thumbnail[0].get("url")
 
-        # Extract thumbnail url if present
-        thumbnail_url = None
-        if "media_thumbnail" in entry and entry.media_thumbnail:
-            thumbnail_url = entry.media_thumbnail[0].get("url")
+                results.append((entry.title, formatted_date, thumbnail_url))
+                if len(results) >= limit:
+                    break
 
-        results.append((entry.title, formatted_date, thumbnail_url))
+        except ParseError as e:
+            raise RuntimeError(f"Failed to parse RSS feed: {rss_url}") from e
 
     return results
 
@@ -87,9 +81,7 @@ def format_news(articles: tuple[str, str, str])->tuple[ImageFile.ImageFile, list
     # Try to get an image for the first article
     try:
         first_thumbnail = articles[0][2] if articles else None
-        response = requests.get(first_thumbnail)
-        response.raise_for_status()
-        image = Image.open(BytesIO(response.content))
+        image = Images.get_raster(first_thumbnail, THUMBNAIL_WIDTH)
     except Exception:
         image = None
 
@@ -102,6 +94,9 @@ def get_headlines(rss_url, limit=5, max_age=24):
 
 
 if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv
+    load_dotenv("../.env")
 
     # Load in RSS feed urls
     feeds = [
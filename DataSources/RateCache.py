@@ -0,0 +1,67 @@
+# Keeps Octopus tariff rates with the time they're valid until, and the grid supply point of each postcode,
+# so they are only downloaded again when the stored ones have changed or may have
+
+import json, os, sqlite3, time
+from typing import Callable
+from DataSources import Consumption
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "rates.sqlite3")
+
+DAY = Consumption.DAY
+
+# Rates with no end date can still be replaced, with notice, so check them this often
+OPEN_ENDED_MAX_AGE = 7 * DAY
+
+# Postcodes practically never move between grid supply points
+GSP_MAX_AGE = 365 * DAY
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS windowed_rates (key TEXT PRIMARY KEY, rates TEXT, valid_to REAL, fetched_at REAL);
+        CREATE TABLE IF NOT EXISTS gsp_codes (postcode TEXT PRIMARY KEY, gsp_code TEXT, fetched_at REAL);
+    """)
+    return db
+
+
+def is_fresh(valid_to: float | None, fetched_at: float, now: float) -> bool:
+    if valid_to is None:
+        return now - fetched_at < OPEN_ENDED_MAX_AGE
+    # Kept right up to the change, as fetching any earlier would only get the rates in force now again
+    return now < valid_to
+
+
+def get_rates(key: str, fetch_rates: Callable[[], tuple[dict[str, float], float | None]], path: str = DB_PATH) -> dict[str, float]:
+    """
+    Gets a set of rates that are fetched together, only calling fetch_rates once the stored ones stop being valid
+
+    key: Identifies the set of rates, like the product and region
+    fetch_rates: Downloads the rates, returning (rate name to value, unix time they change or None if not yet known)
+    """
+    now = time.time()
+    with connect(path) as db:
+        row = db.execute("SELECT rates, valid_to, fetched_at FROM windowed_rates WHERE key = ?", (key,)).fetchone()
+        if row and is_fresh(row[1], row[2], now):
+            return json.loads(row[0])
+
+        rates, valid_to = fetch_rates()
+        db.execute("INSERT OR REPLACE INTO windowed_rates VALUES (?, ?, ?, ?)", (key, json.dumps(rates), valid_to, now))
+        return rates
+
+
+def get_gsp_code(postcode: str, fetch: Callable[[], str], path: str = DB_PATH) -> str:
+    """
+    Gets the grid supply point code for a postcode, only calling fetch if it isn't stored yet
+    """
+    postcode = postcode.replace(" ", "").upper()
+    with connect(path) as db:
+        row = db.execute("SELECT gsp_code, fetched_at FROM gsp_codes WHERE postcode = ?", (postcode,)).fetchone()
+        if row and time.time() - row[1] < GSP_MAX_AGE:
+            return row[0]
+
+        gsp_code = fetch()
+        db.execute("INSERT OR REPLACE INTO gsp_codes VALUES (?, ?, ?)", (postcode, gsp_code, time.time()))
+        return gsp_code
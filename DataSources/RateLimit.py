@@ -0,0 +1,158 @@
+# Limits how fast every process on this machine calls each host, with a token bucket per host kept in a small
+# SQLite database, so cron runs of ReceiptPrinter, ReceiptConsole, Spotify and Prefetch that overlap still stay
+# within the providers' limits together. Waiting requests are served by priority, so an interactive print
+# goes ahead of a background prefetch.
+#
+# Limits can be changed with RATE_LIMITS, like "api.octopus.energy=5/10,nominatim.openstreetmap.org=1/1"
+# for 5 requests per second in bursts of up to 10, and 1 per second with no bursts.
+
+import itertools, os, re, sqlite3, time
+from typing import NamedTuple
+from DataSources import Deadline, Trace
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "ratelimit.sqlite3")
+
+# Lower numbers go first, as in the spooler
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class Limit(NamedTuple):
+    """
+    rate: Requests per second, on average
+    burst: Most requests that can be made at once after a quiet spell
+    """
+    rate: float
+    burst: float = 1
+
+
+# The first pattern matching a host decides its limit. Hosts that match none aren't limited
+LIMITS = [
+    (r"^nominatim\.openstreetmap\.org$", Limit(1, 1)),       # Usage policy: at most 1 request per second
+    (r"^api\.wikimedia\.org$", Limit(10, 10)),
+    (r"^api\.octopus\.energy$", Limit(5, 20)),               # Tariff lookups burst, then stay within 5/s
+    (r"^feeds\.bbci\.co\.uk$", Limit(2, 5)),
+    (r"^ichef\.bbci\.co\.uk$", Limit(10, 10)),
+    (r"^robertburns\.org$", Limit(2, 4)),
+    (r"^wordsmith\.org$", Limit(1, 2)),
+    (r"^scannables\.scdn\.co$", Limit(10, 10)),
+]
+
+# Longest sleep between checks while waiting, so a higher priority request that arrives is noticed
+POLL = 0.25
+
+# A waiting request that hasn't checked in for this long is taken to have died
+WAITER_EXPIRY = 5
+
+# This process's priority, set by each entry point
+priority = PRIORITY_NORMAL
+
+waiter_ids = itertools.count()
+
+
+def parse_limits(text: str) -> list[tuple[str, Limit]]:
+    """
+    Reads RATE_LIMITS, a comma separated list of host=rate/burst
+    """
+    limits = []
+    for entry in filter(None, (entry.strip() for entry in text.split(","))):
+        host, _, value = entry.partition("=")
+        rate, _, burst = value.partition("/")
+        limits.append(("^" + re.escape(host.strip()) + "$", Limit(float(rate), float(burst or 1))))
+    return limits
+
+
+def limit_for(host: str) -> Limit | None:
+    for pattern, limit in parse_limits(os.getenv("RATE_LIMITS", "")) + LIMITS:
+        if re.search(pattern, host):
+            return limit
+    return None
+
+
+def set_priority(value: int):
+    """
+    Sets the priority of every request this process makes from now on
+    """
+    global priority
+    priority = value
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Transactions are begun explicitly, so the bucket is read and updated under one write lock
+    db = sqlite3.connect(path, timeout=30, isolation_level=None)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS buckets (host TEXT PRIMARY KEY, tokens REAL, updated_at REAL);
+        CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, host TEXT, priority INTEGER, since REAL, seen_at REAL);
+    """)
+    return db
+
+
+def try_take(db: sqlite3.Connection, host: str, limit: Limit, waiter_id: str, request_priority: int, since: float) -> float:
+    """
+    Takes a token for host if one is free and no request with a better claim is waiting for it
+
+    Returns 0 if a token was taken, otherwise how long to wait before trying again
+    """
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        row = db.execute("SELECT tokens, updated_at FROM buckets WHERE host = ?", (host,)).fetchone()
+        tokens = limit.burst if row is None else min(limit.burst, row[0] + (now - row[1]) * limit.rate)
+
+        # Requests waiting with a higher priority, or the same priority and waiting longer, go first
+        ahead = db.execute(
+            "SELECT COUNT(*) FROM waiters WHERE host = ? AND id != ? AND seen_at > ? AND (priority < ? OR (priority = ? AND since < ?))",
+            (host, waiter_id, now - WAITER_EXPIRY, request_priority, request_priority, since)
+        ).fetchone()[0]
+
+        if tokens >= 1 and not ahead:
+            db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (host, tokens - 1, now))
+            db.execute("DELETE FROM waiters WHERE id = ? OR seen_at <= ?", (waiter_id, now - WAITER_EXPIRY))
+            db.execute("COMMIT")
+            return 0
+
+        db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (host, tokens, now))
+        db.execute("INSERT OR REPLACE INTO waiters VALUES (?, ?, ?, ?, ?)", (waiter_id, host, request_priority, since, now))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+    # Those ahead need the next tokens first
+    return min(POLL, max(POLL / 10, (ahead + 1 - tokens) / limit.rate))
+
+
+def acquire(host: str, request_priority: int = None, path: str = DB_PATH):
+    """
+    Blocks until a request to host is allowed by its limit, if it has one
+    Raises Deadline.DeadlineExceeded if this thread's deadline passes first
+    """
+    limit = limit_for(host)
+    if limit is None:
+        return
+
+    request_priority = priority if request_priority is None else request_priority
+    since = time.time()
+    waiter_id = f"{os.getpid()}-{next(waiter_ids)}"
+    start = time.perf_counter()
+
+    db = connect(path)
+    try:
+        while wait := try_take(db, host, limit, waiter_id, request_priority, since):
+            # Raises once this thread's deadline has passed
+            left = Deadline.remaining()
+            time.sleep(wait if left is None else min(wait, left))
+    except BaseException:
+        with db:
+            db.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+        raise
+    finally:
+        db.close()
+
+    waited = time.perf_counter() - start
+    if waited > POLL / 10:
+        Trace.record("http.queue", start, host=host)
+        Trace.count("rate_limited_seconds", waited, host=host)
@@ -1,11 +1,20 @@
-import requests
+# Provides a function to name the place at a latitude/longitude, using Nominatim reverse geocoding
+#
+# Usage:
+#   python -m DataSources.ReverseGeocode                      Name the place at LAT_LONG in .env
+#   python -m DataSources.ReverseGeocode 55.95,-3.19 ...      Name and store each of these places
+#   python -m DataSources.ReverseGeocode --file places.txt    Name and store every lat,long line in a file
 
-def reverse_geocode_label(lat_long: tuple[float,float]) -> str:
+from DataSources import GeocodeCache, Http, RateLimit, Trace
+
+# Nominatim's usage policy allows at most one request per second, which RateLimit keeps to
+URL = "https://nominatim.openstreetmap.org/reverse"
+
+
+def fetch_label(lat_long: tuple[float,float]) -> str | None:
     """
-    Return a human-readable location label for the given latitude/longitude
-    using Nominatim reverse geocoding.
+    Looks up the name of the place at lat_long with Nominatim, or None if it has no name
     """
-    url = "https://nominatim.openstreetmap.org/reverse"
     params = {
         "lat": lat_long[0],
         "lon": lat_long[1],
@@ -17,17 +26,69 @@ def reverse_geocode_label(lat_long: tuple[float,float]) -> str:
         "User-Agent": "receipts"
     }
 
-    response = requests.get(url, params=params, headers=headers, timeout=5)
+    response = Http.get(URL, params=params, headers=headers, timeout=5)
     response.raise_for_status()
 
     data = response.json()
-    return data.get("name", "Unrecognised location")
+    return data.get("name")
+
+
+def reverse_geocode_label(lat_long: tuple[float,float]) -> str:
+    """
+    Return a human-readable location label for the given latitude/longitude,
+    from the names already looked up nearby, or using Nominatim reverse geocoding.
+    """
+    label = GeocodeCache.lookup(lat_long)
+    if label is not None:
+        Trace.count("geocode_cache", result="hit")
+        return label
+
+    Trace.count("geocode_cache", result="miss")
+    label = fetch_label(lat_long)
+    if label is None:
+        return "Unrecognised location"
+
+    GeocodeCache.store(lat_long, label)
+    return label
+
+
+def warm(lat_longs: list[tuple[float,float]]):
+    """
+    Looks up and stores the names of many places ahead of time, at Nominatim's rate limit
+    """
+    for lat_long in lat_longs:
+        stored = GeocodeCache.lookup(lat_long) is not None
+        try:
+            label = reverse_geocode_label(lat_long)
+        except Exception as e:
+            label = f"failed ({e})"
+        print(f"{lat_long[0]},{lat_long[1]}  {GeocodeCache.geohash(lat_long)}  {label}" + ("  (stored)" if stored else ""))
+
+
+def parse_lat_long(text: str) -> tuple[float,float]:
+    lat, long = map(float, text.split(","))
+    return lat, long
 
 
 if __name__ == "__main__":
-    import os
+    import argparse, os
     from dotenv import load_dotenv
-    load_dotenv("../.env")
-    LAT_LONG = tuple(map(float, os.getenv("LAT_LONG").split(",")))
 
-    print(reverse_geocode_label(LAT_LONG))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Names places, storing the names for later runs")
+    parser.add_argument("lat_longs", nargs="*", type=parse_lat_long, metavar="LAT,LONG")
+    parser.add_argument("--file", help="A file with a lat,long on each line")
+    args = parser.parse_args()
+
+    # Warming up is background work, so runs printing receipts go first
+    RateLimit.set_priority(RateLimit.PRIORITY_LOW)
+
+    lat_longs = args.lat_longs
+    if args.file:
+        with open(args.file) as file:
+            lat_longs += [parse_lat_long(line) for line in file if line.strip() and not line.startswith("#")]
+
+    if lat_longs:
+        warm(lat_longs)
+    else:
+        load_dotenv()
+        print(reverse_geocode_label(parse_lat_long(os.getenv("LAT_LONG"))))
@@ -0,0 +1,172 @@
+# Provides a way to cost one consumption series under many Octopus tariffs at once, including time-of-use tariffs
+# like Agile whose unit rate changes every half hour. Each tariff's rates are aligned to the consumption intervals,
+# so the cost of every tariff is one matrix-vector product.
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+from DataSources import Consumption, Deadline, Http, Trace
+
+API_URL = "https://api.octopus.energy/v1/products/{product}/electricity-tariffs/{tariff}/{rate}/"
+
+# The most rate periods the API returns per page
+PAGE_SIZE = 1500
+
+# Rate requests sent at once
+FETCH_WORKERS = 8
+
+
+class RateSchedule(NamedTuple):
+    """
+    Rates that each apply between two times, sorted by start
+
+    starts, ends: Unix seconds, with open-ended periods ending at the largest int64
+    values: Rate in £ during each period
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+    values: np.ndarray
+
+
+class Tariff(NamedTuple):
+    """
+    name: Label shown on the receipt
+    unit_rates: £ per kWh, or the day rate for a dual-rate tariff
+    standing_charges: £ per day
+    night_unit_rates: £ per kWh during the night period, for a dual-rate tariff
+    """
+    name: str
+    unit_rates: RateSchedule
+    standing_charges: RateSchedule
+    night_unit_rates: RateSchedule | None = None
+
+
+def fixed(value: float) -> RateSchedule:
+    """
+    A rate that applies at all times
+    """
+    return RateSchedule(np.array([0]), np.array([np.iinfo(np.int64).max]), np.array([value]))
+
+
+def schedule_from_results(results: list[dict]) -> RateSchedule:
+    """
+    Builds a rate schedule from Octopus rate results, preferring direct debit prices where both are given
+    """
+    if any(r.get("payment_method") == "DIRECT_DEBIT" for r in results):
+        results = [r for r in results if r.get("payment_method") in ("DIRECT_DEBIT", None)]
+    if not results:
+        raise ValueError("No rate results returned")
+
+    open_end = np.iinfo(np.int64).max
+    starts = np.array([Consumption.parse_time(r["valid_from"]) if r.get("valid_from") else 0 for r in results], dtype=np.int64)
+    ends = np.array([Consumption.parse_time(r["valid_to"]) if r.get("valid_to") else open_end for r in results], dtype=np.int64)
+    values = np.array([float(r["value_inc_vat"]) / 100 for r in results])
+
+    order = np.argsort(starts, kind="stable")
+    return RateSchedule(starts[order], ends[order], values[order])
+
+
+def next_change(schedule: RateSchedule, after: float) -> float | None:
+    """
+    The first time after `after` that a rate in the schedule starts or ends, or None if none is known to
+    """
+    times = np.concatenate([schedule.starts, schedule.ends])
+    times = times[(times > after) & (times != np.iinfo(np.int64).max)]
+    return float(times.min()) if times.size else None
+
+
+def align(schedule: RateSchedule, starts: np.ndarray) -> np.ndarray:
+    """
+    Looks up the rate in force at the start of each interval, NaN where no rate applies
+    """
+    index = np.searchsorted(schedule.starts, starts, side="right") - 1
+    clipped = np.clip(index, 0, None)
+    valid = (index >= 0) & (starts < schedule.ends[clipped])
+    return np.where(valid, schedule.values[clipped], np.nan)
+
+
+def rate_matrices(tariffs: list[Tariff], series: Consumption.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Aligns every tariff's rates to the series
+
+    Returns (unit rates, standing charges per day), each with one row per tariff and one column per interval
+    """
+    night = Consumption.night_mask(series)
+    unit = np.empty((len(tariffs), len(series.starts)))
+    standing = np.empty_like(unit)
+
+    for row, tariff in enumerate(tariffs):
+        unit[row] = align(tariff.unit_rates, series.starts)
+        if tariff.night_unit_rates is not None:
+            unit[row] = np.where(night, align(tariff.night_unit_rates, series.starts), unit[row])
+        standing[row] = align(tariff.standing_charges, series.starts)
+
+    return unit, standing
+
+
+def costs(tariffs: list[Tariff], series: Consumption.Series) -> np.ndarray:
+    """
+    Total cost in £ of the series under each tariff, NaN for tariffs missing a rate for any interval
+    """
+    unit, standing = rate_matrices(tariffs, series)
+    # Each interval carries its share of that day's standing charge
+    return unit @ series.kwh + standing.sum(axis=1) * (Consumption.INTERVAL / Consumption.DAY)
+
+
+def rank(tariffs: list[Tariff], series: Consumption.Series) -> list[tuple[str, float]]:
+    """
+    Tariffs from cheapest to most expensive for the series, leaving out any that can't be costed
+    Returns a list of (name, cost in £)
+    """
+    totals = costs(tariffs, series)
+    order = np.argsort(totals)
+    return [(tariffs[i].name, float(totals[i])) for i in order if not np.isnan(totals[i])]
+
+
+# ---------- Fetching tariffs from the Octopus API ----------
+def fetch_schedule(product: str, tariff: str, rate: str, period_from: str, period_to: str) -> RateSchedule:
+    """
+    Downloads every rate period of one rate type that overlaps the given ISO 8601 times
+    """
+    url = API_URL.format(product=product, tariff=tariff, rate=rate)
+    params = {"period_from": period_from, "period_to": period_to, "page_size": PAGE_SIZE}
+    results = []
+
+    while url:
+        (r := Http.get(url, params=params)).raise_for_status()
+        data = r.json()
+        results += data.get("results", [])
+        url, params = data.get("next"), None
+
+    return schedule_from_results(results)
+
+
+def fetch_tariffs(products: list[str], gsp_code: str, series: Consumption.Series) -> list[Tariff]:
+    """
+    Downloads the single-rate tariff of each product for the series' time span, all at once
+
+    Products that don't offer a tariff in the region are left out
+    """
+    # Whole days, so the same requests (and cached responses) are reused throughout the day
+    first_day = int(series.starts[0]) // Consumption.DAY * Consumption.DAY
+    last_day = (int(series.starts[-1]) // Consumption.DAY + 1) * Consumption.DAY
+    period_from = Consumption.to_iso(first_day)
+    period_to = Consumption.to_iso(last_day)
+
+    def fetch_tariff(product):
+        tariff = f"E-1R-{product}-{gsp_code}"
+        return Tariff(
+            product,
+            fetch_schedule(product, tariff, "standard-unit-rates", period_from, period_to),
+            fetch_schedule(product, tariff, "standing-charges", period_from, period_to),
+        )
+
+    def safe_fetch(product):
+        try:
+            return fetch_tariff(product)
+        except Exception as e:
+            print(f"Failed to get tariff for {product}:", e)
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        # Workers keep the caller's deadline, and their requests are traced under the caller's span
+        return [tariff for tariff in pool.map(Trace.carry(Deadline.carry(safe_fetch)), products) if tariff]
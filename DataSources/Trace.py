@@ -0,0 +1,304 @@
+# Records where the time goes in a run: timing spans for each stage, counters like bytes downloaded and cache hits,
+# and events like a source falling back to its default. A finished run is written as a JSON record,
+# and as a Prometheus textfile for node_exporter's textfile collector.
+#
+# Spans, counts and events are dropped when no run has been started, so library code can always record them.
+# Http.py adds spans for each request's DNS lookup, connect (with TLS), wait for the response and transfer, under the
+# span of the source that made it, so a source's parse and format time is its span less its http.* children.
+
+import cProfile, itertools, json, os, pstats, sys, tempfile, threading, time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable
+from DataSources.Cache import CACHE_DIR
+
+RUNS_DIR = os.path.join(CACHE_DIR, "runs")
+
+# Point this at node_exporter's --collector.textfile.directory
+TEXTFILE_DIR = os.getenv("RECEIPTS_TEXTFILE_DIR", os.path.join(CACHE_DIR, "metrics"))
+
+# Run records kept per run name, oldest deleted first
+KEEP_RUNS = 100
+
+# Slowest functions printed after a profiled run
+PROFILE_LINES = 25
+
+current = None
+local = threading.local()
+
+
+class Run:
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.events = []
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+
+    def offset(self, perf_time: float) -> float:
+        return round((perf_time - self.start) * 1000, 3)
+
+
+def labels_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def open_spans() -> list:
+    if not hasattr(local, "stack"):
+        local.stack = []
+    return local.stack
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Times the code inside, as a child of the span open on this thread
+    """
+    active = current
+    if active is None:
+        yield
+        return
+
+    stack = open_spans()
+    span_id = next(active.ids)
+    parent = stack[-1] if stack else None
+    stack.append(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        end = time.perf_counter()
+        stack.pop()
+        record = {"id": span_id, "parent": parent, "name": name, "labels": labels,
+                  "start": active.offset(start), "ms": round((end - start) * 1000, 3), "thread": threading.current_thread().name}
+        if error:
+            record["error"] = error
+        with active.lock:
+            active.spans.append(record)
+
+
+def carry(func: Callable) -> Callable:
+    """
+    Wraps func so spans it opens on another thread, like a pool worker, are children of the span open here
+    """
+    stack = open_spans()
+    parent = stack[-1:] if current else []
+
+    def call(*args, **kwargs):
+        saved = open_spans()[:]
+        local.stack = parent[:]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.stack = saved
+
+    return call
+
+
+def record(name: str, start: float, end: float = None, **labels):
+    """
+    Adds a span that was timed some other way
+
+    start, end: time.perf_counter() values, with end defaulting to now
+    """
+    active = current
+    if active is None:
+        return
+
+    stack = open_spans()
+    end = time.perf_counter() if end is None else end
+    with active.lock:
+        active.spans.append({"id": next(active.ids), "parent": stack[-1] if stack else None, "name": name, "labels": labels,
+                             "start": active.offset(start), "ms": round((end - start) * 1000, 3), "thread": threading.current_thread().name})
+
+
+def count(name: str, value: float = 1, **labels):
+    active = current
+    if active is None:
+        return
+
+    key = (name, labels_key(labels))
+    with active.lock:
+        active.counters[key] = active.counters.get(key, 0) + value
+
+
+def event(name: str, **fields):
+    """
+    Notes something that happened, like a fallback, under the span open on this thread
+    """
+    active = current
+    if active is None:
+        return
+
+    stack = open_spans()
+    with active.lock:
+        active.events.append({"name": name, "at": active.offset(time.perf_counter()), "span": stack[-1] if stack else None, **fields})
+
+
+# ---------- Output ----------
+def to_record(run: Run, status: str) -> dict:
+    return {
+        "run": run.name,
+        "started_at": datetime.fromtimestamp(run.started_at).isoformat(timespec="seconds"),
+        "ms": run.offset(time.perf_counter()),
+        "status": status,
+        "spans": sorted(run.spans, key=lambda s: s["start"]),
+        "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in run.counters.items()],
+        "events": run.events,
+    }
+
+
+def prometheus_labels(labels: dict) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def to_prometheus(record: dict) -> str:
+    """
+    The run's totals in the Prometheus text format, with spans of the same name and labels summed
+    """
+    run = {"run": record["run"]}
+    span_seconds = {}
+    for s in record["spans"]:
+        key = labels_key({"span": s["name"], **s["labels"]})
+        span_seconds[key] = span_seconds.get(key, 0) + s["ms"] / 1000
+
+    lines = [
+        "# HELP receipts_run_seconds How long the last run took",
+        "# TYPE receipts_run_seconds gauge",
+        f"receipts_run_seconds{prometheus_labels(run)} {record['ms'] / 1000}",
+        "# HELP receipts_run_success Whether the last run finished without an error",
+        "# TYPE receipts_run_success gauge",
+        f"receipts_run_success{prometheus_labels(run)} {int(record['status'] == 'ok')}",
+        "# HELP receipts_run_timestamp_seconds When the last run started",
+        "# TYPE receipts_run_timestamp_seconds gauge",
+        f"receipts_run_timestamp_seconds{prometheus_labels(run)} {datetime.fromisoformat(record['started_at']).timestamp()}",
+        "# HELP receipts_span_seconds Time spent in each stage of the last run",
+        "# TYPE receipts_span_seconds gauge",
+    ]
+    lines += [f"receipts_span_seconds{prometheus_labels({**run, **dict(key)})} {seconds:.6f}" for key, seconds in span_seconds.items()]
+
+    by_name = {}
+    for counter in record["counters"]:
+        by_name.setdefault(counter["name"], []).append(counter)
+    for name, counters in by_name.items():
+        lines.append(f"# TYPE receipts_{name} gauge")
+        lines += [f"receipts_{name}{prometheus_labels({**run, **c['labels']})} {c['value']}" for c in counters]
+
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: str, text: str):
+    """
+    Replaces a file in one step, through a temporary file of its own so runs finishing together don't collide
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False) as file:
+        try:
+            file.write(text)
+            # Readable by node_exporter, which usually runs as another user
+            os.chmod(file.name, 0o644)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, path)
+
+
+def prune(name: str):
+    records = sorted(file for file in os.listdir(RUNS_DIR) if file.startswith(name + "-") and file.endswith(".json"))
+    for file in records[:max(0, len(records) - KEEP_RUNS)]:
+        os.remove(os.path.join(RUNS_DIR, file))
+        stats_path = os.path.join(RUNS_DIR, file[:-len(".json")] + ".pstats")
+        if os.path.exists(stats_path):
+            os.remove(stats_path)
+
+
+# ---------- Runs ----------
+def start(name: str) -> Run:
+    global current
+    current = Run(name)
+    return current
+
+
+def finish(status: str = "ok") -> str | None:
+    """
+    Ends the current run and writes its record and textfile
+    Returns the path of the JSON record
+    """
+    global current
+    run, current = current, None
+    if run is None:
+        return None
+
+    record = to_record(run, status)
+    stamp = datetime.fromtimestamp(run.started_at).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(RUNS_DIR, f"{run.name}-{stamp}.json")
+    write_atomic(path, json.dumps(record, indent=1))
+    write_atomic(os.path.join(TEXTFILE_DIR, f"receipts_{run.name}.prom"), to_prometheus(record))
+    prune(run.name)
+    return path
+
+
+@contextmanager
+def profile(path: str):
+    """
+    Profiles the code inside with cProfile, including threads it starts, and writes the stats to path
+
+    The stats can be read with pstats, or drawn with tools like snakeviz or flameprof
+    """
+    profiles = [cProfile.Profile()]
+
+    def profile_thread(*args):
+        sys.setprofile(None)
+        thread_profile = cProfile.Profile()
+        profiles.append(thread_profile)
+        thread_profile.enable()
+
+    threading.setprofile(profile_thread)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+
+        stats = pstats.Stats(profiles[0])
+        for thread_profile in profiles[1:]:
+            thread_profile.create_stats()
+            if thread_profile.stats:
+                stats.add(thread_profile)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        print(f"Profile written to {path}")
+
+
+@contextmanager
+def run(name: str, profile_run: bool = False):
+    """
+    Traces everything inside as one run, optionally under cProfile, then writes out the results
+    """
+    start(name)
+    status = "error"
+    try:
+        if profile_run:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            with profile(os.path.join(RUNS_DIR, f"{name}-{stamp}.pstats")):
+                yield
+        else:
+            yield
+        status = "ok"
+    finally:
+        path = finish(status)
+        print(f"Run record written to {path}")
@@ -1,33 +1,46 @@
 # Provides a function to get the day-ahead weather forecast
 
-import requests
+from DataSources import Http
 from datetime import datetime
 
+URL = "https://api.open-meteo.com/v1/forecast"
+
+DAILY_FIELDS = "temperature_2m_max,temperature_2m_min,apparent_temperature_max,apparent_temperature_min," \
+    "sunrise,sunset,daylight_duration," \
+    "precipitation_hours,precipitation_probability_max,precipitation_sum," \
+    "wind_speed_10m_max,wind_gusts_10m_max"
+
+
 def fetch_weather_data(lat_long: tuple[float, float]) -> dict:
     """
     Fetches a set list of weather forecast data for today from open-meteo.com
 
     lat_long: The location to give weather data for
     """
+    return fetch_weather_data_many([lat_long])[0]
 
-    url = "https://api.open-meteo.com/v1/forecast"
+
+def fetch_weather_data_many(lat_longs: list[tuple[float, float]]) -> list[dict]:
+    """
+    Fetches today's forecast for several locations in one request, in the same order as `lat_longs`
+    """
     today_str = datetime.now().strftime("%Y-%m-%d")
 
     request_payload = {
-        "latitude": lat_long[0],
-        "longitude": lat_long[1],
+        "latitude": ",".join(str(lat) for lat, _ in lat_longs),
+        "longitude": ",".join(str(long) for _, long in lat_longs),
         "start_date": today_str,
         "end_date": today_str,
-        "daily": "temperature_2m_max,temperature_2m_min,apparent_temperature_max,apparent_temperature_min," \
-        "sunrise,sunset,daylight_duration," \
-        "precipitation_hours,precipitation_probability_max,precipitation_sum," \
-        "wind_speed_10m_max,wind_gusts_10m_max",
+        "daily": DAILY_FIELDS,
         "timezone":"GMT"
     }
 
-    response = requests.get(url,params=request_payload)
+    response = Http.get(URL, params=request_payload)
     response.raise_for_status()
-    return response.json()
+
+    # A list with one forecast per location, or just the forecast for a single location
+    data = response.json()
+    return data if isinstance(data, list) else [data]
 
 def format_weather_data(data: dict) -> str:
 
@@ -65,6 +78,16 @@ def get_day_forecast(lat_long: tuple[float, float]) -> str:
     return (format_weather_data(data), "body")
 
 
+def get_day_forecasts(args: list[tuple[tuple[float, float]]]) -> list[tuple[str, str]]:
+    """
+    get_day_forecast for several locations with one request
+
+    args: A (lat_long,) tuple for each location
+    """
+    forecasts = fetch_weather_data_many([lat_long for lat_long, in args])
+    return [(format_weather_data(data), "body") for data in forecasts]
+
+
 if __name__ == "__main__":
     import os
     from dotenv import load_dotenv
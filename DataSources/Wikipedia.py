@@ -1,6 +1,6 @@
 # Provides a function to get today's featured article and the top 5 most read articles
 
-import requests
+from DataSources import Http
 from datetime import datetime
 
 def get_wikipedia_info() -> str:
@@ -11,7 +11,7 @@ def get_wikipedia_info() -> str:
     headers = {
         "user-agent": "bot to access wikipedia featured articles once per day"
     }
-    (r := requests.get(url, headers=headers)).raise_for_status()
+    (r := Http.get(url, headers=headers)).raise_for_status()
     data =  r.json()
 
     # Today's featured article
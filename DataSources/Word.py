@@ -1,42 +1,29 @@
 # Provides a function to get the word of the day with definition
 
-import requests
-from xml.etree import ElementTree
+from DataSources import Feeds
+from contextlib import closing
 
 def get_word_of_the_day() -> list[tuple[str,str]]:
-
+    """
+    Raises if the feed can't be read or has no word in it, so the section falls back instead of printing nothing
+    """
     rss_url = "https://wordsmith.org/awad/rss1.xml"
-    response = requests.get(rss_url)
 
-    if response.status_code != 200:
-        print("Failed to get RSS feed. Status code:", response.status_code)
-        return ""
+    # Only the first item is needed, so the feed is read no further than it
+    with closing(Feeds.read(rss_url)) as entries:
+        item = next(entries, None)
 
-    rss_feed = response.text
+    if item is None:
+        raise ValueError("No item found in the word of the day feed")
 
-    # parse the RSS feed using xml.etree.ElementTree
-    root = ElementTree.fromstring(rss_feed)
-    channel = root.find("channel")
-    if channel is None:
-        print("No channel found in the RSS feed")
-        return ""
+    if item.title is None:
+        raise ValueError("No title found in the word of the day")
 
-    item = channel.find("item")
-    if item is None:
-        print("No item found in the first entry")
-        return ""
-
-    title = item.find("title")
-    if title is None:
-        print("No title found in the item")
-        return ""
-        
-    description = item.find("description")
-    if item is None:
+    if item.description is None:
         print("No desc found in the item")
-        return f"{title.text}"
+        return [(item.title, "body")]
 
-    return [(title.text, "body"), (description.text, "body")]
+    return [(item.title, "body"), (item.description, "body")]
 
 if __name__ == "__main__":
     wotd = get_word_of_the_day()
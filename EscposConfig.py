@@ -0,0 +1,9 @@
+# Points python-escpos at a pickled copy of its printer database, which it otherwise parses on every start.
+# The setting is read when escpos is first imported, so entry points import this before anything else that uses escpos.
+
+import os
+from DataSources.Cache import CACHE_DIR
+
+ESCPOS_DIR = os.path.join(CACHE_DIR, "escpos")
+os.makedirs(ESCPOS_DIR, exist_ok=True)
+os.environ.setdefault("ESCPOS_CAPABILITIES_PICKLE_DIR", ESCPOS_DIR)
@@ -0,0 +1,314 @@
+# Runs the receipt's data sources concurrently, so the wait is roughly the slowest source rather than the sum of them all
+
+import importlib, threading, time, zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import nullcontext
+from typing import Any, Callable, Iterator, NamedTuple
+import Breakers
+from DataSources import Deadline, Trace
+
+
+class Source(NamedTuple):
+    """
+    One section's data source
+
+    name: Key the result is returned under
+    func: The DataSources function to call
+    args: Positional arguments passed to func, which must be hashable so repeated fetches can be shared
+    default: Value used if func raises
+    batch: Optional function taking a list of `args` tuples and returning func's result for each,
+        used when several sources differ only by their arguments
+    budget: Most seconds func may take before its default is used instead, within the whole gather's budget
+    """
+    name: str
+    func: Callable
+    args: tuple = ()
+    default: Any = "Not available"
+    batch: Callable = None
+    budget: float = None
+
+
+def lazy(module: str, name: str) -> Callable:
+    """
+    A function that imports `module` and calls its function `name` when first called,
+    so a section's dependencies are only imported if that section is fetched
+    """
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+    call.__name__ = name
+    return call
+
+
+def safe_call(func, *args, default="Not available", **kwargs):
+    """
+    Call a function and return a default value if it raises an exception.
+
+    Args:
+        func (callable): The function to invoke.
+        *args: Positional arguments passed to the function.
+        default (Any): Value to return if an exception is raised.
+        **kwargs: Keyword arguments passed to the function.
+
+    Returns:
+        Any: The function's return value if successful, otherwise `default`.
+    """
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        print(e)
+        Trace.event("error", error=repr(e))
+        return default
+
+
+def breaker_key(source: Source) -> str:
+    """
+    Identifies a source's circuit breaker across runs, by its section and arguments
+    """
+    return f"{source.name}:{zlib.crc32(repr(source.args).encode()):08x}"
+
+
+def call_breaker(func: Callable, source: Source, default: Any = None) -> Any:
+    """
+    Calls a Breakers function with a source's key, treating its breaker as closed if the database can't be used,
+    so a locked or corrupt breakers database doesn't lose the whole receipt
+    """
+    try:
+        return func(breaker_key(source))
+    except Exception as e:
+        print(f"Circuit breaker for {source.name} unavailable:", e)
+        Trace.event("breaker_error", source=source.name, error=repr(e))
+        return default
+
+
+def note_failure(source: Source):
+    if call_breaker(Breakers.failed, source, default=False):
+        print(f"{source.name} keeps failing, so will be skipped for a while")
+
+
+def note_result(source: Source, succeeded: bool, deadline: float | None):
+    """
+    Counts a source's result against its circuit breaker, unless it came too late, which wait_for has already counted
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        return
+    if succeeded:
+        call_breaker(Breakers.succeeded, source)
+    else:
+        note_failure(source)
+
+
+def timed_call(source: Source, deadline: float = None) -> tuple[Any, float]:
+    """
+    safe_call a source and measure how long it took in seconds, skipping it if its circuit breaker is open
+
+    deadline: time.monotonic() time its requests must finish by
+    """
+    start = time.perf_counter()
+    with Trace.span("source", source=source.name):
+        if call_breaker(Breakers.is_open, source, default=False):
+            print(f"Skipping {source.name}, which has been failing")
+            Trace.event("breaker_open", source=source.name)
+            result = source.default
+        else:
+            with Deadline.until(deadline):
+                result = safe_call(source.func, *source.args, default=source.default)
+            note_result(source, result is not source.default, deadline)
+
+        if result is source.default:
+            Trace.event("fallback", source=source.name)
+            Trace.count("source_fallbacks", source=source.name)
+    return result, time.perf_counter() - start
+
+
+def fetch_key(source: Source) -> tuple:
+    """
+    What a source's result depends on, so sources with the same key can share one fetch
+    """
+    return source.func, source.args
+
+
+def timed_batch(sources: list[Source], deadline: float = None) -> tuple[list, float]:
+    """
+    Fetches several sources with their shared batch function in one call,
+    returning each source's default if it raises or its circuit breaker is open
+    """
+    start = time.perf_counter()
+    name = sources[0].name
+    with Trace.span("source", source=name, batch=len(sources)):
+        results = [source.default for source in sources]
+        trying = [index for index, source in enumerate(sources) if not call_breaker(Breakers.is_open, source, default=False)]
+        if len(trying) < len(sources):
+            Trace.event("breaker_open", source=name)
+
+        with Deadline.until(deadline):
+            fetched = safe_call(sources[0].batch, [sources[index].args for index in trying], default=None) if trying else None
+
+        for index in trying:
+            note_result(sources[index], fetched is not None, deadline)
+        if fetched is None:
+            Trace.event("fallback", source=name)
+            Trace.count("source_fallbacks", len(sources), source=name)
+        else:
+            for index, result in zip(trying, fetched):
+                results[index] = result
+    return results, time.perf_counter() - start
+
+
+def deadline_for(source: Source, start: float, budget: float | None) -> float | None:
+    """
+    The time.monotonic() time a source must finish by, given when the gather started and its whole budget
+    """
+    budgets = [seconds for seconds in (budget, source.budget) if seconds is not None]
+    return start + min(budgets) if budgets else None
+
+
+def wait_for(future: Future, deadline: float | None, sources: list[Source], default: Any, started: float) -> tuple[Any, float]:
+    """
+    A call's (result, seconds), or `default` if it hasn't finished by the deadline, which counts as a failure
+    of each of its sources
+
+    The call is left running on its daemon thread, where its requests are cut short by the same deadline
+
+    started: time.perf_counter() time the gather started
+    """
+    try:
+        return future.result(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+    # Only an alias of the builtin TimeoutError from Python 3.11
+    except FutureTimeout:
+        for source in sources:
+            print(f"{source.name} ran out of time")
+            Trace.event("deadline", source=source.name)
+            note_failure(source)
+        return default, time.perf_counter() - started
+
+
+def start_thread(func: Callable, *args, slots: threading.Semaphore = None) -> Future:
+    """
+    Runs func on its own daemon thread and returns a Future for its result
+
+    Unlike a ThreadPoolExecutor's workers these aren't joined when the interpreter exits,
+    so a source still running past its deadline can't keep the process alive once the receipt is done
+
+    slots: Limits how many run at once, if given
+    """
+    future = Future()
+
+    def run():
+        with slots or nullcontext():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name=f"gather-{getattr(func, '__name__', 'call')}", daemon=True).start()
+    return future
+
+
+def print_timings(timings: dict[str, float], total: float):
+    """
+    Prints a per-source wall-clock breakdown, slowest first
+    """
+    print(f"Gathered {len(timings)} sources in {total:.2f}s")
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:<20} {seconds:6.2f}s")
+
+
+def gather_many(batches: list[list[Source]], max_workers: int = None, budget: float = None) -> list[dict[str, Any]]:
+    """
+    Gathers several receipts' sources at once, fetching each distinct (func, args) only once
+    and sources with a batch function together in one call
+
+    batches: Each receipt's sources, in section order
+    max_workers: Most fetches run at once, defaults to all of them
+    budget: Seconds after which any source that hasn't finished gets its default, and counts as failed
+    Returns a dict of source name to result for each receipt, in the same order as `batches`
+    """
+    start = time.perf_counter()
+    started_at = time.monotonic()
+
+    unique = {}
+    for sources in batches:
+        for source in sources:
+            unique.setdefault(fetch_key(source), source)
+
+    # Sources that can be fetched together, and the rest one at a time
+    grouped = {}
+    for key, source in unique.items():
+        grouped.setdefault(source.batch or key, []).append(key)
+    singles = [keys[0] for keys in grouped.values() if len(keys) == 1]
+    groups = [keys for keys in grouped.values() if len(keys) > 1]
+
+    deadlines = {key: deadline_for(source, started_at, budget) for key, source in unique.items()}
+    group_deadline = lambda keys: min((deadlines[key] for key in keys if deadlines[key] is not None), default=None)
+
+    slots = threading.Semaphore(max_workers) if max_workers else None
+    call_single, call_group = Trace.carry(timed_call), Trace.carry(timed_batch)
+    single_futures = {key: start_thread(call_single, unique[key], deadlines[key], slots=slots) for key in singles}
+    group_futures = {tuple(keys): start_thread(call_group, [unique[key] for key in keys], group_deadline(keys), slots=slots)
+                     for keys in groups}
+
+    fetched = {}
+    timings = {}
+    fetches = {}
+    for key, future in single_futures.items():
+        source = unique[key]
+        fetched[key], seconds = wait_for(future, deadlines[key], [source], source.default, start)
+        # Numbered if several receipts fetched the same section differently
+        fetches[source.name] = fetches.get(source.name, 0) + 1
+        timings[source.name if fetches[source.name] == 1 else f"{source.name} #{fetches[source.name]}"] = seconds
+    for keys, future in group_futures.items():
+        sources = [unique[key] for key in keys]
+        defaults = [source.default for source in sources]
+        results, timings[f"{sources[0].name} x{len(keys)}"] = wait_for(future, group_deadline(keys), sources, defaults, start)
+        fetched.update(zip(keys, results))
+
+    Trace.record("gather", start)
+    print_timings(timings, time.perf_counter() - start)
+
+    receipts = []
+    for sources in batches:
+        results = {}
+        for source in sources:
+            key = fetch_key(source)
+            shared, result = unique[key], fetched[key]
+            # Another receipt's default is this one's default, so failures are still recognised by identity
+            results[source.name] = source.default if result is shared.default else result
+        receipts.append(results)
+    return receipts
+
+
+def gather(sources: list[Source], max_workers: int = None, budget: float = None) -> dict[str, Any]:
+    """
+    Calls every source at once, each on its own thread
+
+    sources: The sources to call, in section order
+    max_workers: Most sources run at once, defaults to all of them
+    budget: Seconds after which any source that hasn't finished gets its default
+    Returns a dict of source name to result, in the same order as `sources`
+    """
+    return gather_many([sources], max_workers, budget)[0]
+
+
+def gather_iter(sources: list[Source], max_workers: int = None, budget: float = None) -> Iterator[tuple[str, Any]]:
+    """
+    Starts every source at once like gather, and returns their results as (name, result) in the same order as `sources`,
+    each as soon as it and the sources before it have finished
+    """
+    start = time.perf_counter()
+    started_at = time.monotonic()
+    slots = threading.Semaphore(max_workers) if max_workers else None
+    call = Trace.carry(timed_call)
+    futures = [(source, deadline_for(source, started_at, budget)) for source in sources]
+    futures = [(source, deadline, start_thread(call, source, deadline, slots=slots)) for source, deadline in futures]
+
+    def results():
+        timings = {}
+        for source, deadline, future in futures:
+            result, timings[source.name] = wait_for(future, deadline, [source], source.default, start)
+            yield source.name, result
+        Trace.record("gather", start)
+        print_timings(timings, time.perf_counter() - start)
+
+    return results()
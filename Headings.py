@@ -0,0 +1,28 @@
+# The section headings and date line shared by the printed receipt (Render.py) and the console one (ReceiptConsole.py)
+
+from datetime import datetime
+
+# Heading printed above each section, in receipt order
+HEADINGS = {
+    "weather": "WEATHER",
+    "energy": "ENERGY CONSUMPTION",
+    "wotd": "WORD OF THE DAY",
+    "national_news": "NATIONAL NEWS",
+    "local_news": "LOCAL NEWS",
+    "sport": "SPORT",
+    "wikipedia": "WIKIPEDIA",
+    "poem": "TODAY'S BURNS POEM",
+}
+
+
+def ordinal(n: int):
+    if 11 <= (n % 100) <= 13:
+        suffix = 'th'
+    else:
+        suffix = ['th', 'st', 'nd', 'rd', 'th'][min(n % 10, 4)]
+    return str(n) + suffix
+
+def get_today_string():
+    # "Monday 1st January 2026"
+    today = datetime.now()
+    return today.strftime(f"%A {ordinal(today.day)} %B %Y")
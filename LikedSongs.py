@@ -0,0 +1,160 @@
+# Keeps a local SQLite index of each account's Spotify liked songs, so a random song can be picked without asking the API.
+# The index is kept up to date by only paging through songs liked since the last sync.
+
+import os, random, sqlite3, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import spotipy
+from DataSources.Cache import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "liked_songs.sqlite3")
+
+# The most saved tracks the API returns per page
+PAGE_SIZE = 50
+
+# Pages fetched at once during a full sync
+SYNC_WORKERS = 8
+
+# Seconds between incremental syncs
+SYNC_INTERVAL = 60 * 60
+
+DAY = 24 * 60 * 60
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS tracks (
+            account TEXT, uri TEXT, name TEXT, artists TEXT, added_at TEXT,
+            PRIMARY KEY (account, uri)
+        );
+        CREATE INDEX IF NOT EXISTS tracks_added ON tracks (account, added_at);
+        CREATE TABLE IF NOT EXISTS printed (account TEXT, uri TEXT, printed_at REAL);
+        CREATE TABLE IF NOT EXISTS syncs (account TEXT PRIMARY KEY, synced_at REAL);
+    """)
+    return db
+
+
+def to_row(account: str, item: dict) -> tuple:
+    track = item["track"]
+    artists = ", ".join(artist["name"] for artist in track["artists"])
+    return (account, track["uri"], track["name"], artists, item["added_at"])
+
+
+def store(db: sqlite3.Connection, rows: list[tuple]):
+    db.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def full_sync(db: sqlite3.Connection, sp: spotipy.Spotify, account: str, first_page: dict):
+    """
+    Replaces the account's index with every liked song, fetching all pages after the first in parallel
+    """
+    total = first_page["total"]
+
+    def fetch_page(offset):
+        return sp.current_user_saved_tracks(limit=PAGE_SIZE, offset=offset)["items"]
+
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        pages = list(pool.map(fetch_page, range(PAGE_SIZE, total, PAGE_SIZE)))
+
+    items = first_page["items"] + [item for page in pages for item in page]
+    db.execute("DELETE FROM tracks WHERE account = ?", (account,))
+    store(db, [to_row(account, item) for item in items if item.get("track")])
+
+
+def sync(sp: spotipy.Spotify, account: str, force: bool = False, path: str = DB_PATH):
+    """
+    Brings the account's index up to date
+
+    Songs are returned newest first, so pages are only fetched until reaching songs already in the index.
+    If the counts still don't match afterwards, songs were unliked and the whole library is fetched again.
+
+    sp: An authenticated Spotify client
+    account: Name the index is stored under, like the OAuth cache path
+    force: Sync even if the last sync was less than SYNC_INTERVAL ago
+    """
+    with connect(path) as db:
+        last_sync = db.execute("SELECT synced_at FROM syncs WHERE account = ?", (account,)).fetchone()
+        if last_sync and not force and time.time() - last_sync[0] < SYNC_INTERVAL:
+            return
+
+        newest = db.execute("SELECT MAX(added_at) FROM tracks WHERE account = ?", (account,)).fetchone()[0]
+        page = sp.current_user_saved_tracks(limit=PAGE_SIZE)
+
+        if newest is None:
+            full_sync(db, sp, account, page)
+        else:
+            offset = 0
+            while True:
+                new_items = [item for item in page["items"] if item.get("track") and item["added_at"] > newest]
+                store(db, [to_row(account, item) for item in new_items])
+                offset += PAGE_SIZE
+                if len(new_items) < len(page["items"]) or offset >= page["total"]:
+                    break
+                page = sp.current_user_saved_tracks(limit=PAGE_SIZE, offset=offset)
+
+            count = db.execute("SELECT COUNT(*) FROM tracks WHERE account = ?", (account,)).fetchone()[0]
+            if count != page["total"]:
+                full_sync(db, sp, account, sp.current_user_saved_tracks(limit=PAGE_SIZE))
+
+        db.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?)", (account, time.time()))
+
+
+def sample(account: str, count: int = 1, avoid_days: float = 0, weighting: str = None, path: str = DB_PATH) -> list[tuple[str, str, str]]:
+    """
+    Picks distinct random songs from the local index
+
+    account: The account to pick from
+    count: How many songs to pick
+    avoid_days: Don't pick songs printed within this many days, unless there aren't enough other songs
+    weighting: None for a uniform pick, or "recent" to favour recently liked songs
+    Returns a list of (name, artists, uri), shorter than count if the account has fewer liked songs
+    """
+    since = time.time() - avoid_days * DAY
+    query = (
+        "SELECT name, artists, uri, added_at FROM tracks WHERE account = ? AND uri NOT IN "
+        "(SELECT uri FROM printed WHERE account = ? AND printed_at > ?) ORDER BY added_at"
+    )
+
+    with connect(path) as db:
+        rows = db.execute(query, (account, account, since)).fetchall()
+        if len(rows) < count:
+            rows = db.execute(query, (account, account, time.time() + 1)).fetchall()
+
+    if weighting != "recent":
+        return [row[:3] for row in random.sample(rows, min(count, len(rows)))]
+
+    # Linearly more likely the more recently the song was liked
+    weights = list(range(1, len(rows) + 1))
+    picked = []
+    while rows and len(picked) < count:
+        index = random.choices(range(len(rows)), weights=weights)[0]
+        picked.append(rows.pop(index)[:3])
+        weights.pop(index)
+    return picked
+
+
+def mark_printed(account: str, uri: str, path: str = DB_PATH):
+    with connect(path) as db:
+        db.execute("INSERT INTO printed VALUES (?, ?, ?)", (account, uri, time.time()))
+
+
+if __name__ == "__main__":
+    import sys
+    from spotipy.oauth2 import SpotifyOAuth
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    cache_path = sys.argv[1] if len(sys.argv) > 1 else ".cache"
+    sp = spotipy.Spotify(
+        auth_manager = SpotifyOAuth(scope="user-library-read", open_browser=False, cache_path=cache_path)
+    )
+
+    start = time.perf_counter()
+    sync(sp, cache_path, force=True)
+    print(f"Synced in {time.perf_counter() - start:.2f}s")
+
+    with connect() as db:
+        count, oldest = db.execute("SELECT COUNT(*), MIN(added_at) FROM tracks WHERE account = ?", (cache_path,)).fetchone()
+    print(f"{count} liked songs since {oldest and datetime.fromisoformat(oldest.replace('Z', '+00:00')):%d/%m/%Y}")
@@ -0,0 +1,60 @@
+# Gathers the receipt's data ahead of print time and saves it to the snapshot, so printing doesn't wait on the network
+#
+# Usage:
+#   python Prefetch.py                  Run as a daemon, prefetching at the default times each day
+#   python Prefetch.py 05:30 06:45      Run as a daemon with custom prefetch times
+#   python Prefetch.py --once           Prefetch once and exit, e.g. from cron
+
+import sys, time
+from datetime import datetime, timedelta
+import Receipt
+from DataSources import RateLimit, Trace
+
+DEFAULT_TIMES = ["06:00", "06:45"]
+
+
+def next_run(times: list[str], now: datetime) -> datetime:
+    """
+    Finds the next of the daily "HH:MM" times after now
+    """
+    candidates = []
+    for time_string in times:
+        hour, minute = map(int, time_string.split(":"))
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        candidates.append(run)
+    return min(candidates)
+
+
+def prefetch():
+    """
+    Fetches every section live and saves the successful ones to the snapshot
+    """
+    print(f"Prefetching at {datetime.now():%H:%M:%S}")
+    with Trace.run("prefetch"):
+        Receipt.fetch(Receipt.get_sources())
+
+
+def run_daemon(times: list[str]):
+    while True:
+        run = next_run(times, datetime.now())
+        print(f"Next prefetch at {run:%H:%M %d/%m/%Y}")
+        time.sleep(max(0, (run - datetime.now()).total_seconds()))
+
+        try:
+            prefetch()
+        except Exception as e:
+            print(e)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    # Runs printing receipts go first when both need the same hosts
+    RateLimit.set_priority(RateLimit.PRIORITY_LOW)
+
+    if "--once" in args:
+        prefetch()
+    else:
+        run_daemon(args or DEFAULT_TIMES)
@@ -0,0 +1,282 @@
+# Defines the sections of the breakfast receipt and where their data comes from
+
+from Gather import Source, gather, gather_iter, gather_many, lazy
+import json, os, time
+from typing import Any, Iterator, NamedTuple
+import Snapshot
+from DataSources import Trace
+from dotenv import load_dotenv
+
+load_dotenv()
+LAT_LONG = tuple(map(float, os.getenv("LAT_LONG").split(",")))
+ENERGY_API_KEY = os.getenv("ENERGY_API_KEY")
+ENERGY_PRODUCT = os.getenv("ENERGY_PRODUCT")
+POSTCODE = os.getenv("POSTCODE")
+ENERGY_MPAN = os.getenv("ENERGY_MPAN")
+ENERGY_MSN = os.getenv("ENERGY_MSN")
+# Comma separated Octopus product codes to rank against ENERGY_PRODUCT
+ENERGY_COMPARE_PRODUCTS = tuple(p.strip() for p in os.getenv("ENERGY_COMPARE_PRODUCTS", "").split(",") if p.strip())
+NEWSAPI_ORG_KEY = os.getenv("NEWSAPI_ORG_KEY")
+
+HOUR = 60 * 60
+
+# How old a prefetched section can be, in seconds, and still be printed
+MAX_AGES = {
+    "location": 30 * 24 * HOUR,
+    "weather": 3 * HOUR,
+    "energy": 12 * HOUR,
+    "wotd": 12 * HOUR,
+    "national_news": 2 * HOUR,
+    "local_news": 2 * HOUR,
+    "sport": 2 * HOUR,
+    "wikipedia": 12 * HOUR,
+    "poem": 12 * HOUR,
+}
+
+# Sections whose content changes each day, so a snapshot from yesterday is stale however recent it is
+DAILY = {"weather", "energy", "wotd", "wikipedia", "poem"}
+
+# Seconds the whole receipt waits for its sources, after which any still running are printed from the snapshot
+BUDGET = 20
+
+# The longest each section gets within BUDGET, so one hanging host gives up well before the rest
+BUDGETS = {
+    "location": 5,
+    "weather": 5,
+    "energy": 15,
+    "wotd": 5,
+    "national_news": 8,
+    "local_news": 8,
+    "sport": 8,
+    "wikipedia": 8,
+    "poem": 10,
+}
+
+# Each DataSources module is only imported when its section is fetched, since some pull in numpy, bs4 or PIL
+reverse_geocode_label = lazy("DataSources.ReverseGeocode", "reverse_geocode_label")
+get_day_forecast = lazy("DataSources.Weather", "get_day_forecast")
+get_day_forecasts = lazy("DataSources.Weather", "get_day_forecasts")
+get_energy_consumption = lazy("DataSources.Energy", "get_energy_consumption")
+get_word_of_the_day = lazy("DataSources.Word", "get_word_of_the_day")
+get_headlines = lazy("DataSources.News", "get_headlines")
+get_wikipedia_info = lazy("DataSources.Wikipedia", "get_wikipedia_info")
+get_burns_poem = lazy("DataSources.Burns", "get_burns_poem")
+
+
+class Recipient(NamedTuple):
+    """
+    Who a receipt is for: their location, meter, news feeds and printer
+
+    Fields left out default to the values in .env
+
+    printers: "ip:profile" for each of their printers, defaulting to those in PRINTERS
+    """
+    name: str = "default"
+    lat_long: tuple[float, float] = LAT_LONG
+    postcode: str = POSTCODE
+    energy_api_key: str = ENERGY_API_KEY
+    energy_product: str = ENERGY_PRODUCT
+    energy_mpan: str = ENERGY_MPAN
+    energy_msn: str = ENERGY_MSN
+    energy_compare_products: tuple[str, ...] = ENERGY_COMPARE_PRODUCTS
+    news_national: str = os.getenv("NEWS_NATIONAL")
+    news_local: str = os.getenv("NEWS_LOCAL")
+    news_sport: str = os.getenv("NEWS_SPORT")
+    printers: tuple[str, ...] = None
+
+
+DEFAULT_RECIPIENT = Recipient()
+
+
+def load_recipients(path: str) -> list[Recipient]:
+    """
+    Reads a JSON list of recipients, each an object with some of Recipient's fields, like
+    [{"name": "gran", "lat_long": [55.95, -3.19], "news_local": "https://...", "printers": ["192.168.1.170:TM-T20II"]}]
+    """
+    with open(path) as file:
+        entries = json.load(file)
+
+    recipients = []
+    for entry in entries:
+        unknown = set(entry) - set(Recipient._fields)
+        if unknown:
+            raise ValueError(f"Unknown recipient fields in {path}: {', '.join(sorted(unknown))}")
+        # Lists in JSON, but tuples here so sources with the same arguments can be recognised
+        for field in ("lat_long", "energy_compare_products", "printers"):
+            if field in entry:
+                entry[field] = tuple(entry[field])
+        recipients.append(Recipient(**entry))
+
+    names = [recipient.name for recipient in recipients]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Recipient names in {path} must be unique")
+    return recipients
+
+
+def get_sources(recipient: Recipient = DEFAULT_RECIPIENT) -> list[Source]:
+    """
+    The data source behind each section, in the order they appear on the receipt
+    """
+    sources = [
+        Source("location", reverse_geocode_label, (recipient.lat_long,), default="Unrecognised location"),
+        Source("weather", get_day_forecast, (recipient.lat_long,), default=("Not available", "body"), batch=get_day_forecasts),
+        Source("energy", get_energy_consumption,
+            (recipient.energy_api_key, recipient.energy_product, recipient.postcode, recipient.energy_mpan, recipient.energy_msn,
+             recipient.energy_compare_products),
+            default=("Not available", "body")
+        ),
+        Source("wotd", get_word_of_the_day, default=[("Not available", "body")]),
+        Source("national_news", get_headlines, (recipient.news_national,), default=(None, [("Not available", "body")])),
+        Source("local_news", get_headlines, (recipient.news_local,), default=(None, [("Not available", "body")])),
+        Source("sport", get_headlines, (recipient.news_sport,), default=(None, [("Not available", "body")])),
+        Source("wikipedia", get_wikipedia_info, default=[("Not available", "body")]),
+        Source("poem", get_burns_poem, default=[("Not available", "body")]),
+    ]
+    return [source._replace(budget=BUDGETS.get(source.name)) for source in sources]
+
+
+def snapshot_path_for(recipient: Recipient) -> str:
+    """
+    Where a recipient's last good sections are kept, with the default recipient using the prefetch snapshot
+    """
+    if recipient.name == DEFAULT_RECIPIENT.name:
+        return Snapshot.SNAPSHOT_PATH
+    return os.path.join(os.path.dirname(Snapshot.SNAPSHOT_PATH), f"snapshot-{recipient.name}.json")
+
+
+# ---------- Last known good ----------
+def describe_age(seconds: float) -> str:
+    minutes = max(1, int(seconds // 60))
+    if minutes < 60:
+        return f"{minutes} minute{'s' * (minutes != 1)}"
+    hours = minutes // 60
+    if hours < 48:
+        return f"{hours} hour{'s' * (hours != 1)}"
+    return f"{hours // 24} days"
+
+
+def label_stale(data, age: float):
+    """
+    Marks a section's last good data with how old it is, keeping the shape its layout expects
+    """
+    label = f"From {describe_age(age)} ago"
+    if isinstance(data, str):
+        return f"{data} ({label.lower()})"
+    if isinstance(data, list):
+        return [(label, "rightAlign")] + data
+    if isinstance(data, tuple) and len(data) == 2 and isinstance(data[1], str):
+        return [(label, "rightAlign"), data]
+    if isinstance(data, tuple) and len(data) == 2 and isinstance(data[1], list):
+        # The news sections' (image, headlines)
+        return data[0], [(label, "rightAlign")] + data[1]
+    return data
+
+
+def fall_back(source: Source, result, last_good: dict):
+    """
+    Swaps a failed source's default for its last good data from the snapshot, labelled with its age
+    """
+    if result is not source.default or source.name not in last_good:
+        return result
+
+    data, fetched_at = last_good[source.name]
+    age = time.time() - fetched_at
+    print(f"Using {source.name} from {describe_age(age)} ago")
+    Trace.event("stale_fallback", source=source.name, age=round(age))
+    return label_stale(data, age)
+
+
+def save_snapshot(fetched: dict, path: str):
+    """
+    Saves sections that were fetched successfully to the snapshot, logging rather than raising if it can't,
+    since the snapshot is only an extra and must never stop a receipt printing
+    """
+    try:
+        Snapshot.save(fetched, time.time(), path)
+    except Exception as e:
+        print("Failed to save the snapshot:", e)
+        Trace.event("snapshot_error", path=path, error=repr(e))
+
+
+def fetch(sources: list[Source], snapshot_path: str = Snapshot.SNAPSHOT_PATH) -> dict:
+    """
+    Gathers the given sources live and saves the ones that succeeded into the snapshot
+    """
+    results = gather(sources, budget=BUDGET)
+    fetched = {source.name: results[source.name] for source in sources if results[source.name] is not source.default}
+    save_snapshot(fetched, snapshot_path)
+    return results
+
+
+def build(use_snapshot: bool = True, snapshot_path: str = Snapshot.SNAPSHOT_PATH, names: list[str] = None) -> dict:
+    """
+    Gets the data for every section, taking fresh sections from the prefetched snapshot
+    and only fetching missing or stale sections live
+
+    names: Only build these sections, defaults to all of them
+    Returns a dict of section name to data, in receipt order
+    """
+    return dict(build_stream(use_snapshot, snapshot_path, names))
+
+
+def build_stream(use_snapshot: bool = True, snapshot_path: str = Snapshot.SNAPSHOT_PATH, names: list[str] = None) -> Iterator[tuple[str, Any]]:
+    """
+    Like build, but starts fetching straight away and returns (name, data) for each section in receipt order,
+    as soon as that section is ready
+
+    The snapshot is saved once every section has been read
+    """
+    sources = [source for source in get_sources() if names is None or source.name in names]
+    prefetched = Snapshot.load_fresh(MAX_AGES, DAILY, snapshot_path) if use_snapshot else {}
+    if prefetched:
+        print(f"Using {len(prefetched)} prefetched sections: {', '.join(prefetched)}")
+        Trace.count("snapshot_sections", len(prefetched))
+
+    missing = [source for source in sources if source.name not in prefetched]
+    live = gather_iter(missing, budget=BUDGET) if missing else iter(())
+
+    def sections():
+        fetched = {}
+        last_good = None
+        for source in sources:
+            if source.name in prefetched:
+                yield source.name, prefetched[source.name]
+                continue
+
+            name, result = next(live)
+            if result is not source.default:
+                fetched[name] = result
+            else:
+                last_good = Snapshot.load_all(snapshot_path) if last_good is None else last_good
+                result = fall_back(source, result, last_good)
+            yield name, result
+
+        if missing:
+            save_snapshot(fetched, snapshot_path)
+
+    return sections()
+
+
+def build_batch(recipients: list[Recipient], names: list[str] = None) -> dict[str, dict]:
+    """
+    Gets the data for several recipients' receipts live, fetching what they have in common only once,
+    like the word of the day or a shared news feed, and every location's weather in one request
+
+    names: Only build these sections, defaults to all of them
+    Each recipient's sections that succeed are saved to their own snapshot, which those that fail fall back to
+
+    Returns a dict of recipient name to their sections, as build returns them
+    """
+    batches = [[source for source in get_sources(recipient) if names is None or source.name in names] for recipient in recipients]
+    results = gather_many(batches, budget=BUDGET)
+
+    receipts = {}
+    for recipient, sources, receipt in zip(recipients, batches, results):
+        path = snapshot_path_for(recipient)
+        fetched = {source.name: receipt[source.name] for source in sources if receipt[source.name] is not source.default}
+        if len(fetched) < len(sources):
+            last_good = Snapshot.load_all(path)
+            receipt = {source.name: fall_back(source, receipt[source.name], last_good) for source in sources}
+        save_snapshot(fetched, path)
+        receipts[recipient.name] = receipt
+    return receipts
@@ -6,131 +6,67 @@
 # Worldometer? https://worldometer.readthedocs.io/en/latest/
 # Sort news
 
-from DataSources.ReverseGeocode import reverse_geocode_label
-from DataSources.Weather import get_day_forecast
-from DataSources.Energy import get_energy_consumption
-from DataSources.Word import get_word_of_the_day
-from DataSources.News import get_headlines
-from DataSources.Wikipedia import get_wikipedia_info
-from DataSources.Burns import get_burns_poem
-from DataSources import Secrets
-from datetime import datetime
+import argparse, textwrap
 from time import sleep
+import Receipt
+from DataSources import RateLimit, Trace
+from Headings import HEADINGS, get_today_string
 
 RECEIPT_WIDTH = 42
 MARGIN = 2
 width = RECEIPT_WIDTH - 2 * MARGIN
 
-# ---------- Data Gathering ----------
-def safe_call(func, *args, default="Not available", **kwargs):
-    """
-    Call a function and return a default value if it raises an exception.
-
-    Args:
-        func (callable): The function to invoke.
-        *args: Positional arguments passed to the function.
-        default (Any): Value to return if an exception is raised.
-        **kwargs: Keyword arguments passed to the function.
-
-    Returns:
-        Any: The function's return value if successful, otherwise `default`.
-    """
-    try:
-        return func(*args, **kwargs)
-    except Exception:
-        return default
-    
-print("Location")
-location_string = safe_call(reverse_geocode_label, Secrets.lat_long, default="Unrecognised location")
-    
-print("Weather")
-weather = safe_call(get_day_forecast, Secrets.lat_long)
-
-print("Energy")
-dual_tariff_energy_data = safe_call(
-    get_energy_consumption,
-    Secrets.energy_api_key,
-    Secrets.energy_product,
-    Secrets.postcode,
-    Secrets.energy_mpan,
-    Secrets.energy_msn,
-    width
-)
-
-print("Word")
-wotd = safe_call(get_word_of_the_day, 34)
-
-print("News")
-news_headlines = safe_call(
-    get_headlines,
-    Secrets.newsapi_org_key,
-    "bbc-news",
-    width
-)
-
-print("Sports")
-sport_headlines = safe_call(
-    get_headlines,
-    Secrets.newsapi_org_key,
-    "bbc-sport",
-    width
-)
-
-print("Wikipedia")
-wikipedia_text = safe_call(get_wikipedia_info, width)
-
-print("Poem")
-poem = safe_call(get_burns_poem)
-
-
 # ---------- Helper functions ----------
-def ordinal(n: int):
-    if 11 <= (n % 100) <= 13:
-        suffix = 'th'
-    else:
-        suffix = ['th', 'st', 'nd', 'rd', 'th'][min(n % 10, 4)]
-    return str(n) + suffix
-
-def get_today_string():
-    "Monday 1st January 2026"
-    today = datetime.now()
-    return today.strftime(f"%A {ordinal(today.day)} %B %Y")
-
-
-
-# ---------- Printing ----------
-output = (" " + get_today_string() + " ").center(width, "=") + "\n"
-output += (location_string).center(width) + "\n\n"
-
-output += " WEATHER ".center(width, "=") + "\n"
-output += weather
-output += "\n\n"
-
-output += " ENERGY CONSUMPTION ".center(width, "=") + "\n"
-output += dual_tariff_energy_data
-output += "\n\n"
-
-output += " WORD OF THE DAY ".center(width, "=") + "\n"
-output += wotd
-output += "\n\n"
-
-output += " NEWS ".center(width, "=") + "\n"
-output += news_headlines
-output += "\n\n"
-
-output += " SPORTS ".center(width, "=") + "\n"
-output += sport_headlines
-output += "\n\n"
-
-output += " WIKIPEDIA ".center(width, "=") + "\n"
-output += wikipedia_text
-output += "\n\n"
-
-output += " TODAY'S BURNS POEM ".center(width, "=") + "\n"
-output += poem
-output += "\n\n"
-
-output_lines = output.splitlines()
-for line in output_lines:
-    print(line[:width])
-    sleep(0.02)
+def format_block(block: tuple[str, str]) -> str:
+    text, style = block
+    lines = []
+    for line in text.split("\n"):
+        for wrapped_line in textwrap.wrap(line, width) or [""]:
+            if style in ("heading", "subheading"):
+                wrapped_line = wrapped_line.center(width)
+            elif style == "rightAlign":
+                wrapped_line = wrapped_line.rjust(width)
+            lines.append(wrapped_line)
+    return "\n".join(lines) + "\n"
+
+def format_section(data) -> str:
+    # News sections come with an image that can't be shown here
+    if isinstance(data, tuple) and not isinstance(data[0], str):
+        data = data[1]
+    if isinstance(data, tuple):
+        return format_block(data)
+    return "".join(format_block(block) for block in data)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Shows the breakfast receipt in the terminal")
+    parser.add_argument("--live", action="store_true", help="Ignore any prefetched snapshot")
+    parser.add_argument("--sections", nargs="+", metavar="SECTION", choices=[source.name for source in Receipt.get_sources()],
+                        help="Only build these sections, in receipt order")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and save the stats with the run record")
+    args = parser.parse_args(argv)
+    RateLimit.set_priority(RateLimit.PRIORITY_HIGH)
+
+    # ---------- Data Gathering ----------
+    with Trace.run("console", args.profile), Trace.span("build"):
+        results = Receipt.build(use_snapshot=not args.live, names=args.sections)
+
+    # ---------- Printing ----------
+    output = (" " + get_today_string() + " ").center(width, "=") + "\n"
+    if "location" in results:
+        output += results["location"].center(width) + "\n"
+    output += "\n"
+
+    for name, heading in HEADINGS.items():
+        if name in results:
+            output += (" " + heading + " ").center(width, "=") + "\n"
+            output += format_section(results[name])
+            output += "\n\n"
+
+    for line in output.splitlines():
+        print(line[:width])
+        sleep(0.02)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,166 +8,75 @@
 # Get lat,long from postcode
 # Choose local news feed from postcode
 
-from DataSources.ReverseGeocode import reverse_geocode_label
-from DataSources.Weather import get_day_forecast
-from DataSources.Energy import get_energy_consumption
-from DataSources.Word import get_word_of_the_day
-from DataSources.News import get_headlines
-from DataSources.Wikipedia import get_wikipedia_info
-from DataSources.Burns import get_burns_poem
-import os, textwrap
-from dotenv import load_dotenv
-from datetime import datetime
-from escpos.printer import Network
+import argparse, os, sys
+import EscposConfig
+import Receipt, Render
+from DataSources import RateLimit, Trace
 
-PRINTER_IP = "192.168.1.165"
-PRINTER_TYPE = "TM-T88IV"
 MARGIN = 2
 
-load_dotenv()
-LAT_LONG = tuple(map(float, os.getenv("LAT_LONG").split(",")))
-ENERGY_API_KEY = os.getenv("ENERGY_API_KEY")
-ENERGY_PRODUCT = os.getenv("ENERGY_PRODUCT")
-POSTCODE = os.getenv("POSTCODE")
-ENERGY_MPAN = os.getenv("ENERGY_MPAN")
-ENERGY_MSN = os.getenv("ENERGY_MSN")
-NEWSAPI_ORG_KEY = os.getenv("NEWSAPI_ORG_KEY")
 
-
-def ordinal(n: int):
-    if 11 <= (n % 100) <= 13:
-        suffix = 'th'
-    else:
-        suffix = ['th', 'st', 'nd', 'rd', 'th'][min(n % 10, 4)]
-    return str(n) + suffix
-
-def get_today_string():
-    # "Monday 1st January 2026"
-    today = datetime.now()
-    return today.strftime(f"%A {ordinal(today.day)} %B %Y")
-
-def safe_call(func, *args, default="Not available", **kwargs):
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Prints the breakfast receipt")
+    parser.add_argument("--live", action="store_true", help="Ignore any prefetched snapshot")
+    parser.add_argument("--sections", nargs="+", metavar="SECTION", choices=[source.name for source in Receipt.get_sources()],
+                        help="Only build these sections, in receipt order")
+    parser.add_argument("--output", metavar="FILE", help="Write the ESC/POS bytes for the first printer to a file instead of printing them")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and save the stats with the run record")
+    parser.add_argument("--batch", metavar="FILE", help="Print a receipt for each recipient in this JSON file, fetching live")
+    parser.add_argument("--stream", action="store_true", help="Print each section as soon as it is ready, straight to the printers")
+    args = parser.parse_args(argv)
+    if args.stream and (args.batch or args.output):
+        parser.error("--stream prints a single receipt to the printers, so can't be used with --batch or --output")
+
+    # Someone is waiting for the paper, so this goes ahead of any prefetch hitting the same hosts
+    RateLimit.set_priority(RateLimit.PRIORITY_HIGH)
+
+    if args.stream:
+        with Trace.run("printer", args.profile):
+            sections = Receipt.build_stream(use_snapshot=not args.live, names=args.sections)
+            failed = Render.stream_receipt(sections, Render.configured_printers(), name="receipt")
+        if failed:
+            sys.exit(f"Failed to print to {', '.join(printer.ip for printer in failed)}")
+        return
+
+    with Trace.run("printer", args.profile):
+        # ---------- Data Gathering ----------
+        with Trace.span("build"):
+            if args.batch:
+                recipients = Receipt.load_recipients(args.batch)
+                receipts = Receipt.build_batch(recipients, names=args.sections)
+            else:
+                recipients = [Receipt.DEFAULT_RECIPIENT]
+                receipts = {"default": Receipt.build(use_snapshot=not args.live, names=args.sections)}
+
+        # ---------- Printing ----------
+        failed = []
+        for recipient in recipients:
+            printers = Render.parse_printers(recipient.printers) if recipient.printers else Render.configured_printers()
+            renders = Render.render_receipts(receipts[recipient.name], [printer.profile for printer in printers])
+            job = f"receipt {recipient.name}" if args.batch else "receipt"
+            print(job, ", ".join(f"{len(data)} bytes for {profile}" for profile, data in renders.items()))
+
+            if args.output:
+                with open(output_path(args.output, recipient.name, args.batch), "wb") as file:
+                    file.write(renders[printers[0].profile])
+            else:
+                failed += Render.send_all(renders, printers, name=job)
+
+    if failed:
+        sys.exit(f"Failed to print to {', '.join(printer.ip for printer in failed)}")
+
+
+def output_path(output: str, name: str, batch: bool) -> str:
     """
-    Call a function and return a default value if it raises an exception.
-
-    Args:
-        func (callable): The function to invoke.
-        *args: Positional arguments passed to the function.
-        default (Any): Value to return if an exception is raised.
-        **kwargs: Keyword arguments passed to the function.
-
-    Returns:
-        Any: The function's return value if successful, otherwise `default`.
+    Where to write a receipt with --output, adding the recipient's name in batch mode like receipt-gran.bin
     """
-    try:
-        return func(*args, **kwargs)
-    except Exception as e:
-        print(e)
-        return default
-
-# ---------- Data Gathering ----------
-location_string = safe_call(reverse_geocode_label, LAT_LONG, default="Unrecognised location")
-weather_block = safe_call(get_day_forecast, LAT_LONG, default=("Not available", "body"))
-energy_block = safe_call(get_energy_consumption,
-    ENERGY_API_KEY, ENERGY_PRODUCT, POSTCODE,
-    ENERGY_MPAN, ENERGY_MSN, default=("Not available", "body")
-)
-wotd_blocks = safe_call(get_word_of_the_day, default=[("Not available", "body")])
-national_news_thumb, national_news_blocks = safe_call(get_headlines, os.getenv("NEWS_NATIONAL"), default=[("Not available", "body")])
-local_news_thumb, local_news_blocks = safe_call(get_headlines, os.getenv("NEWS_LOCAL"), default=[("Not available", "body")])
-sport_thumb, sport_blocks = safe_call(get_headlines, os.getenv("NEWS_SPORT"), default=[("Not available", "body")])
-wikipedia_blocks = safe_call(get_wikipedia_info, default=[("Not available", "body")])
-poem = safe_call(get_burns_poem)
-
-
-printer = Network(PRINTER_IP, profile=PRINTER_TYPE)
-printer.set(font="a")
-columns = printer.profile.get_columns(font="a")
-print(columns, "columns")
-
-def print_line(text: str, style: str = None, margin: int = 2):
-
-    match style:
-        case "heading":
-            printer.set(bold=True, align="center")
-        case "subheading":
-            printer.set(bold=False, align="center")
-        case "rightAlign":
-            printer.set(bold=False, align="right")
-        case _: # default to body
-            style = "body"
-            printer.set(bold=False, align="left")
-
-    textlines = text.split("\n")
-
-    if style=="rightAlign":
-        textlines = [line + (" "*margin) for line in textlines]
-    elif style == "body":
-        textlines = [(" "*margin) + line for line in textlines]
-        
-    
-    for line in textlines:
-        printer.text(line)
-        printer.ln()
-
-def print_block(block:tuple[str,str], margin: int = 2):
-    lines = block[0].split("\n")
-    for line in lines:
-        wrapped_lines = textwrap.wrap(line, columns - 2 * margin)
-        for wrapped_line in wrapped_lines:
-            print_line(wrapped_line, block[1], margin)
-
-def print_blocks(blocks: list[tuple[str,str]], margin: int = 2):
-    for block in blocks:
-        print_block(block, margin)
-
-    
-# Date
-print_line(get_today_string(), "heading")
-
-# Location
-print_line(location_string, "subheading")
-printer.ln(2)
-    
-# Weather
-print_line("WEATHER", "heading")
-print_block(weather_block)
-printer.ln(2)
-
-# Energy
-print_line("ENERGY CONSUMPTION", "heading")
-print_block(energy_block)
-printer.ln(2)
-
-# Word
-print_line("WORD OF THE DAY", "heading")
-print_blocks(wotd_blocks)
-printer.ln(2)
-
-# News & sport headlines helper function
-def print_headlines(heading:str, image, blocks:list[tuple[str,str]]):
-
-    print_line(heading, "heading")
-    printer.set(align="center")
-    if image:
-        printer.image(image)
-    print_blocks(blocks)
-    printer.ln(2)
-
-# Print news and sport
-print_headlines("NATIONAL NEWS", national_news_thumb, national_news_blocks)
-print_headlines("LOCAL NEWS", local_news_thumb, local_news_blocks)
-print_headlines("SPORT", sport_thumb, sport_blocks)
-
-# Wikipedia
-print_line("WIKIPEDIA", "heading")
-print_blocks(wikipedia_blocks)
-printer.ln(2)
+    if not batch:
+        return output
+    root, extension = os.path.splitext(output)
+    return f"{root}-{name}{extension}"
 
-# Poem
-print_line("TODAY'S BURNS POEM", "heading")
-print_blocks(poem)
-printer.ln(2)
 
-# Finalise
-printer.cut()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+# Compiles the receipt into a single ESC/POS byte buffer, which is then sent to the printer in one write
+
+import itertools, os, textwrap
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, NamedTuple
+import EscposConfig
+from escpos.printer import Dummy, Network
+import Spooler
+from DataSources import Trace
+from Headings import HEADINGS, get_today_string
+
+# Printer settings for each block style, as (bold, align)
+STYLES = {
+    "heading": (True, "center"),
+    "subheading": (False, "center"),
+    "rightAlign": (False, "right"),
+    "body": (False, "left"),
+}
+
+# Sections whose data is (image, blocks)
+HEADLINES = {"national_news", "local_news", "sport"}
+
+# The python-escpos image command (GS v 0), chosen with benchmarks/images.py as the one the TM-T88IV supports
+# with the fewest bytes to send and the quickest encoding. Sending dominates, but the three differ by under 1%
+IMAGE_IMPL = "bitImageRaster"
+
+# Printers used unless the PRINTERS environment variable lists others, like "192.168.1.165:TM-T88IV,192.168.1.170:TM-T20II"
+DEFAULT_PRINTERS = "192.168.1.165:TM-T88IV"
+
+# Seconds a printer has to accept a job before it is given up on, so an offline printer doesn't hold up the rest
+PRINT_TIMEOUT = 15
+
+# Seconds to wait for the spooler to print a job, which can be queued behind others or waiting on reconnects.
+# A job still unprinted after this is cancelled, so it can't print late after being reported as failed
+SPOOL_TIMEOUT = 120
+
+
+class Printer(NamedTuple):
+    """
+    A network receipt printer
+
+    profile: The python-escpos printer profile, which decides the column count
+    """
+    ip: str
+    profile: str = "TM-T88IV"
+    timeout: float = PRINT_TIMEOUT
+
+
+def parse_printers(entries: list[str]) -> list[Printer]:
+    """
+    Reads printers written as "ip:profile", or just "ip" for a TM-T88IV
+    """
+    printers = []
+    for entry in entries:
+        ip, _, profile = entry.strip().partition(":")
+        printers.append(Printer(ip, profile) if profile else Printer(ip))
+    return printers
+
+
+def configured_printers() -> list[Printer]:
+    """
+    The printers listed in PRINTERS, comma separated
+    """
+    return parse_printers(os.getenv("PRINTERS", DEFAULT_PRINTERS).split(","))
+
+
+class ReceiptBuffer(Dummy):
+    """
+    An offline printer that collects ESC/POS commands into a buffer,
+    skipping style changes that wouldn't change anything and reusing the encoding of repeated text
+    """
+
+    def __init__(self, *args, **kwargs):
+        Dummy.__init__(self, *args, **kwargs)
+        self.style = (None, None)
+        # (text, codepage before) -> (encoded bytes, codepage after)
+        self.encoded = {}
+
+    def set_style(self, bold: bool, align: str):
+        """
+        Sends only the parts of the style that differ from the current one
+        """
+        current_bold, current_align = self.style
+        changes = {}
+        if bold != current_bold:
+            changes["bold"] = bold
+        if align != current_align:
+            changes["align"] = align
+        if changes:
+            self.set(**changes)
+        self.style = (bold, align)
+
+    def text(self, txt: str):
+        txt = str(txt)
+
+        # ASCII is the same in every code page, so it needs no lookup or code page switch
+        if txt.isascii():
+            self._raw(txt.encode("ascii"))
+            return
+
+        key = (txt, self.magic.encoding)
+        if key not in self.encoded:
+            start = len(self._output_list)
+            Dummy.text(self, txt)
+            self.encoded[key] = (b"".join(self._output_list[start:]), self.magic.encoding)
+            return
+
+        data, self.magic.encoding = self.encoded[key]
+        self._raw(data)
+
+
+class Layout:
+    """
+    Records the calls made to lay out a receipt, so the text is wrapped once for a column width
+    and then replayed onto a ReceiptBuffer for each printer profile with that width
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def set(self, **kwargs):
+        self.calls.append(("set", (), kwargs))
+
+    def set_style(self, bold: bool, align: str):
+        self.calls.append(("set_style", (bold, align), {}))
+
+    def text(self, txt: str):
+        self.calls.append(("text", (txt,), {}))
+
+    def image(self, image, **kwargs):
+        self.calls.append(("image", (image,), kwargs))
+
+    def ln(self, count: int = 1):
+        self.calls.append(("ln", (count,), {}))
+
+    def cut(self):
+        self.calls.append(("cut", (), {}))
+
+    def replay(self, printer: ReceiptBuffer):
+        for name, args, kwargs in self.calls:
+            getattr(printer, name)(*args, **kwargs)
+
+
+def print_line(printer: ReceiptBuffer, text: str, style: str = None, margin: int = 2):
+
+    if style not in STYLES:
+        style = "body"
+    printer.set_style(*STYLES[style])
+
+    textlines = text.split("\n")
+
+    if style=="rightAlign":
+        textlines = [line + (" "*margin) for line in textlines]
+    elif style == "body":
+        textlines = [(" "*margin) + line for line in textlines]
+
+    for line in textlines:
+        printer.text(line + "\n")
+
+def print_block(printer: ReceiptBuffer, columns: int, block: tuple[str,str], margin: int = 2):
+    lines = block[0].split("\n")
+    for line in lines:
+        wrapped_lines = textwrap.wrap(line, columns - 2 * margin)
+        for wrapped_line in wrapped_lines:
+            print_line(printer, wrapped_line, block[1], margin)
+
+def print_blocks(printer: ReceiptBuffer, columns: int, blocks: list[tuple[str,str]], margin: int = 2):
+    for block in blocks:
+        print_block(printer, columns, block, margin)
+
+def print_headlines(printer: ReceiptBuffer, columns: int, heading: str, image, blocks: list[tuple[str,str]]):
+    print_line(printer, heading, "heading")
+    if image:
+        printer.set_style(False, "center")
+        printer.image(image, impl=IMAGE_IMPL)
+    print_blocks(printer, columns, blocks)
+    printer.ln(2)
+
+
+def render_receipt(results: dict, profile: str) -> bytes:
+    """
+    Lays out the gathered sections as ESC/POS commands
+
+    results: Section name to data, as returned by Receipt.build. Sections missing from it are left out
+    profile: The python-escpos printer profile, which decides the column count
+    Returns the bytes to send to the printer, ending with a cut
+    """
+    return render_receipts(results, [profile])[profile]
+
+
+def render_receipts(results: dict, profiles: list[str]) -> dict[str, bytes]:
+    """
+    render_receipt for several printer profiles, laying out the text once per distinct column count
+
+    Returns a dict of profile to the bytes for it
+    """
+    with Trace.span("render", profiles=len(set(profiles))):
+        buffers = {profile: ReceiptBuffer(profile=profile) for profile in profiles}
+        render_part(buffers, lay_out, results)
+        return {profile: printer.output for profile, printer in buffers.items()}
+
+
+def render_part(buffers: dict[str, ReceiptBuffer], lay_out_part: Callable, *args):
+    """
+    Adds part of a receipt to each profile's buffer, calling lay_out_part(printer, columns, *args) once per column count
+    """
+    layouts = {}
+    for printer in buffers.values():
+        columns = printer.profile.get_columns(font="a")
+        if columns not in layouts:
+            layouts[columns] = Layout()
+            lay_out_part(layouts[columns], columns, *args)
+        layouts[columns].replay(printer)
+
+
+def lay_out(printer: ReceiptBuffer | Layout, columns: int, results: dict):
+    lay_out_date(printer, columns)
+    lay_out_location(printer, columns, results.get("location"))
+
+    # Sections that were built, in receipt order
+    for name in HEADINGS:
+        if name in results:
+            lay_out_section(printer, columns, name, results[name])
+
+    lay_out_end(printer, columns)
+
+
+def lay_out_date(printer: ReceiptBuffer | Layout, columns: int):
+    printer.set(font="a")
+    print_line(printer, get_today_string(), "heading")
+
+
+def lay_out_location(printer: ReceiptBuffer | Layout, columns: int, location: str | None):
+    if location is not None:
+        print_line(printer, location, "subheading")
+    printer.ln(2)
+
+
+def lay_out_section(printer: ReceiptBuffer | Layout, columns: int, name: str, data):
+    heading = HEADINGS[name]
+
+    if name in HEADLINES:
+        print_headlines(printer, columns, heading, *data)
+        return
+
+    print_line(printer, heading, "heading")
+    if isinstance(data, tuple):
+        print_block(printer, columns, data)
+    else:
+        print_blocks(printer, columns, data)
+    printer.ln(2)
+
+
+def lay_out_end(printer: ReceiptBuffer | Layout, columns: int):
+    printer.cut()
+
+
+def send(data: bytes, ip: str, profile: str, name: str = "", priority: int = Spooler.PRIORITY_NORMAL, timeout: float = PRINT_TIMEOUT):
+    """
+    Sends a rendered job to a network printer, through the local spooler if it is running,
+    otherwise directly in one bulk write
+
+    timeout: Seconds to wait for the printer when printing directly
+    Raises OSError if the printer can't be reached, or RuntimeError if the spooler couldn't print the job in time
+    """
+    Trace.count("print_bytes", len(data), printer=ip)
+    with Trace.span("print", printer=ip):
+        try:
+            job_id = Spooler.submit(data, ip, name, priority)
+        except (OSError, RuntimeError) as e:
+            print(f"Spooler unavailable ({e}), printing directly")
+            Trace.event("spooler_unavailable", error=repr(e))
+            printer = Network(ip, profile=profile, timeout=timeout)
+            printer.open()
+            try:
+                printer._raw(data)
+            finally:
+                printer.close()
+            return
+
+        finish_job(job_id, ip)
+
+
+def finish_job(job_id: int, ip: str):
+    """
+    Waits for a spooled job to print, cancelling it if it hasn't within SPOOL_TIMEOUT
+
+    Raises RuntimeError if it didn't print
+    """
+    job = Spooler.wait(job_id, SPOOL_TIMEOUT)
+    if job["state"] in ("queued", "printing"):
+        print(f"Print job {job_id} still {job['state']} after {SPOOL_TIMEOUT}s, cancelling it")
+        Trace.event("print_cancelled", printer=ip, state=job["state"])
+        job = Spooler.cancel(job_id)
+    print(f"Print job {job_id} {job['state']}")
+    if job["state"] != "done":
+        raise RuntimeError(f"Print job {job_id} on {ip} {job['state']}")
+
+
+def send_all(renders: dict[str, bytes], printers: list[Printer], name: str = "", priority: int = Spooler.PRIORITY_NORMAL) -> list[Printer]:
+    """
+    Sends each printer the job rendered for its profile, all at once
+
+    renders: Profile to bytes, as returned by render_receipts
+    Returns the printers that failed, after waiting at most about the longest printer timeout, or SPOOL_TIMEOUT for spooled jobs
+    """
+    with ThreadPoolExecutor(max_workers=len(printers) or 1) as pool:
+        call = Trace.carry(send)
+        futures = {printer: pool.submit(call, renders[printer.profile], printer.ip, printer.profile, name, priority, printer.timeout)
+                   for printer in printers}
+
+    failed = []
+    for printer, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Printing to {printer.ip} failed: {e}")
+            Trace.event("print_failed", printer=printer.ip, error=repr(e))
+            failed.append(printer)
+    return failed
+
+
+def stream_receipt(sections: Iterable[tuple[str, Any]], printers: list[Printer], name: str = "",
+                   priority: int = Spooler.PRIORITY_NORMAL) -> list[Printer]:
+    """
+    Prints the receipt while it is being built: the date as soon as the printers are open,
+    then each section as its data arrives, so the paper moves while later sources are still being fetched
+
+    Each printer is sent the receipt as one streamed spooler job, or directly if the spooler isn't running for it
+
+    sections: (name, data) in receipt order, like Receipt.build_stream returns
+    Returns the printers that failed
+    """
+    buffers = {printer.profile: ReceiptBuffer(profile=printer.profile) for printer in printers}
+    connections = {}
+    failed = []
+
+    def fail(printer: Printer, e: Exception):
+        print(f"Printing to {printer.ip} failed: {e}")
+        Trace.event("print_failed", printer=printer.ip, error=repr(e))
+        failed.append(printer)
+
+    def write(lay_out_part: Callable, *args):
+        render_part(buffers, lay_out_part, *args)
+        for printer in list(connections):
+            data = buffers[printer.profile].output
+            try:
+                connections[printer]._raw(data)
+                Trace.count("print_bytes", len(data), printer=printer.ip)
+            except (OSError, RuntimeError) as e:
+                close_quietly(connections.pop(printer))
+                fail(printer, e)
+        for buffer in buffers.values():
+            buffer.clear()
+
+    with Trace.span("print", printers=len(printers)):
+        # Connecting to every printer at once, so an offline one only costs its own timeout
+        with ThreadPoolExecutor(max_workers=len(printers) or 1) as pool:
+            opened = {printer: pool.submit(open_printer, printer, name, priority) for printer in printers}
+        for printer, future in opened.items():
+            try:
+                connections[printer] = future.result()
+            except Exception as e:
+                fail(printer, e)
+
+        try:
+            write(lay_out_date)
+
+            # The location goes under the date, if it is being printed
+            sections = iter(sections)
+            first = next(sections, None)
+            if first and first[0] == "location":
+                write(lay_out_location, first[1])
+                first = None
+            else:
+                write(lay_out_location, None)
+
+            for section, data in itertools.chain([first] if first else [], sections):
+                write(lay_out_section, section, data)
+
+            write(lay_out_end)
+        finally:
+            # Also ends spooled jobs if building a section raised, so the spooler isn't left waiting for them
+            for printer, connection in connections.items():
+                try:
+                    connection.close()
+                except (OSError, RuntimeError) as e:
+                    fail(printer, e)
+
+    return failed
+
+
+class SpooledStream:
+    """
+    Sends a receipt to the spooler a part at a time, as one job, with the same _raw and close as a Network printer
+    """
+
+    def __init__(self, printer: Printer, name: str, priority: int):
+        self.printer = printer
+        self.job_id = Spooler.begin(printer.ip, name, priority)
+
+    def _raw(self, data: bytes):
+        Spooler.append(self.job_id, data)
+
+    def close(self):
+        """
+        Ends the job and waits for it to print
+        Raises RuntimeError if it didn't print within SPOOL_TIMEOUT
+        """
+        Spooler.append(self.job_id, b"", last=True)
+        finish_job(self.job_id, self.printer.ip)
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except (OSError, RuntimeError):
+        pass
+
+
+def open_printer(printer: Printer, name: str = "", priority: int = Spooler.PRIORITY_NORMAL) -> SpooledStream | Network:
+    """
+    Starts a streamed job on the spooler, or connects to the printer directly if the spooler isn't running for it
+    """
+    try:
+        return SpooledStream(printer, name, priority)
+    except (OSError, RuntimeError) as e:
+        print(f"Spooler unavailable ({e}), printing directly")
+        Trace.event("spooler_unavailable", error=repr(e))
+
+    connection = Network(printer.ip, profile=printer.profile, timeout=printer.timeout)
+    connection.open()
+    return connection
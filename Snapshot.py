@@ -0,0 +1,117 @@
+# Saves gathered receipt sections to a versioned snapshot file, so the receipt can be printed from prefetched data
+
+import base64, fcntl, json, os, tempfile, time
+from datetime import date, datetime
+from io import BytesIO
+from DataSources.Cache import CACHE_DIR
+
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, "snapshot.json")
+
+# Bump when the layout of the file or of any section's data changes, so old snapshots are ignored
+VERSION = 1
+
+
+def encode(value):
+    """
+    Converts section data into JSON-safe values, keeping tuples and images recognisable
+    """
+    # Only data with images in it can have come from PIL
+    if type(value).__module__.startswith("PIL."):
+        buffer = BytesIO()
+        value.save(buffer, format="PNG")
+        return {"image": base64.b64encode(buffer.getvalue()).decode("ascii")}
+    if isinstance(value, tuple):
+        return {"tuple": [encode(item) for item in value]}
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {"dict": {key: encode(item) for key, item in value.items()}}
+    return value
+
+
+def decode(value):
+    """
+    Reverses encode()
+    """
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if isinstance(value, dict):
+        if "image" in value:
+            from PIL import Image
+            return Image.open(BytesIO(base64.b64decode(value["image"])))
+        if "tuple" in value:
+            return tuple(decode(item) for item in value["tuple"])
+        if "dict" in value:
+            return {key: decode(item) for key, item in value["dict"].items()}
+    return value
+
+
+def read(path: str = SNAPSHOT_PATH) -> dict:
+    """
+    Reads the raw snapshot sections, or nothing if the file is missing, corrupt or from another version
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            snapshot = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if snapshot.get("version") != VERSION:
+        return {}
+    return snapshot.get("sections", {})
+
+
+def save(sections: dict, fetched_at: float, path: str = SNAPSHOT_PATH):
+    """
+    Writes sections into the snapshot, keeping any other sections already stored there
+
+    sections: Section name to data, only including sections that were fetched successfully
+    fetched_at: Unix time the data was fetched
+    """
+    encoded = {name: {"fetched_at": fetched_at, "data": encode(value)} for name, value in sections.items()}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Held while merging, so a prefetch and a print saving at once don't drop each other's sections
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stored = {**read(path), **encoded}
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False) as file:
+            try:
+                json.dump({"version": VERSION, "saved_at": time.time(), "sections": stored}, file)
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, path)
+
+
+def load_fresh(max_ages: dict[str, float], daily: set[str] = frozenset(), path: str = SNAPSHOT_PATH) -> dict:
+    """
+    Loads the sections from the snapshot that are still fresh enough to print
+
+    max_ages: Section name to the oldest age in seconds it can be printed at. Sections not listed are never fresh
+    daily: Sections that must also have been fetched today
+    Returns a dict of section name to data
+    """
+    now = time.time()
+    fresh = {}
+
+    for name, section in read(path).items():
+        fetched_at = section["fetched_at"]
+        if name not in max_ages or now - fetched_at > max_ages[name]:
+            continue
+        if name in daily and datetime.fromtimestamp(fetched_at).date() != date.today():
+            continue
+        fresh[name] = decode(section["data"])
+
+    return fresh
+
+
+def load_all(path: str = SNAPSHOT_PATH) -> dict:
+    """
+    Loads every section in the snapshot however old it is, as the last known good data to fall back on
+
+    Returns a dict of section name to (data, fetched_at)
+    """
+    return {name: (decode(section["data"]), section["fetched_at"]) for name, section in read(path).items()}
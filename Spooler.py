@@ -0,0 +1,340 @@
+# A local print spooler that owns one long-lived connection to the receipt printer.
+# Producers like ReceiptPrinter.py and Spotify.py submit pre-rendered ESC/POS jobs to it, so they never
+# reconnect for every print or interleave their output when cron runs them close together.
+#
+# Usage:
+#   python Spooler.py [printer ip] [printer profile]
+#
+# Protocol, over local TCP: the client sends one JSON line, then for "submit" and "append" `size` bytes of job data.
+# The spooler answers with one JSON line.
+#   {"op": "submit", "printer": ip, "name": str, "priority": int, "size": int} -> {"id": int}
+#   {"op": "begin", "printer": ip, "name": str, "priority": int} -> {"id": int}
+#   {"op": "append", "id": int, "size": int, "last": bool} -> {"id": int}
+#   {"op": "status", "id": int} -> {"id": int, "name": str, "state": "queued"|"printing"|"done"|"failed"|"cancelled", "error": str}
+#   {"op": "cancel", "id": int} -> the job's status, as for "status"
+#
+# "begin" starts a streamed job, whose data arrives a part at a time with "append" until one marked last.
+# Once a streamed job starts printing, its parts are printed as they arrive and other jobs wait for it to finish.
+# "cancel" drops a queued job, or stops a printing one before its next part. A part already being sent still prints.
+
+import heapq, itertools, json, socket, socketserver, sys, threading, time
+import EscposConfig
+from escpos.printer import Network
+
+HOST = "127.0.0.1"
+PORT = 9101
+
+PRINTER_IP = "192.168.1.165"
+PRINTER_TYPE = "TM-T88IV"
+
+# Lower numbers print first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Attempts at sending one job, and the longest wait between reconnects in seconds
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 30
+
+# How many finished jobs to remember for status requests
+HISTORY = 100
+
+# Seconds the printer connection can sit unused before it is reopened for the next job,
+# as printers and routers drop idle connections without the socket noticing
+IDLE_RECONNECT = 60
+
+# Seconds a streamed job waits for its next part before it is given up on
+STREAM_TIMEOUT = 60
+
+
+class Job:
+    def __init__(self, job_id: int, name: str, priority: int, parts: list[bytes], complete: bool = True):
+        self.id = job_id
+        self.name = name
+        self.priority = priority
+        # Parts are dropped once printed. A streamed job is complete once its last part has arrived
+        self.parts = parts
+        self.complete = complete
+        self.state = "queued"
+        self.error = None
+        self.cancelled = False
+
+    def status(self) -> dict:
+        return {"id": self.id, "name": self.name, "state": self.state, "error": self.error}
+
+
+class Spooler:
+    """
+    A priority queue of jobs, printed in order by a single worker thread over one printer connection
+    """
+
+    def __init__(self, printer_ip: str, profile: str):
+        self.printer_ip = printer_ip
+        self.printer = Network(printer_ip, profile=profile)
+        self.connected = False
+        self.last_used = 0
+        self.queue = []
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.condition = threading.Condition()
+
+    def submit(self, name: str, priority: int, data: bytes, complete: bool = True) -> Job:
+        """
+        Queues a job, or starts a streamed job with its first part if not complete
+        """
+        with self.condition:
+            job = Job(next(self.ids), name, priority, [data] if data else [], complete)
+            self.jobs[job.id] = job
+            heapq.heappush(self.queue, (priority, job.id, job))
+            self.forget_old_jobs()
+            self.condition.notify_all()
+        return job
+
+    def append(self, job: Job, data: bytes, last: bool):
+        """
+        Adds the next part of a streamed job
+        """
+        with self.condition:
+            if job.complete or job.cancelled or job.state in ("done", "failed"):
+                raise ValueError(f"Job {job.id} isn't taking any more data")
+            if data:
+                job.parts.append(data)
+            job.complete = last
+            self.condition.notify_all()
+
+    def cancel(self, job: Job):
+        """
+        Drops a queued job, or stops a printing one before its next part
+        """
+        with self.condition:
+            if job.state == "queued":
+                self.queue = [entry for entry in self.queue if entry[2] is not job]
+                heapq.heapify(self.queue)
+                job.state = "cancelled"
+                job.parts = []
+            elif job.state == "printing":
+                job.cancelled = True
+            self.condition.notify_all()
+
+    def forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in ("done", "failed", "cancelled")]
+        for job_id in finished[:max(0, len(finished) - HISTORY)]:
+            del self.jobs[job_id]
+
+    def next_job(self) -> Job:
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+            _, _, job = heapq.heappop(self.queue)
+            job.state = "printing"
+            return job
+
+    def connection_alive(self) -> bool:
+        """
+        Whether the printer connection is still open at the other end, without waiting
+        """
+        connection = self.printer.device
+        timeout = connection.gettimeout()
+        try:
+            connection.setblocking(False)
+            # Empty only once the printer has closed its end. Waiting status bytes mean it's still there
+            return connection.recv(1, socket.MSG_PEEK) != b""
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            connection.settimeout(timeout)
+
+    def send(self, data: bytes):
+        # A write to a half-closed connection can still succeed, losing the data, so stale ones are replaced first
+        if self.connected and (time.monotonic() - self.last_used > IDLE_RECONNECT or not self.connection_alive()):
+            self.printer.close()
+            self.connected = False
+        if not self.connected:
+            self.printer.open()
+            self.connected = True
+        self.printer._raw(data)
+        self.last_used = time.monotonic()
+
+    def send_part(self, job: Job, data: bytes) -> bool:
+        """
+        Sends part of a job, reconnecting with backoff if the printer connection drops
+
+        Returns whether it was sent
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                self.send(data)
+                return True
+            except Exception as e:
+                print(f"Job {job.id} attempt {attempt + 1} failed: {e}")
+                job.error = str(e)
+                self.printer.close()
+                self.connected = False
+                time.sleep(min(2 ** attempt, MAX_BACKOFF))
+        return False
+
+    def next_part(self, job: Job, index: int) -> bytes | None:
+        """
+        A job's part at index, waiting for it to arrive if the job is streamed, or None once there are no more
+        """
+        with self.condition:
+            while index >= len(job.parts) and not job.complete and not job.cancelled:
+                if not self.condition.wait(STREAM_TIMEOUT):
+                    raise TimeoutError(f"No data for {STREAM_TIMEOUT}s")
+            return job.parts[index] if index < len(job.parts) else None
+
+    def print_job(self, job: Job):
+        index = 0
+        try:
+            while (data := self.next_part(job, index)) is not None:
+                if job.cancelled:
+                    break
+                if not self.send_part(job, data):
+                    job.state = "failed"
+                    break
+                job.parts[index] = None
+                index += 1
+            else:
+                # A streamed job that was cancelled runs out of parts before its last one arrives
+                if job.complete:
+                    job.state = "done"
+                    # Errors from attempts that were retried don't apply to a job that printed
+                    job.error = None
+            if job.state == "printing":
+                job.state = "cancelled"
+        except TimeoutError as e:
+            job.error = str(e)
+            job.state = "failed"
+
+        with self.condition:
+            job.parts = []
+            job.complete = True
+        print(f"Job {job.id} ({job.name}) {job.state}")
+
+    def run(self):
+        while True:
+            self.print_job(self.next_job())
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        spooler: Spooler = self.server.spooler
+        try:
+            request = json.loads(self.rfile.readline())
+
+            if request["op"] in ("submit", "begin"):
+                if request.get("printer", spooler.printer_ip) != spooler.printer_ip:
+                    raise ValueError(f"This spooler prints to {spooler.printer_ip}")
+                data = self.rfile.read(request.get("size", 0))
+                job = spooler.submit(request.get("name", ""), request.get("priority", PRIORITY_NORMAL), data,
+                                     complete=request["op"] == "submit")
+                reply = {"id": job.id}
+
+            elif request["op"] == "append":
+                job = spooler.jobs.get(request["id"])
+                if job is None:
+                    raise ValueError(f"Unknown job {request['id']}")
+                spooler.append(job, self.rfile.read(request["size"]), request.get("last", False))
+                reply = {"id": job.id}
+
+            elif request["op"] == "cancel":
+                job = spooler.jobs.get(request["id"])
+                if job is None:
+                    raise ValueError(f"Unknown job {request['id']}")
+                spooler.cancel(job)
+                reply = job.status()
+
+            elif request["op"] == "status":
+                job = spooler.jobs.get(request["id"])
+                reply = job.status() if job else {"id": request["id"], "state": "unknown", "error": None}
+
+            else:
+                raise ValueError(f"Unknown op {request['op']}")
+
+        except Exception as e:
+            reply = {"error": str(e)}
+
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(printer_ip: str = PRINTER_IP, profile: str = PRINTER_TYPE, host: str = HOST, port: int = PORT):
+    spooler = Spooler(printer_ip, profile)
+    threading.Thread(target=spooler.run, daemon=True).start()
+
+    with Server((host, port), Handler) as server:
+        server.spooler = spooler
+        print(f"Spooling to {printer_ip} on {host}:{port}")
+        server.serve_forever()
+
+
+# ---------- Client ----------
+def request(header: dict, data: bytes = b"", host: str = HOST, port: int = PORT, timeout: float = 5) -> dict:
+    """
+    Sends one request to the spooler and returns its reply
+
+    Raises OSError if the spooler isn't running, or RuntimeError if it rejected the request
+    """
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        connection.sendall(json.dumps(header).encode() + b"\n" + data)
+        reply = json.loads(connection.makefile("rb").readline())
+
+    if "error" in reply and reply.get("state") is None:
+        raise RuntimeError(reply["error"])
+    return reply
+
+
+def submit(data: bytes, printer_ip: str = PRINTER_IP, name: str = "", priority: int = PRIORITY_NORMAL) -> int:
+    """
+    Queues a pre-rendered job and returns its id
+    """
+    header = {"op": "submit", "printer": printer_ip, "name": name, "priority": priority, "size": len(data)}
+    return request(header, data)["id"]
+
+
+def begin(printer_ip: str = PRINTER_IP, name: str = "", priority: int = PRIORITY_NORMAL) -> int:
+    """
+    Starts a streamed job, to be sent a part at a time with append, and returns its id
+    """
+    return request({"op": "begin", "printer": printer_ip, "name": name, "priority": priority})["id"]
+
+
+def append(job_id: int, data: bytes, last: bool = False):
+    """
+    Sends the next part of a streamed job, with last set on the final one
+    """
+    request({"op": "append", "id": job_id, "size": len(data), "last": last}, data)
+
+
+def status(job_id: int) -> dict:
+    return request({"op": "status", "id": job_id})
+
+
+def cancel(job_id: int) -> dict:
+    """
+    Drops a queued job, or stops a printing one before its next part, and returns its status
+    """
+    return request({"op": "cancel", "id": job_id})
+
+
+def wait(job_id: int, timeout: float = 60, interval: float = 0.2) -> dict:
+    """
+    Polls a job until it is done, failed or cancelled, or the timeout passes
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = status(job_id)
+        if job["state"] in ("done", "failed", "cancelled", "unknown") or time.monotonic() > deadline:
+            return job
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    serve(*sys.argv[1:3])
@@ -1,62 +1,85 @@
-import random, requests, spotipy
-from io import BytesIO
+# Prints Spotify songs as scannable Spotify codes
+#
+# Usage:
+#   python Spotify.py                           One random liked song for the account cached in .cache
+#   python Spotify.py .cache-alice .cache-bob   One random liked song for each account
+#   python Spotify.py --count 5                 Five random liked songs on one receipt
+#   python Spotify.py --recent                  A random liked song, more likely a recently liked one
+#   python Spotify.py --playlist <uri or url>   Every song in a playlist on one receipt
+#   python Spotify.py --album <uri or url>      Every song in an album on one receipt
+
+import argparse, spotipy, sys
+import EscposConfig
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
-from escpos.printer import Network
-from PIL import Image, ImageFile
-import sys
+import LikedSongs, Render
+from PIL import ImageFile
+from DataSources import Images, RateLimit, Trace
 
 # Load environment variables
 load_dotenv()
 
-PRINTER_IP = "192.168.1.165"
 
-# Spotify OAuth setup
-if len(sys.argv) > 1:
-    cache_path = sys.argv[1]
-else:
-    cache_path = ".cache"
+# Don't print the same song again within this many days
+AVOID_DAYS = 30
 
-sp = spotipy.Spotify(
-    auth_manager = SpotifyOAuth(scope="user-library-read", open_browser=False, cache_path=cache_path)
-)
+# Spotify code images downloaded at once
+DOWNLOAD_WORKERS = 8
 
-def get_random_liked_song():
+
+def make_client(cache_path: str = ".cache", scope: str = "user-library-read") -> spotipy.Spotify:
+    """
+    Spotify OAuth setup for the account whose token is cached at cache_path
+    """
+    return spotipy.Spotify(
+        auth_manager = SpotifyOAuth(scope=scope, open_browser=False, cache_path=cache_path)
+    )
+
+
+def get_random_liked_songs(sp: spotipy.Spotify, account: str, count: int = 1, weighting: str = None) -> list[tuple[str, str, str]]:
     """
-    Choose a random liked song from the currently authenticated user's liked songs
+    Choose random liked songs from the account's liked songs,
+    using the local index of liked songs and only syncing it with the API occasionally
+
+    weighting: None for a uniform pick, or "recent" to favour recently liked songs
     """
 
-    # First call: get first 50 songs and total count metadata
-    results = sp.current_user_saved_tracks(limit=50)
-    total = results["total"]
+    LikedSongs.sync(sp, account)
+    songs = LikedSongs.sample(account, count, avoid_days=AVOID_DAYS, weighting=weighting)
 
-    if total == 0:
+    if not songs:
         print("No liked songs found.")
-        return None
-    
-    # Choose a random index
-    random_index = random.randint(0, total - 1)
-    
-    # Random index in the first 50 - use data already received
-    if random_index < 50:
-        tracks = results["items"]
-        track = tracks[random_index]["track"]
-
-    # Random index > 50 - get that song specifically
-    else:
-        results = sp.current_user_saved_tracks(
-            limit=1,
-            offset=random_index
-        )
 
-        track = results["items"][0]["track"]
+    return songs
+
+
+def get_collection_songs(sp: spotipy.Spotify, uri: str, kind: str) -> list[tuple[str, str, str]]:
+    """
+    Gets every song in a playlist or album
+
+    kind: "playlist" or "album"
+    Returns a list of (name, artists, uri)
+    """
+    if kind == "playlist":
+        results = sp.playlist_items(uri, additional_types=("track",))
+        get_track = lambda item: item.get("track")
+    else:
+        results = sp.album_tracks(uri)
+        get_track = lambda item: item
 
-    name = track["name"]
-    artists = ", ".join(artist["name"] for artist in track["artists"])
-    uri = track["uri"]
+    songs = []
+    while results:
+        for item in results["items"]:
+            track = get_track(item)
+            # Local files and podcast episodes have no Spotify code
+            if track and track.get("uri", "").startswith("spotify:track:"):
+                artists = ", ".join(artist["name"] for artist in track["artists"])
+                songs.append((track["name"], artists, track["uri"]))
+        results = sp.next(results) if results["next"] else None
 
-    return name, artists, uri
+    return songs
 
 
 def get_spotify_code(uri: str, width: int = 512, bg: str = "000000", fg: str = "white") -> ImageFile.ImageFile:
@@ -68,26 +91,31 @@ def get_spotify_code(uri: str, width: int = 512, bg: str = "000000", fg: str = "
         bg: Background colour, can be any hex colour.
         fg: Foreground colour, can be 'black' or 'white'
     """
-    
+
     # Encode URI for Spotify scannables endpoint
     encoded_uri = quote(uri, safe='')
     url = f"https://scannables.scdn.co/uri/plain/jpeg/{bg}/{fg}/{width}/{encoded_uri}"
 
-    response = requests.get(url)
-    if response.status_code != 200:
-        print("Failed to download Spotify code")
+    # Codes are two-tone, so a plain threshold keeps the bars sharp for scanning
+    try:
+        return Images.get_raster(url, width, method="threshold")
+    except Exception as e:
+        print("Failed to download Spotify code:", e)
         return
 
-    # Load image into PIL from memory
-    return Image.open(BytesIO(response.content))
 
-def print_spotify_code(image: ImageFile.ImageFile, title: str, artists: str):
+def get_spotify_codes(uris: list[str]) -> list[ImageFile.ImageFile]:
     """
-    Prints song title, artist, and spotify code with call to action
+    Downloads the Spotify codes for several songs at once, in the same order as `uris`
     """
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        return list(pool.map(Trace.carry(get_spotify_code), uris))
 
-    # Connect to printer
-    printer = Network(PRINTER_IP, profile="TM-T88IV")
+
+def render_spotify_code(printer: Render.ReceiptBuffer, image: ImageFile.ImageFile, title: str, artists: str):
+    """
+    Adds song title, artist, and spotify code with call to action to a print job
+    """
 
     # Optional header text
     printer.set(align='center', bold=True)
@@ -96,23 +124,94 @@ def print_spotify_code(image: ImageFile.ImageFile, title: str, artists: str):
     printer.set(bold=False)
     printer.text(artists + "\n\n")
 
-    printer.image(image)
+    printer.image(image, impl=Render.IMAGE_IMPL)
 
     printer.text("\nScan to open in Spotify\n\n")
-    printer.cut()
 
-    printer.close()
 
-if __name__ == "__main__":
-    song = get_random_liked_song()
-
-    if song:
-        name, artists, uri = song
+def print_spotify_codes(songs: list[tuple[str, str, str]], images: list[ImageFile.ImageFile]) -> tuple[int, list[Render.Printer]]:
+    """
+    Prints several songs on one receipt, with a single print job per printer
+    Returns how many songs are on the receipt, and the printers that failed to print it
+    """
+    printers = Render.configured_printers()
+    renders = {}
+    printed = 0
+    failed = []
+
+    # Once for each printer profile, as images are converted for the profile's paper width
+    for profile in {printer.profile for printer in printers}:
+        printer = Render.ReceiptBuffer(profile=profile)
+        printed = 0
+
+        for (name, artists, _), image in zip(songs, images):
+            if not image:
+                continue
+            if printed:
+                printer.text("\n")
+            render_spotify_code(printer, image, name, artists)
+            printed += 1
+
+        printer.cut()
+        renders[profile] = printer.output
+
+    if printed:
+        Trace.count("spotify_codes_printed", printed)
+        failed = Render.send_all(renders, printers, name="spotify")
+
+    return printed, failed
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Print Spotify songs as scannable codes")
+    parser.add_argument("cache_paths", nargs="*", default=[".cache"], help="OAuth cache path for each account")
+    parser.add_argument("--count", type=int, default=1, help="Random liked songs to print per account")
+    parser.add_argument("--recent", action="store_true", help="Favour recently liked songs in the random pick")
+    parser.add_argument("--playlist", help="Print every song in this playlist instead")
+    parser.add_argument("--album", help="Print every song in this album instead")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and save the stats with the run record")
+    args = parser.parse_args(argv)
+    RateLimit.set_priority(RateLimit.PRIORITY_HIGH)
+
+    failed = []
+    with Trace.run("spotify", args.profile):
+        # (account, uri) for each song, so printed liked songs can be remembered
+        songs = []
+        accounts = []
+
+        with Trace.span("songs"):
+            if args.playlist or args.album:
+                kind = "playlist" if args.playlist else "album"
+                scope = "user-library-read playlist-read-private" if args.playlist else "user-library-read"
+                sp = make_client(args.cache_paths[0], scope)
+                songs = get_collection_songs(sp, args.playlist or args.album, kind)
+                accounts = [None] * len(songs)
+            else:
+                for cache_path in args.cache_paths:
+                    account_songs = get_random_liked_songs(make_client(cache_path), cache_path, args.count,
+                                                            "recent" if args.recent else None)
+                    songs += account_songs
+                    accounts += [cache_path] * len(account_songs)
+
+        if songs:
+            print(f"Printing {len(songs)} songs:")
+            for name, artists, uri in songs:
+                print(name, "-", artists, uri)
+
+            with Trace.span("codes"):
+                images = get_spotify_codes([uri for _, _, uri in songs])
+            Trace.count("spotify_codes_missing", images.count(None))
+            printed, failed = print_spotify_codes(songs, images)
+
+            # Only songs that reached paper count towards not repeating them
+            if printed and len(failed) < len(Render.configured_printers()):
+                for account, (_, _, uri), image in zip(accounts, songs, images):
+                    if account and image:
+                        LikedSongs.mark_printed(account, uri)
+
+    if failed:
+        sys.exit(f"Failed to print to {', '.join(printer.ip for printer in failed)}")
 
-        print("Printing random liked song:")
-        print(name, "-", artists)
-        print(uri)
 
-        image = get_spotify_code(uri)
-        if image:
-            print_spotify_code(image, name, artists)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmarks getting today's Burns poem: parsing a whole page with html.parser as Burns.py used to,
+# parsing only the poem with Burns.extract_poem, and looking it up in a harvested DataSources/BurnsCorpus.py file
+#
+# Usage: python -m benchmarks.burns [poem page .html]
+
+import os, sys, tempfile, timeit
+from bs4 import BeautifulSoup
+from DataSources import Burns, BurnsCorpus
+
+REPEATS = 20
+WORK_COUNT = 700
+
+
+def sample_page(stanzas: int = 12, lines: int = 8) -> str:
+    """
+    A poem page shaped like robertburns.org's, with the navigation, scripts and notes around the poem
+    """
+    nav = "".join(f'<li><a class="nav-link" href="/works/work-{i}.html">Work {i}</a></li>' for i in range(400))
+    body = "".join(
+        '<div class="stanza">' + "".join(
+            f'<div class="work-line"><span class="work-line-number">{s * lines + l + 1}</span>'
+            f'<span class="work-line-text">Line {l} of stanza {s}, wi\' a wee bit mair tae mak it lang enough</span></div>'
+            for l in range(lines)
+        ) + '</div>'
+        for s in range(stanzas)
+    )
+    notes = "".join(f'<p class="note">Glossary note {i}: <em>word</em> &mdash; meaning</p>' for i in range(150))
+    return (
+        '<!DOCTYPE html><html><head><title>Poem</title>'
+        '<script>' + "var x = 1;" * 2000 + '</script><style>' + ".a{color:red}" * 1000 + '</style></head>'
+        f'<body><header><nav><ul>{nav}</ul></nav></header><main><h1>Poem</h1>'
+        f'<section class="work-lines">{body}</section><aside>{notes}</aside></main><footer>Footer</footer></body></html>'
+    )
+
+
+def full_parse(html: str) -> str:
+    """
+    The extraction as Burns.py did it before, building a tree of the whole page
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    work_lines = soup.find("section", class_="work-lines")
+    poem_stanzas = []
+    for stanza in work_lines.find_all("div", class_="stanza"):
+        stanza_lines = []
+        for line in stanza.find_all("div", class_="work-line"):
+            text_span = line.find("span", class_="work-line-text")
+            if text_span:
+                stanza_lines.append(text_span.get_text(strip=True))
+        poem_stanzas.append("\n".join(stanza_lines))
+    return "\n".join(poem_stanzas)
+
+
+def best_of(func) -> float:
+    """
+    Fastest time of one call in milliseconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=REPEATS)) * 1000
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as file:
+            html = file.read()
+    else:
+        html = sample_page()
+
+    poem = full_parse(html)
+    assert Burns.extract_poem(html) == poem
+
+    print(f"Extracting a poem from a {len(html) // 1024} KB page")
+    print(f"  {'html.parser, whole page':<32} {best_of(lambda: full_parse(html)):8.2f} ms")
+    print(f"  {Burns.PARSER + ', poem only':<32} {best_of(lambda: Burns.extract_poem(html)):8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.bin")
+        works = [BurnsCorpus.Work(f"work-{i}", f"Work {i}", poem) for i in range(WORK_COUNT)]
+        BurnsCorpus.write(works, path)
+        corpus = BurnsCorpus.Corpus(path)
+        assert corpus.work(123) == works[123]
+
+        print(f"Corpus of {WORK_COUNT} works, {os.path.getsize(path) // 1024} KB")
+        print(f"  {'open':<32} {best_of(lambda: BurnsCorpus.Corpus(path)):8.3f} ms")
+        print(f"  {'by day index':<32} {best_of(lambda: corpus.work(Burns.day_index(len(corpus)))):8.3f} ms")
+        print(f"  {'by day index, wrapped':<32} {best_of(lambda: Burns.wrap_poem(*corpus.work(5)[1:], 34)):8.3f} ms")
+        corpus.map.close()
@@ -0,0 +1,34 @@
+# Checks that a source still running past its deadline doesn't keep the process alive,
+# by gathering a source that hangs in a fresh interpreter and timing how long that takes to exit.
+# Exits with status 1 if it waited for the hung source, so it can run as a regression check.
+#
+# Usage: python -m benchmarks.deadline
+
+import os, subprocess, sys, tempfile, time
+
+BUDGET = 1
+HANG = 8
+
+# Allowed on top of BUDGET for the interpreter to start and exit
+SLACK = 2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = f"""
+import time
+from Gather import Source, gather
+result = gather([Source("hang", time.sleep, ({HANG},), default="Not available")], budget={BUDGET})
+assert result == {{"hang": "Not available"}}, result
+"""
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env={**os.environ, "RECEIPTS_CACHE_DIR": cache_dir},
+                       stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - start
+
+    ok = seconds <= BUDGET + SLACK
+    print(f"Exited {seconds:.2f}s after starting, with a {BUDGET}s budget and a source hanging for {HANG}s  {'ok' if ok else 'TOO SLOW'}")
+    sys.exit(0 if ok else 1)
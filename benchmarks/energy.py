@@ -0,0 +1,100 @@
+# Benchmarks the consumption engine in DataSources/Consumption.py against the pandas code it replaced,
+# on one day of half-hourly readings and on longer series, and ranking many tariffs with DataSources/Tariffs.py
+#
+# Usage: python -m benchmarks.energy
+
+import subprocess, sys, timeit
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from DataSources import Consumption, Tariffs
+
+REPEATS = 20
+LENGTHS = {"1 day": 48, "1 week": 48 * 7, "1 year": 48 * 365}
+TARIFF_COUNT = 50
+
+
+def sample_results(count: int) -> list[dict]:
+    """
+    Octopus-style consumption results, newest first like the API returns them
+    """
+    rng = np.random.default_rng(0)
+    end = datetime(2026, 1, 23, tzinfo=timezone.utc)
+    return [
+        {
+            "consumption": float(rng.gamma(2, 0.1)),
+            "interval_start": (end - timedelta(minutes=30 * (i + 1))).isoformat().replace("+00:00", "Z"),
+            "interval_end": (end - timedelta(minutes=30 * i)).isoformat().replace("+00:00", "Z"),
+        }
+        for i in range(count)
+    ]
+
+
+def pandas_split(consumption_data: list[dict]) -> tuple[float, float]:
+    """
+    The day/night split as Energy.py computed it before the engine
+    """
+    import pandas as pd
+
+    timeseries_df = pd.DataFrame(consumption_data)
+    timeseries_df['interval_start'] = pd.to_datetime(timeseries_df['interval_start'], utc=True)
+
+    timeseries_df['date'] = timeseries_df['interval_start'].dt.normalize()
+    to_unix = lambda x: pd.to_datetime(x.total_seconds(), unit='s', origin='unix')
+    timeseries_df['time'] = to_unix((timeseries_df['interval_start'] - timeseries_df['date']).dt)
+
+    night_start = to_unix(pd.Timedelta("00:30:00"))
+    day_start = to_unix(pd.Timedelta("07:30:00"))
+    day_mask = (timeseries_df['time'] >= day_start) | (timeseries_df['time'] < night_start)
+    night_mask = (timeseries_df['time'] < day_start) & (timeseries_df['time'] >= night_start)
+
+    return timeseries_df[day_mask]['consumption'].sum(), timeseries_df[night_mask]['consumption'].sum()
+
+
+def engine_split(consumption_data: list[dict]) -> tuple[float, float]:
+    split = Consumption.split_day_night(Consumption.from_results(consumption_data))
+    return split.day, split.night
+
+
+def sample_tariffs(series: Consumption.Series, count: int) -> list[Tariffs.Tariff]:
+    """
+    Agile-style tariffs with a different random unit rate every half hour, plus a flat and a dual-rate tariff
+    """
+    rng = np.random.default_rng(0)
+    open_end = np.full(len(series.starts), np.iinfo(np.int64).max)
+    tariffs = [
+        Tariffs.Tariff(f"agile {i}", Tariffs.RateSchedule(series.starts, open_end, rng.uniform(0.05, 0.35, len(series.starts))), Tariffs.fixed(0.5))
+        for i in range(count - 2)
+    ]
+    tariffs.append(Tariffs.Tariff("flat", Tariffs.fixed(0.25), Tariffs.fixed(0.5)))
+    tariffs.append(Tariffs.Tariff("dual", Tariffs.fixed(0.3), Tariffs.fixed(0.5), Tariffs.fixed(0.1)))
+    return tariffs
+
+
+def import_time(module: str) -> float:
+    """
+    Seconds to import a module in a fresh interpreter
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+
+
+if __name__ == "__main__":
+    print("Cold import")
+    for module in ("pandas", "numpy", "DataSources.Consumption"):
+        print(f"  {module:<24} {import_time(module) * 1000:8.1f} ms")
+
+    for label, count in LENGTHS.items():
+        data = sample_results(count)
+        assert np.allclose(pandas_split(data), engine_split(data))
+
+        print(f"Day/night split, {label} ({count} readings)")
+        for name, func in (("pandas", pandas_split), ("engine", engine_split)):
+            best = min(timeit.repeat(lambda: func(data), number=1, repeat=REPEATS))
+            print(f"  {name:<24} {best * 1000:8.2f} ms")
+
+    print(f"Ranking {TARIFF_COUNT} tariffs")
+    for label, count in LENGTHS.items():
+        series = Consumption.from_results(sample_results(count))
+        tariffs = sample_tariffs(series, TARIFF_COUNT)
+        best = min(timeit.repeat(lambda: Tariffs.rank(tariffs, series), number=1, repeat=REPEATS))
+        print(f"  {label:<24} {best * 1000:8.2f} ms")
@@ -0,0 +1,90 @@
+# Benchmarks reading RSS feeds: feedparser on the whole body as News.py used to, a full ElementTree as Word.py
+# used to, and the streaming reader in DataSources/Feeds.py, both stopping early and reading every entry.
+# Reports time, throughput (the whole feed's size over the time taken) and peak memory on feeds of increasing size.
+#
+# Usage: python -m benchmarks.feeds
+
+import timeit, tracemalloc
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.etree import ElementTree
+from DataSources import Feeds, Http
+
+REPEATS = 5
+SIZES = [50, 1000, 10000]
+LIMIT = 5
+
+
+def sample_feed(count: int) -> bytes:
+    """
+    A BBC-style RSS 2.0 feed with a media:thumbnail on every item, newest first
+    """
+    now = datetime.now(timezone.utc)
+    items = "".join(
+        f"<item><title><![CDATA[Headline number {i} about something happening today]]></title>"
+        f"<description><![CDATA[A summary of story {i}, a sentence or two long, like the ones the BBC writes.]]></description>"
+        f"<link>https://www.bbc.co.uk/news/articles/{i}</link><guid isPermaLink=\"false\">{i}</guid>"
+        f"<pubDate>{format_datetime(now - timedelta(minutes=7 * i))}</pubDate>"
+        f"<media:thumbnail width=\"240\" height=\"135\" url=\"https://ichef.bbci.co.uk/ace/standard/240/{i}.jpg\"/></item>"
+        for i in range(count)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss xmlns:media="http://search.yahoo.com/mrss/" version="2.0"><channel><title>BBC News</title>'
+        f'<link>https://www.bbc.co.uk/news</link><description>BBC News</description>{items}</channel></rss>'
+    ).encode("utf-8")
+
+
+def feedparser_first(body: bytes, limit: int = LIMIT) -> list:
+    import feedparser
+    entries = feedparser.parse(body).entries[:limit]
+    return [(e.title, e.published, e.media_thumbnail[0]["url"]) for e in entries]
+
+
+def elementtree_first(body: bytes) -> str:
+    return ElementTree.fromstring(body).find("channel").find("item").find("title").text
+
+
+def streaming_first(body: bytes, limit: int = LIMIT) -> list:
+    results = []
+    for entry in Feeds.iter_entries(Http.chunks(body)):
+        results.append((entry.title, entry.published, entry.media_thumbnail[0]["url"]))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def streaming_all(body: bytes) -> int:
+    return sum(1 for _ in Feeds.iter_entries(Http.chunks(body)))
+
+
+def measure(func, body: bytes) -> tuple[float, float]:
+    """
+    Fastest time in ms and peak traced memory in KB of one call
+    """
+    seconds = min(timeit.repeat(lambda: func(body), number=1, repeat=REPEATS))
+    tracemalloc.start()
+    func(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds * 1000, peak / 1024
+
+
+if __name__ == "__main__":
+    readers = {
+        f"feedparser, first {LIMIT}": feedparser_first,
+        "ElementTree, first item": elementtree_first,
+        f"streaming, first {LIMIT}": streaming_first,
+        "streaming, all": streaming_all,
+    }
+
+    for count in SIZES:
+        body = sample_feed(count)
+        assert streaming_first(body) == feedparser_first(body)
+        assert streaming_all(body) == count
+
+        print(f"{count} items, {len(body) / 1024:.0f} KB")
+        for name, func in readers.items():
+            ms, peak = measure(func, body)
+            throughput = len(body) / 1024 / 1024 / (ms / 1000)
+            print(f"  {name:<28} {ms:9.2f} ms  {throughput:8.1f} MB/s  peak {peak:9.0f} KB")
@@ -0,0 +1,342 @@
+# Responses for every endpoint the receipt and Spotify codes use, shaped and sized like the real APIs' responses.
+# They are built for the current time rather than stored, so every code path behaves as it would on a real
+# morning: headlines are recent, today's forecast and featured article exist, and the meter has readings up to
+# the end of yesterday.
+#
+# Each route is (host, path pattern, builder). A builder takes the path match and the query parameters
+# and returns (status, content type, body).
+
+import json, random, re, zlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from io import BytesIO
+from urllib.parse import urlencode
+import numpy as np
+from PIL import Image
+from benchmarks.burns import sample_page
+
+NOW = datetime.now(timezone.utc)
+DAY = 24 * 60 * 60
+INTERVAL = 30 * 60
+
+# The meter reports readings up to the end of yesterday, going back further than any first sync asks for
+CONSUMPTION_END = int(NOW.timestamp()) // DAY * DAY
+CONSUMPTION_START = CONSUMPTION_END - 120 * DAY
+
+REGIONS = "ABCDEFGHJKLMNP"
+WORK_COUNT = 650
+HEADLINE_COUNT = 45
+
+# The env the receipt is configured with for a benchmark run, pointing at data these fixtures have
+RECEIPT_ENV = {
+    "LAT_LONG": "55.9533,-3.1883",
+    "ENERGY_API_KEY": "sk_live_benchmark",
+    "ENERGY_PRODUCT": "VAR-22-11-01",
+    "POSTCODE": "EH1 1YZ",
+    "ENERGY_MPAN": "1012345678901",
+    "ENERGY_MSN": "21L1234567",
+    "ENERGY_COMPARE_PRODUCTS": "AGILE-24-10-01,OE-FIX-12M-25-09-01",
+    "NEWS_NATIONAL": "https://feeds.bbci.co.uk/news/rss.xml",
+    "NEWS_LOCAL": "https://feeds.bbci.co.uk/news/scotland/edinburgh_east_and_fife/rss.xml",
+    "NEWS_SPORT": "https://feeds.bbci.co.uk/sport/rss.xml",
+}
+
+JSON = "application/json"
+XML = "application/xml"
+JPEG = "image/jpeg"
+
+
+def seed_of(value) -> int:
+    """
+    A stable seed for any value, unlike hash() which changes between processes
+    """
+    return zlib.crc32(repr(value).encode())
+
+
+def words(count: int, seed) -> str:
+    vocabulary = ("the council said plans for new homes near the city centre would go ahead after a long "
+                  "campaign by residents who argued that traffic and schools had not been considered").split()
+    rng = random.Random(seed_of(seed))
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+def iso(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def json_response(data, status: int = 200) -> tuple[int, str, bytes]:
+    return status, JSON, json.dumps(data).encode()
+
+
+# ---------- Nominatim ----------
+def nominatim_reverse(match, query):
+    return json_response({
+        "place_id": 123456789, "licence": "Data © OpenStreetMap contributors, ODbL 1.0. http://osm.org/copyright",
+        "osm_type": "relation", "osm_id": 1920901, "lat": query["lat"], "lon": query["lon"],
+        "class": "boundary", "type": "administrative", "place_rank": 16, "importance": 0.74,
+        "addresstype": "city", "name": "City of Edinburgh",
+        "display_name": "City of Edinburgh, Alba / Scotland, United Kingdom",
+        "address": {"city": "City of Edinburgh", "ISO3166-2-lvl6": "GB-EDH", "state": "Alba / Scotland",
+                    "ISO3166-2-lvl4": "GB-SCT", "country": "United Kingdom", "country_code": "gb"},
+        "boundingbox": ["55.8187919", "56.0040837", "-3.4495326", "-3.0749305"],
+    })
+
+
+# ---------- Open-Meteo ----------
+def open_meteo_forecast(match, query):
+    fields = query["daily"].split(",")
+    values = {
+        "temperature_2m_max": 13.4, "temperature_2m_min": 6.1, "apparent_temperature_max": 11.2,
+        "apparent_temperature_min": 2.9, "sunrise": f"{query['start_date']}T07:38", "sunset": f"{query['start_date']}T17:54",
+        "daylight_duration": 36960.5, "precipitation_hours": 3.0, "precipitation_probability_max": 64,
+        "precipitation_sum": 2.4, "wind_speed_10m_max": 24.8, "wind_gusts_10m_max": 51.5,
+    }
+    # Several comma separated coordinates get a list with a forecast for each
+    forecasts = [{
+        "latitude": float(latitude), "longitude": float(longitude),
+        "generationtime_ms": 0.07, "utc_offset_seconds": 0, "timezone": "GMT", "timezone_abbreviation": "GMT",
+        "elevation": 47.0,
+        "daily_units": {"time": "iso8601", **{field: "" for field in fields}},
+        "daily": {"time": [query["start_date"]], **{field: [values[field]] for field in fields}},
+    } for latitude, longitude in zip(query["latitude"].split(","), query["longitude"].split(","))]
+    return json_response(forecasts if len(forecasts) > 1 else forecasts[0])
+
+
+# ---------- Octopus ----------
+def octopus_gsp(match, query):
+    return json_response({"count": 1, "next": None, "previous": None, "results": [{"group_id": "_N"}]})
+
+
+def octopus_product(match, query):
+    product = match.group("product")
+    links = lambda tariff: [
+        {"href": f"https://api.octopus.energy/v1/products/{product}/electricity-tariffs/{tariff}/{rate}/",
+         "method": "GET", "rel": rate.replace("-", "_")}
+        for rate in ("standing-charges", "standard-unit-rates", "day-unit-rates", "night-unit-rates")
+    ]
+
+    single, dual = {}, {}
+    for number, region in enumerate(REGIONS):
+        for method in ("direct_debit_monthly", "varying"):
+            code = f"E-1R-{product}-{region}"
+            single.setdefault(f"_{region}", {})[method] = {
+                "code": code, "standing_charge_exc_vat": 50.1 + number, "standing_charge_inc_vat": 52.6 + number,
+                "online_discount_exc_vat": 0, "online_discount_inc_vat": 0, "dual_fuel_discount_exc_vat": 0,
+                "dual_fuel_discount_inc_vat": 0, "exit_fees_exc_vat": 0, "exit_fees_inc_vat": 0, "exit_fees_type": "NONE",
+                "standard_unit_rate_exc_vat": 23.9 + number / 10, "standard_unit_rate_inc_vat": 25.1 + number / 10,
+                "links": links(code),
+            }
+            code = f"E-2R-{product}-{region}"
+            dual.setdefault(f"_{region}", {})[method] = {
+                "code": code, "standing_charge_exc_vat": 50.1 + number, "standing_charge_inc_vat": 52.6 + number,
+                "day_unit_rate_exc_vat": 28.6, "day_unit_rate_inc_vat": 30.0 + number / 10,
+                "night_unit_rate_exc_vat": 15.2, "night_unit_rate_inc_vat": 16.0 + number / 10,
+                "links": links(code),
+            }
+
+    return json_response({
+        "code": product, "full_name": f"Octopus {product}", "display_name": "Flexible Octopus",
+        "description": words(40, product), "is_variable": True, "is_green": True, "is_tracker": False,
+        "is_prepay": False, "is_business": False, "is_restricted": False, "term": None,
+        "available_from": "2022-11-01T00:00:00Z", "available_to": None, "brand": "OCTOPUS_ENERGY",
+        "tariffs_active_at": NOW.isoformat(),
+        "single_register_electricity_tariffs": single, "dual_register_electricity_tariffs": dual,
+        "single_register_gas_tariffs": {}, "sample_quotes": {}, "sample_consumption": {},
+        "links": [{"href": f"https://api.octopus.energy/v1/products/{product}/", "method": "GET", "rel": "self"}],
+    })
+
+
+def page(url: str, query: dict, results: list, default_size: int) -> tuple[int, str, bytes]:
+    """
+    One page of an Octopus list endpoint, with a `next` link like the API gives
+    """
+    size = int(query.get("page_size", default_size))
+    number = int(query.get("page", 1))
+    start = (number - 1) * size
+    next_url = None
+    if start + size < len(results):
+        next_url = url + "?" + urlencode({**query, "page": number + 1})
+    return json_response({
+        "count": len(results), "next": next_url, "previous": None, "results": results[start:start + size]
+    })
+
+
+def octopus_consumption(match, query):
+    period_from = int(datetime.fromisoformat(query["period_from"].replace("Z", "+00:00")).timestamp())
+    first = max(CONSUMPTION_START, period_from)
+    results = []
+    for start in range(first, CONSUMPTION_END, INTERVAL):
+        # The same interval always has the same reading, with more used in the evening
+        hour = (start % DAY) / 3600
+        kwh = random.Random(start).gammavariate(2, 0.06) + (0.15 if 17 <= hour < 22 else 0)
+        results.append({"consumption": round(kwh, 3), "interval_start": iso(start), "interval_end": iso(start + INTERVAL)})
+
+    if query.get("order_by") != "period":
+        results.reverse()
+    url = f"https://api.octopus.energy{match.group(0)}"
+    return page(url, query, results, 100)
+
+
+def octopus_rates(match, query):
+    product, rate = match.group("product"), match.group("rate")
+    period_from = int(datetime.fromisoformat(query["period_from"].replace("Z", "+00:00")).timestamp())
+    period_to = int(datetime.fromisoformat(query["period_to"].replace("Z", "+00:00")).timestamp())
+
+    if rate == "standard-unit-rates" and product.startswith("AGILE"):
+        # A new price every half hour, newest first
+        results = [
+            {"value_exc_vat": round(v / 1.05, 4), "value_inc_vat": v, "valid_from": iso(start),
+             "valid_to": iso(start + INTERVAL), "payment_method": None}
+            for start in range(period_to - INTERVAL, period_from - INTERVAL, -INTERVAL)
+            for v in [round(12 + 20 * random.Random(start).random() + (15 if 16 <= (start % DAY) / 3600 < 19 else 0), 2)]
+        ]
+    else:
+        value = 22.4 if rate == "standard-unit-rates" else 48.9
+        results = [
+            {"value_exc_vat": round(value / 1.05, 4), "value_inc_vat": value, "valid_from": "2025-09-01T00:00:00Z",
+             "valid_to": None, "payment_method": method}
+            for method in ("DIRECT_DEBIT", "NON_DIRECT_DEBIT")
+        ]
+
+    url = f"https://api.octopus.energy{match.group(0)}"
+    return page(url, query, results, 100)
+
+
+# ---------- BBC ----------
+def bbc_feed(match, query):
+    feed = match.group(0)
+    items = "".join(
+        f"<item><title><![CDATA[{words(9, (feed, i)).capitalize()}]]></title>"
+        f"<description><![CDATA[{words(25, (feed, i, 'd')).capitalize()}.]]></description>"
+        f"<link>https://www.bbc.co.uk/news/articles/c{i:09d}o</link>"
+        f"<guid isPermaLink=\"false\">https://www.bbc.co.uk/news/articles/c{i:09d}o#0</guid>"
+        f"<pubDate>{format_datetime(NOW - timedelta(minutes=23 * i + 5))}</pubDate>"
+        f"<media:thumbnail width=\"240\" height=\"135\" "
+        f"url=\"https://ichef.bbci.co.uk/ace/standard/240/cpsprodpb/{i:04x}/live/{seed_of((feed, i)):x}.jpg\"/></item>"
+        for i in range(HEADLINE_COUNT)
+    )
+    body = (
+        '<?xml version="1.0" encoding="UTF-8"?><?xml-stylesheet title="XSL_formatting" type="text/xsl" href="/shared/bsp/xsl/rss/nolsol.xsl"?>'
+        '<rss xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+        'xmlns:atom="http://www.w3.org/2005/Atom" version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+        '<title><![CDATA[BBC News]]></title><description><![CDATA[BBC News - News Front Page]]></description>'
+        '<link>https://www.bbc.co.uk/news</link><image><url>https://news.bbcimg.co.uk/nol/shared/img/bbc_news_120x60.gif</url>'
+        '<title>BBC News</title><link>https://www.bbc.co.uk/news</link></image><generator>RSS for Node</generator>'
+        f'<lastBuildDate>{format_datetime(NOW)}</lastBuildDate><copyright><![CDATA[Copyright: (C) British Broadcasting Corporation]]></copyright>'
+        f'<language><![CDATA[en-gb]]></language><ttl>15</ttl>{items}</channel></rss>'
+    )
+    return 200, XML, body.encode()
+
+
+def photo(width: int, seed) -> bytes:
+    """
+    A photo-like 16:9 JPEG
+    """
+    height = width * 9 // 16
+    y, x = np.mgrid[0:height, 0:width]
+    noise = np.random.default_rng(seed_of(seed)).normal(0, 20, (height, width))
+    pixels = np.sin(x / (width / 26)) * np.cos(y / (height / 24)) * 100 + x * 150 / width + noise
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB").save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def bbc_image(match, query):
+    return 200, JPEG, photo(int(match.group("width")), match.group(0))
+
+
+# ---------- Wikimedia ----------
+def wikimedia_featured(match, query):
+    def article(i, extract_words):
+        title = words(3, ("wiki", i)).title()
+        return {
+            "type": "standard", "title": title.replace(" ", "_"), "displaytitle": title,
+            "titles": {"canonical": title.replace(" ", "_"), "normalized": title, "display": title},
+            "pageid": 1000 + i, "lang": "en", "dir": "ltr", "revision": str(123456789 + i),
+            "description": words(6, ("description", i)),
+            "thumbnail": {"source": f"https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/{i}.jpg/320px-{i}.jpg",
+                          "width": 320, "height": 213},
+            "content_urls": {"desktop": {"page": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"}},
+            "extract": words(extract_words, ("extract", i)).capitalize() + ".",
+            "views": 250000 // (i + 1), "rank": i + 1,
+        }
+
+    return json_response({
+        "tfa": article(0, 180),
+        "mostread": {"date": NOW.strftime("%Y-%m-%dZ"), "articles": [article(i + 1, 60) for i in range(50)]},
+        "image": {"title": "File:Example.jpg", "description": {"text": words(30, "image"), "lang": "en"}},
+        "news": [{"story": words(30, ("news", i)), "links": [article(100 + i, 40)]} for i in range(5)],
+        "onthisday": [{"text": words(20, ("otd", i)), "year": 1900 + i, "pages": [article(200 + i, 40)]} for i in range(20)],
+    })
+
+
+# ---------- robertburns.org ----------
+def burns_works(match, query):
+    return json_response([
+        {"title": words(4, ("work", i)).title(), "slug": f"work-{i}", "year": 1774 + i % 22,
+         "category": "poem" if i % 5 else "song", "first_line": words(8, ("first", i))}
+        for i in range(WORK_COUNT)
+    ])
+
+
+def burns_work(match, query):
+    number = int(match.group("number"))
+    return 200, "text/html; charset=utf-8", sample_page(stanzas=4 + number % 12, lines=4 + number % 5).encode()
+
+
+# ---------- wordsmith ----------
+def wordsmith_feed(match, query):
+    body = (
+        '<?xml version="1.0" encoding="ISO-8859-1" ?><rss version="2.0"><channel>'
+        '<title>Wordsmith.org: Today\'s Word</title><link>https://wordsmith.org/words/today.html</link>'
+        '<description>The magic of words</description><language>en-us</language>'
+        '<item><title>petrichor</title><link>https://wordsmith.org/words/petrichor.html</link>'
+        '<description>noun: A pleasant earthy smell after rain.</description></item></channel></rss>'
+    )
+    return 200, "text/xml", body.encode("iso-8859-1")
+
+
+# ---------- Spotify ----------
+def spotify_code(match, query):
+    width = int(match.group("width"))
+    height = width // 4
+    image = Image.new("RGB", (width, height), "black")
+    rng = random.Random(seed_of(match.group("uri")))
+    bars = np.zeros((height, width), dtype=np.uint8)
+    for bar in range(23):
+        x = width // 4 + bar * (width * 2 // 3) // 23
+        half = rng.randint(2, height // 2 - 4)
+        bars[height // 2 - half:height // 2 + half, x:x + max(2, width // 120)] = 255
+    image.paste(Image.fromarray(bars).convert("RGB"), mask=Image.fromarray(bars))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return 200, JPEG, buffer.getvalue()
+
+
+ROUTES = [
+    ("nominatim.openstreetmap.org", r"/reverse", nominatim_reverse),
+    ("api.open-meteo.com", r"/v1/forecast", open_meteo_forecast),
+    ("api.octopus.energy", r"/v1/industry/grid-supply-points/", octopus_gsp),
+    ("api.octopus.energy", r"/v1/products/(?P<product>[^/]+)/", octopus_product),
+    ("api.octopus.energy", r"/v1/electricity-meter-points/[^/]+/meters/[^/]+/consumption/", octopus_consumption),
+    ("api.octopus.energy", r"/v1/products/(?P<product>[^/]+)/electricity-tariffs/[^/]+/(?P<rate>[^/]+)/", octopus_rates),
+    ("feeds.bbci.co.uk", r"/.*rss\.xml", bbc_feed),
+    ("ichef.bbci.co.uk", r"/(?:ace|news)/(?:standard|ws)/(?P<width>\d+)/.*", bbc_image),
+    ("api.wikimedia.org", r"/feed/v1/wikipedia/en/featured/\d{4}/\d{2}/\d{2}", wikimedia_featured),
+    ("robertburns.org", r"/static/json/works_app/works_list\.json", burns_works),
+    ("robertburns.org", r"/works/work-(?P<number>\d+)\.html", burns_work),
+    ("wordsmith.org", r"/awad/rss1\.xml", wordsmith_feed),
+    ("scannables.scdn.co", r"/uri/plain/jpeg/[0-9a-fA-F]+/\w+/(?P<width>\d+)/(?P<uri>.+)", spotify_code),
+]
+
+HOSTS = {host for host, _, _ in ROUTES}
+
+
+def respond(host: str, path: str, query: dict) -> tuple[int, str, bytes]:
+    """
+    Builds the response for a request to one of the real hosts
+    """
+    for route_host, pattern, builder in ROUTES:
+        if route_host == host and (match := re.fullmatch(pattern, path)):
+            return builder(match, query)
+    return 404, "text/plain", b"Not found"
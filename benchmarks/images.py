@@ -0,0 +1,115 @@
+# Benchmarks the image pipeline: decoding, resizing and dithering a thumbnail,
+# then each python-escpos image implementation on the resulting raster, by encoding time and bytes sent
+#
+# Usage: python -m benchmarks.images [image file] [printer ip]
+#   With a printer ip, each implementation's raster is also printed and timed on the real printer
+
+import sys, time, timeit
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from DataSources import Images
+from Render import ReceiptBuffer
+
+IMPLEMENTATIONS = ["bitImageRaster", "graphics", "bitImageColumn"]
+PROFILE = "TM-T88IV"
+REPEATS = 20
+
+# Bytes per second the TM-T88IV takes raster data at, as it prints 64 byte dot lines at 200 mm/s and 180 dpi.
+# Its receive buffer is only 4 KB, so a raster is sent about as fast as it prints, however fast the network is
+PRINT_BYTES_PER_SECOND = 64 * 200 / 25.4 * 180
+
+
+def sample_jpeg(width: int = 976, height: int = 549) -> bytes:
+    """
+    A photo-like test image, used if no image file is given
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = (np.sin(x / 37) * np.cos(y / 23) * 100 + x * 150 / width + np.random.default_rng(0).normal(0, 20, (height, width)))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def best_of(func) -> float:
+    """
+    Fastest time of one call in milliseconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=REPEATS)) * 1000
+
+
+def bench_pipeline(data: bytes, width: int):
+    print(f"Pipeline, {len(data)} byte JPEG to {width} dots")
+
+    def full_decode():
+        Image.open(BytesIO(data)).convert("RGB").convert("L")
+    print(f"  {'full decode':<28} {best_of(full_decode):8.2f} ms")
+    print(f"  {'draft decode':<28} {best_of(lambda: Images.decode(data, width)):8.2f} ms")
+
+    grey = Images.resize(Images.decode(data, width), width)
+    for method in ("floyd-steinberg", "ordered", "threshold"):
+        print(f"  {'dither ' + method:<28} {best_of(lambda: Images.dither(grey, method)):8.2f} ms")
+
+
+def render(raster: Image.Image, impl: str) -> bytes:
+    printer = ReceiptBuffer(profile=PROFILE)
+    printer.image(raster, impl=impl)
+    return printer.output
+
+
+def bench_implementations(raster: Image.Image) -> str:
+    """
+    Times encoding the raster with each implementation, and estimates sending its bytes at PRINT_BYTES_PER_SECOND
+
+    Returns the implementation with the least time for both
+    """
+    print(f"python-escpos implementations, {raster.width}x{raster.height} raster")
+    print(f"  {'':<28} {'encode':>11} {'size':>14} {'send':>11} {'total':>11}")
+    totals = {}
+    for impl in IMPLEMENTATIONS:
+        encode = best_of(lambda: render(raster, impl))
+        size = len(render(raster, impl))
+        send = size / PRINT_BYTES_PER_SECOND * 1000
+        totals[impl] = encode + send
+        print(f"  {impl:<28} {encode:8.2f} ms {size:8d} bytes {send:8.2f} ms {totals[impl]:8.2f} ms")
+
+    fastest = min(totals, key=totals.get)
+    print(f"Fastest: {fastest}")
+    return fastest
+
+
+def bench_printer(raster: Image.Image, ip: str):
+    """
+    Prints the raster with each implementation, timing until the printer has taken the last byte,
+    which with its small receive buffer is until most of the image has printed
+    """
+    from escpos.printer import Network
+
+    print(f"Printing on {ip}")
+    for impl in IMPLEMENTATIONS:
+        data = render(raster, impl)
+        printer = Network(ip, profile=PROFILE)
+        printer.open()
+        try:
+            start = time.perf_counter()
+            printer._raw(data)
+            seconds = time.perf_counter() - start
+            printer.cut()
+        finally:
+            printer.close()
+        print(f"  {impl:<28} {seconds * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as file:
+            data = file.read()
+    else:
+        data = sample_jpeg()
+
+    for width in (240, Images.PRINTER_WIDTH):
+        bench_pipeline(data, width)
+    raster = Images.dither(Images.resize(Images.decode(data, Images.PRINTER_WIDTH), Images.PRINTER_WIDTH))
+    bench_implementations(raster)
+    if len(sys.argv) > 2:
+        bench_printer(raster, sys.argv[2])
@@ -0,0 +1,139 @@
+# A local stand-in for every API the receipt uses, serving benchmarks/fixtures.py over real HTTP with injected
+# latency and jitter. install() points DataSources/Http.py's shared session at it, so requests still go through
+# the connection pools, retries, gzip and disk cache exactly as they would against the real hosts.
+#
+# Usage: python -m benchmarks.standin [port] [latency ms] [jitter ms]
+
+import gzip, hashlib, random, sys, threading, time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from benchmarks import fixtures
+from DataSources import Http
+
+# Text responses bigger than this are gzipped when the client accepts it, like the real servers do
+GZIP_MIN_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def build(host: str, path: str, query: tuple) -> tuple[int, str, bytes, bytes, str]:
+    """
+    Builds a response once, so repeated runs only measure the client
+
+    Returns (status, content type, body, gzipped body or b"", etag)
+    """
+    status, content_type, body = fixtures.respond(host, path, dict(query))
+    compressed = gzip.compress(body, 6) if len(body) > GZIP_MIN_SIZE and not content_type.startswith("image/") else b""
+    return status, content_type, body, compressed, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        # Paths look like /<real host>/<real path>?<query>
+        url = urlsplit(self.path)
+        _, host, path = url.path.split("/", 2)
+        status, content_type, body, compressed, etag = build(host, "/" + path, tuple(parse_qsl(url.query)))
+
+        self.server.delay()
+
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if compressed and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = compressed
+            self.send_response(status)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0, jitter: float = 0, seed: int = 0):
+        """
+        latency: Seconds every response is held back
+        jitter: Up to this many seconds more or less, chosen at random per response
+        """
+        ThreadingHTTPServer.__init__(self, address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """
+        Starts the jitter sequence again, so each run sees the same delays in the same order
+        """
+        with self.lock:
+            self.random.seed(self.seed)
+
+    def delay(self):
+        with self.lock:
+            seconds = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0, seconds))
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start(port: int = 0, latency: float = 0, jitter: float = 0, seed: int = 0) -> Server:
+    """
+    Starts a stand-in server on a background thread, on a free port unless one is given
+    """
+    server = Server(("127.0.0.1", port), latency, jitter, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StandInAdapter(Http.Adapter):
+    """
+    Sends requests for the fixture hosts to the stand-in server instead
+    """
+
+    def __init__(self, base_url: str, **kwargs):
+        Http.Adapter.__init__(self, **kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        if url.hostname in fixtures.HOSTS:
+            request.url = f"{self.base_url}/{url.hostname}{url.path}" + (f"?{url.query}" if url.query else "")
+        return Http.Adapter.send(self, request, **kwargs)
+
+
+def install(base_url: str):
+    """
+    Points the shared HTTP session at the stand-in server, keeping its retry settings
+    """
+    # Every host shares the stand-in's one pool, so it is as big as all of theirs would be
+    pool_size = Http.POOL_SIZE * len(fixtures.HOSTS)
+    adapter = StandInAdapter(base_url, pool_connections=Http.POOL_HOSTS, pool_maxsize=pool_size, max_retries=Http.RETRY)
+    Http.session.mount("https://", adapter)
+    Http.session.mount("http://", adapter)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency, jitter = (float(value) / 1000 for value in (sys.argv[2:4] + ["0", "0"])[:2])
+    server = Server(("127.0.0.1", port), latency, jitter)
+    print(f"Serving fixtures on {server.url}, e.g. {server.url}/api.open-meteo.com/v1/forecast")
+    server.serve_forever()
@@ -0,0 +1,68 @@
+# Checks that the entry points still start quickly, by timing their imports with `python -X importtime`
+# and making sure none of the heavy dependencies that only some sections need are imported up front.
+# Exits with status 1 if an entry point is over its budget, so it can run as a regression check.
+#
+# Usage: python -m benchmarks.startup [budget scale, e.g. 3 on the Raspberry Pi]
+
+import os, subprocess, sys
+
+REPEATS = 5
+
+# Cumulative import time allowed for each entry point, in ms on a desktop
+BUDGETS = {
+    "ReceiptPrinter": 150,
+    "ReceiptConsole": 60,
+    "Prefetch": 60,
+}
+
+# Only imported once the sections or commands that need them run
+HEAVY = ["numpy", "pandas", "tabulate", "bs4", "feedparser", "spotipy", "requests"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    """
+    Imports a module in a fresh interpreter
+
+    Returns (cumulative import time in ms, names of every module imported)
+    """
+    env = dict(os.environ)
+    # Receipt.py needs a location, even though nothing is fetched
+    env.setdefault("LAT_LONG", "0,0")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+    total = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        imported.add(name.strip())
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, imported
+
+
+if __name__ == "__main__":
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    failed = False
+
+    for module, budget in BUDGETS.items():
+        # The first import also fills caches like python-escpos's printer database, so take the best
+        runs = [import_time(module) for _ in range(REPEATS)]
+        best = min(total for total, _ in runs)
+        heavy = [name for name in HEAVY if name in runs[-1][1]]
+
+        ok = best <= budget * scale and not heavy
+        failed |= not ok
+        print(f"{module:<16} {best:8.1f} ms  (budget {budget * scale:.0f} ms)  {'ok' if ok else 'OVER'}")
+        if heavy:
+            print(f"  imports {', '.join(heavy)} at startup")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,199 @@
+# Benchmarks the whole receipt offline against benchmarks/standin.py, with injected latency and jitter:
+# each source's fetch, parse and format time, the end-to-end build from a cold start, a second build with a warm
+# cache, ESC/POS rendering and downloading Spotify codes.
+#
+# Every repeat runs in fresh interpreters with empty cache directories. Medians are appended to a results file
+# with the git commit, and compared with the last results recorded with the same settings, so regressions show
+# up between versions.
+#
+# Usage: python -m benchmarks.suite [--repeats 5] [--latency 80] [--jitter 40] [--check]
+
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results.jsonl")
+
+# A metric is a regression if it is this much slower than last time, and by more than the noise floor
+THRESHOLD = 0.2
+NOISE_MS = 5
+
+RENDER_REPEATS = 20
+SPOTIFY_CODES = 10
+
+
+def timed(func, *args) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def measure(mode: str, base_url: str, output_path: str):
+    """
+    Runs one half of a repeat in this process, which must be fresh with the cache directory empty,
+    and writes {metric: ms} to output_path
+
+    mode: "build" for the end-to-end build and render, "sources" for each source on its own
+    """
+    start = time.perf_counter()
+    metrics = {}
+
+    # Section output is noise here
+    sys.stdout = open(os.devnull, "w")
+
+    (Receipt, Render), metrics["import"] = timed(lambda: (__import__("Receipt"), __import__("Render")))
+    from benchmarks import standin
+    standin.install(base_url)
+
+    if mode == "build":
+        # Cold build, as the printer runs it with nothing prefetched
+        results, metrics["build"] = timed(Receipt.build, False)
+        metrics["end_to_end"] = (time.perf_counter() - start) * 1000
+
+        data, metrics["render"] = timed(Render.render_receipt, results, "TM-T88IV")
+        metrics["render"] = min([metrics["render"]] + [timed(Render.render_receipt, results, "TM-T88IV")[1] for _ in range(RENDER_REPEATS)])
+        metrics["render_bytes"] = len(data)
+
+        # Warm build, revalidating cached responses and with the stores already synced
+        _, metrics["build_warm"] = timed(Receipt.build, False)
+
+    else:
+        from Gather import timed_call
+
+        # One at a time, so they don't compete for the GIL
+        for source in Receipt.get_sources():
+            result, seconds = timed_call(source)
+            if result is source.default:
+                raise RuntimeError(f"{source.name} failed against the stand-in")
+            metrics[f"source.{source.name}"] = seconds * 1000
+
+        import Spotify
+        uris = [f"spotify:track:{index:022d}" for index in range(SPOTIFY_CODES)]
+        _, metrics["spotify_codes"] = timed(Spotify.get_spotify_codes, uris)
+
+    with open(output_path, "w") as file:
+        json.dump(metrics, file)
+
+
+def run_child(mode: str, base_url: str) -> dict[str, float]:
+    from benchmarks import fixtures
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {**os.environ, **fixtures.RECEIPT_ENV, "RECEIPTS_CACHE_DIR": cache_dir}
+        # The printer database pickle is kept between runs, as it is on a real install
+        env.setdefault("ESCPOS_CAPABILITIES_PICKLE_DIR", os.path.join(tempfile.gettempdir(), "receipts-escpos"))
+        os.makedirs(env["ESCPOS_CAPABILITIES_PICKLE_DIR"], exist_ok=True)
+
+        output_path = os.path.join(cache_dir, "metrics.json")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--child", mode, base_url, output_path],
+            cwd=ROOT, env=env, check=True
+        )
+        with open(output_path) as file:
+            return json.load(file)
+
+
+def run_repeat(server) -> dict[str, float]:
+    server.reset()
+    sources = run_child("sources", server.url)
+    del sources["import"]
+    server.reset()
+    return {**run_child("build", server.url), **sources}
+
+
+def git_version() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_results(path: str, settings: dict) -> dict | None:
+    """
+    The most recent stored results that were run with the same settings on this machine
+    """
+    previous = None
+    try:
+        with open(path) as file:
+            for line in file:
+                record = json.loads(line)
+                if record["settings"] == settings and record["machine"] == platform.node():
+                    previous = record
+    except FileNotFoundError:
+        pass
+    return previous
+
+
+def compare(metrics: dict[str, float], previous: dict | None) -> list[str]:
+    """
+    Prints each metric next to its previous value and returns the names of the regressions
+    """
+    regressions = []
+    for name, value in metrics.items():
+        line = f"  {name:<24} {value:10.1f}"
+        if previous and name in previous["metrics"] and name != "render_bytes":
+            before = previous["metrics"][name]
+            change = (value - before) / before if before else 0
+            line += f"  {before:10.1f}  {change:+7.1%}"
+            if change > THRESHOLD and value - before > NOISE_MS:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the receipt against local stand-ins for its APIs")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=80, help="Milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=40, help="Up to this many milliseconds more or less per response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS_PATH, help="File the results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="Compare without recording these results")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if anything regressed")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(*args.child)
+        return
+
+    from benchmarks import standin
+
+    settings = {"latency": args.latency, "jitter": args.jitter, "seed": args.seed}
+    server = standin.start(latency=args.latency / 1000, jitter=args.jitter / 1000, seed=args.seed)
+    print(f"Stand-in APIs on {server.url}, {args.latency:.0f} ± {args.jitter:.0f} ms")
+
+    # The first run also builds every fixture, so it isn't counted
+    run_repeat(server)
+    runs = []
+    for repeat in range(args.repeats):
+        runs.append(run_repeat(server))
+        print(f"  repeat {repeat + 1}/{args.repeats}: {runs[-1]['end_to_end']:.0f} ms end to end")
+    server.shutdown()
+
+    metrics = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    previous = previous_results(args.results, settings)
+
+    print(f"Median ms over {args.repeats} repeats" + (f", against {previous['version']} from {previous['date']}" if previous else ""))
+    regressions = compare(metrics, previous)
+
+    if not args.no_save:
+        record = {
+            "version": git_version(), "date": datetime.now().isoformat(timespec="seconds"),
+            "machine": platform.node(), "python": platform.python_version(),
+            "settings": settings, "repeats": args.repeats, "metrics": metrics,
+        }
+        with open(args.results, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()